@@ -0,0 +1,226 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""A compiled LR(1) parser driver for the tables of parsing.Spec.
+
+This is a drop-in replacement of parsing.Lr: it accepts the same
+tokens, calls the same reduction methods, and so builds the same
+trees, but its main loop works on integer tables instead of going
+through the action objects of the spec for every token.
+"""
+
+
+cimport cython
+from cpython.mem cimport PyMem_Malloc, PyMem_Realloc, PyMem_Free
+
+import parsing
+from parsing import grammar as parsing_grammar
+
+
+DEF INITIAL_STACK_SIZE = 64
+
+
+@cython.final
+cdef class LrTables:
+    """The action and goto tables of a parsing.Spec.
+
+    Actions are encoded as integers: a shift to state N is N, and a
+    reduction by production P is -(P + 1).
+    """
+
+    cdef:
+        # For every state, a dict of token class -> action.
+        list actions
+        # For every state, a dict of nonterminal number -> state.
+        list gotos
+        # The reduction method, the nonterminal class, the number of
+        # symbols on the right hand side, and the nonterminal number of
+        # every production.
+        list prod_methods
+        list prod_types
+        list prod_nrhs
+        list prod_lhs
+
+    def __init__(self, spec):
+        cdef:
+            dict nonterms = {}
+            dict prods = {}
+
+        if spec.conflicts or not spec.pureLR:
+            raise ValueError('the grammar is not LR(1)')
+
+        self.prod_methods = []
+        self.prod_types = []
+        self.prod_nrhs = []
+        self.prod_lhs = []
+
+        self.actions = []
+        for state_actions in spec.actions():
+            state_table = {}
+            for sym_spec, acts in state_actions.items():
+                assert len(acts) == 1
+                action = acts[0]
+                if type(action) is parsing_grammar.ShiftAction:
+                    code = action.nextState
+                else:
+                    prod = action.production
+                    num = prods.get(prod)
+                    if num is None:
+                        num = prods[prod] = len(self.prod_methods)
+                        self.prod_methods.append(prod.method)
+                        self.prod_types.append(prod.lhs.nontermType)
+                        self.prod_nrhs.append(len(prod.rhs))
+                        self.prod_lhs.append(
+                            nonterms.setdefault(prod.lhs, len(nonterms)))
+                    code = -(num + 1)
+                state_table[sym_spec.tokenType] = code
+            self.actions.append(state_table)
+
+        self.gotos = []
+        for state_gotos in spec.goto():
+            self.gotos.append({
+                nonterms[nonterm]: target
+                for nonterm, target in state_gotos.items()
+                if nonterm in nonterms
+            })
+
+
+@cython.final
+cdef class LrParser:
+    """LR(1) parser that runs on LrTables.
+
+    Like parsing.Lr, the input is fed to the token() method and is
+    terminated with the eoi() method, after which the result is
+    start[0].
+    """
+
+    cdef:
+        LrTables tables
+        list values
+        int *states
+        Py_ssize_t depth
+        Py_ssize_t size
+        list _start
+
+        public object parser_data
+        public bint verbose
+
+    def __cinit__(self):
+        self.states = NULL
+        self.depth = 0
+        self.size = 0
+
+    def __init__(self, LrTables tables):
+        self.tables = tables
+        self.parser_data = None
+        self.verbose = False
+        self.states = <int *>PyMem_Malloc(sizeof(int) * INITIAL_STACK_SIZE)
+        if self.states is NULL:
+            raise MemoryError
+        self.size = INITIAL_STACK_SIZE
+        self.reset()
+
+    def __dealloc__(self):
+        PyMem_Free(self.states)
+        self.states = NULL
+
+    @property
+    def start(self):
+        return self._start
+
+    @property
+    def _stack(self):
+        # The (symbol, state) pairs of parsing.Lr, for error reporting.
+        return [(self.values[i], self.states[i]) for i in range(self.depth)]
+
+    def reset(self):
+        self._start = None
+        self.values = [parsing_grammar.Epsilon()]
+        self.states[0] = 0
+        self.depth = 1
+
+    def token(self, token):
+        """Feed a token to the parser."""
+        self._act(token)
+
+    def eoi(self):
+        """Signal end-of-input to the parser."""
+        token = parsing_grammar.EndOfInput()
+        self._act(token)
+        assert self.values[-1] is token
+        self._pop(1)
+        self._start = [self.values[1]]
+
+    cdef _push(self, value, int state):
+        cdef int *states
+
+        if self.depth == self.size:
+            states = <int *>PyMem_Realloc(
+                self.states, sizeof(int) * self.size * 2)
+            if states is NULL:
+                raise MemoryError
+            self.states = states
+            self.size *= 2
+
+        self.values.append(value)
+        self.states[self.depth] = state
+        self.depth += 1
+
+    cdef _pop(self, Py_ssize_t n):
+        if n:
+            del self.values[self.depth - n:]
+            self.depth -= n
+
+    cdef _act(self, sym):
+        cdef:
+            LrTables tables = self.tables
+            object token_type = type(sym)
+            int action
+            Py_ssize_t prod
+            Py_ssize_t nrhs
+            object lhs
+            object result
+
+        while True:
+            code = (<dict>tables.actions[self.states[self.depth - 1]]).get(
+                token_type)
+            if code is None:
+                raise parsing.UnexpectedToken(
+                    'Unexpected token: %r' % (sym,))
+
+            action = code
+            if action >= 0:
+                self._push(sym, action)
+                return
+
+            prod = -action - 1
+            nrhs = tables.prod_nrhs[prod]
+            lhs = tables.prod_types[prod]()
+            result = tables.prod_methods[prod](
+                lhs, *self.values[self.depth - nrhs:])
+            # Like parsing.Lr, let the reduction methods modify the
+            # nonterminal in place instead of returning it.
+            if result is None:
+                result = lhs
+
+            self._pop(nrhs)
+            self._push(
+                result,
+                (<dict>tables.gotos[self.states[self.depth - 1]])[
+                    tables.prod_lhs[prod]],
+            )
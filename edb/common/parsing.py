@@ -31,6 +31,7 @@ import parsing
 
 from edb.common.exceptions import add_context, get_context
 from edb.common import context as pctx
+from edb.common import lrparser
 from edb._edgeql_rust import TokenizerError
 from edb.errors import EdgeQLSyntaxError
 
@@ -312,6 +313,7 @@ def _derive_hint(
 
 class Parser:
     parser_spec: ClassVar[parsing.Spec | None]
+    parser_tables: ClassVar[lrparser.LrTables | None]
 
     def __init__(self, **parser_data):
         self.lexer = None
@@ -320,6 +322,7 @@ class Parser:
 
     def cleanup(self):
         self.__class__.parser_spec = None
+        self.__class__.parser_tables = None
         self.__class__.lexer_spec = None
         self.lexer = None
         self.parser = None
@@ -362,6 +365,25 @@ class Parser:
         self.__class__.parser_spec = spec
         return spec
 
+    def get_parser_tables(
+        self,
+        allow_rebuild: bool = True,
+    ) -> lrparser.LrTables:
+        cls = self.__class__
+
+        try:
+            tables = cls.__dict__['parser_tables']
+        except KeyError:
+            pass
+        else:
+            if tables is not None:
+                return tables
+
+        tables = lrparser.LrTables(self.get_parser_spec(allow_rebuild))
+
+        self.__class__.parser_tables = tables
+        return tables
+
     def on_spec_unpickle(
         self,
         mod: types.ModuleType,
@@ -395,7 +417,11 @@ class Parser:
     def reset_parser(self, input, filename=None):
         if not self.parser:
             self.lexer = self.get_lexer()
-            self.parser = parsing.Lr(self.get_parser_spec())
+            if self.get_debug():
+                # parsing.Lr can trace its actions in verbose mode.
+                self.parser = parsing.Lr(self.get_parser_spec())
+            else:
+                self.parser = lrparser.LrParser(self.get_parser_tables())
             self.parser.parser_data = self.parser_data
             self.parser.verbose = self.get_debug()
 
@@ -190,6 +190,21 @@ class Registry:
         self._add_metric(hist)
         return hist
 
+    def new_labeled_histogram(
+        self,
+        name: str,
+        desc: str,
+        /,
+        *,
+        unit: Unit | None = None,
+        buckets: list[float] | None = None,
+        labels: tuple[str],
+    ) -> LabeledHistogram:
+        hist = LabeledHistogram(
+            self, name, desc, unit, buckets=buckets, labels=labels)
+        self._add_metric(hist)
+        return hist
+
     def generate(self) -> str:
         buffer: list[str] = []
         for metric in self._metrics:
@@ -457,13 +472,11 @@ class LabeledGauge(BaseLabeledCounter):
             self._metric_created[labels] = self._registry.now()
 
 
-class Histogram(BaseMetric):
+class BaseHistogram(BaseMetric):
 
     _type = 'histogram'
 
     _buckets: list[float]
-    _values: list[float]
-    _sum: float
 
     # Default buckets that many standard prometheus client libraries use.
     DEFAULT_BUCKETS = [
@@ -490,23 +503,19 @@ class Histogram(BaseMetric):
 
         super().__init__(*args)
 
-        self._sum = 0.0
         self._buckets = buckets
-        self._values = [0.0] * len(self._buckets)
-
-    def observe(self, value: float) -> None:
-        idx = bisect.bisect_left(self._buckets, value)
-        self._values[idx] += 1.0
-        self._sum += value
-
-    def _generate(self, buffer: list[str]) -> None:
-        desc = _format_desc(self._desc)
 
-        buffer.append(f'# HELP {self._name} {desc}')
-        buffer.append(f'# TYPE {self._name} histogram')
+    def _generate_buckets(
+        self,
+        buffer: list[str],
+        values: list[float],
+        total: float,
+        fmt_label: str,
+    ) -> None:
+        sep = ',' if fmt_label else ''
 
         accum = 0.0
-        for buck, val in zip(self._buckets, self._values):
+        for buck, val in zip(self._buckets, values):
             accum += val
 
             if math.isinf(buck):
@@ -517,16 +526,112 @@ class Histogram(BaseMetric):
             else:
                 buckf = str(buck)
 
-            buffer.append(f'{self._name}_bucket{{le="{buckf}"}} {accum}')
+            buffer.append(
+                f'{self._name}_bucket{{{fmt_label}{sep}le="{buckf}"}} {accum}'
+            )
+
+        if fmt_label:
+            fmt_label = f'{{{fmt_label}}}'
+        buffer.append(f'{self._name}_count{fmt_label} {accum}')
+        buffer.append(f'{self._name}_sum{fmt_label} {total}')
+
+
+class Histogram(BaseHistogram):
+
+    _values: list[float]
+    _sum: float
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        buckets: list[float] | None = None
+    ) -> None:
+        super().__init__(*args, buckets=buckets)
+        self._sum = 0.0
+        self._values = [0.0] * len(self._buckets)
 
-        buffer.append(f'{self._name}_count {accum}')
-        buffer.append(f'{self._name}_sum {self._sum}')
+    def observe(self, value: float) -> None:
+        idx = bisect.bisect_left(self._buckets, value)
+        self._values[idx] += 1.0
+        self._sum += value
+
+    def _generate(self, buffer: list[str]) -> None:
+        desc = _format_desc(self._desc)
+
+        buffer.append(f'# HELP {self._name} {desc}')
+        buffer.append(f'# TYPE {self._name} histogram')
+
+        self._generate_buckets(buffer, self._values, self._sum, '')
 
         buffer.append(f'# HELP {self._name}_created {desc}')
         buffer.append(f'# TYPE {self._name}_created gauge')
         buffer.append(f'{self._name}_created {float(self._created)}')
 
 
+class LabeledHistogram(BaseHistogram):
+
+    _labels: tuple[str, ...]
+    _metric_values: dict[tuple[str, ...], list[float]]
+    _metric_sums: dict[tuple[str, ...], float]
+    _metric_created: dict[tuple[str, ...], float]
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        buckets: list[float] | None = None,
+        labels: tuple[str, ...],
+    ) -> None:
+        super().__init__(*args, buckets=buckets)
+        self._validate_label_names(labels)
+        self._labels = labels
+        self._metric_values = {}
+        self._metric_sums = {}
+        self._metric_created = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        self._validate_label_values(self._labels, labels)
+        try:
+            values = self._metric_values[labels]
+        except KeyError:
+            values = self._metric_values[labels] = [0.0] * len(self._buckets)
+            self._metric_sums[labels] = 0.0
+            self._metric_created[labels] = self._registry.now()
+
+        idx = bisect.bisect_left(self._buckets, value)
+        values[idx] += 1.0
+        self._metric_sums[labels] += value
+
+    def _format_labels(self, labels: tuple[str, ...]) -> str:
+        return ','.join(
+            f'{label}="{_format_label_val(label_val)}"'
+            for label, label_val in zip(self._labels, labels)
+        )
+
+    def _generate(self, buffer: list[str]) -> None:
+        desc = _format_desc(self._desc)
+
+        buffer.append(f'# HELP {self._name} {desc}')
+        buffer.append(f'# TYPE {self._name} histogram')
+
+        for labels, values in self._metric_values.items():
+            self._generate_buckets(
+                buffer,
+                values,
+                self._metric_sums[labels],
+                self._format_labels(labels),
+            )
+
+        if self._metric_values:
+            buffer.append(f'# HELP {self._name}_created {desc}')
+            buffer.append(f'# TYPE {self._name}_created gauge')
+
+            for labels, value in self._metric_created.items():
+                fmt_label = self._format_labels(labels)
+                buffer.append(
+                    f'{self._name}_created{{{fmt_label}}} {float(value)}'
+                )
+
+
 @functools.lru_cache(maxsize=1024)
 def _format_desc(desc: str) -> str:
     return desc.replace('\\', r'\\').replace('\n', r'\n')
@@ -104,7 +104,7 @@ def preload(
     if not paralellize:
         try:
             for parser in parsers:
-                parser.get_parser_spec(allow_rebuild)
+                parser.get_parser_tables(allow_rebuild)
         except parsing.ParserSpecIncompatibleError as e:
             raise errors.InternalServerError(e.args[0]) from None
     else:
@@ -116,10 +116,9 @@ def preload(
             except parsing.ParserSpecIncompatibleError:
                 parsers_to_rebuild.append(parser)
 
-        if len(parsers_to_rebuild) == 0:
-            pass
-        elif len(parsers_to_rebuild) == 1:
-            parsers_to_rebuild[0].get_parser_spec(allow_rebuild=True)
+        if len(parsers_to_rebuild) <= 1:
+            for parser in parsers:
+                parser.get_parser_tables(allow_rebuild=True)
         else:
             with multiprocessing.Pool(len(parsers_to_rebuild)) as pool:
                 pool.map(_load_parser, parsers_to_rebuild)
@@ -124,6 +124,30 @@ class DMLDummyTable(dbops.Table):
     '''
 
 
+class QueryCacheTable(dbops.Table):
+    """Compiled queries shared by all servers using the database.
+
+    See edb.server.cache.shared for details.
+    """
+    def __init__(self) -> None:
+        super().__init__(name=('edgedb', '_query_cache'))
+
+        self.add_columns([
+            dbops.Column(name='key', type='bytea', required=True),
+            dbops.Column(name='version', type='bytea', required=True),
+            dbops.Column(name='data', type='bytea', required=True),
+            dbops.Column(name='stored_at', type='timestamptz',
+                         required=True, default='now()'),
+        ])
+
+        self.add_constraint(
+            dbops.PrimaryKey(
+                table_name=('edgedb', '_query_cache'),
+                columns=['key', 'version'],
+            ),
+        )
+
+
 class ExpressionType(dbops.CompositeType):
     def __init__(self) -> None:
         super().__init__(name=('edgedb', 'expression_t'))
@@ -4163,6 +4187,7 @@ async def bootstrap(
         dbops.CreateTable(DBConfigTable()),
         dbops.CreateTable(DMLDummyTable()),
         dbops.Query(DMLDummyTable.SETUP_QUERY),
+        dbops.CreateTable(QueryCacheTable()),
         dbops.CreateFunction(IntervalToMillisecondsFunction()),
         dbops.CreateFunction(SafeIntervalCastFunction()),
         dbops.CreateFunction(QuoteIdentFunction()),
@@ -25,6 +25,7 @@ import abc
 import collections
 import functools
 import itertools
+import uuid
 
 import immutables as immu
 
@@ -42,7 +43,6 @@ from . import pseudo as s_pseudo
 from . import types as s_types
 
 if TYPE_CHECKING:
-    import uuid
     from edb.common import parsing
 
     Refs_T = immu.Map[
@@ -479,6 +479,58 @@ class Schema(abc.ABC):
         raise NotImplementedError
 
 
+class MapDelta(NamedTuple):
+
+    updates: Dict[Any, Any]
+    deletions: Tuple[Any, ...]
+
+
+class FlatSchemaDelta(NamedTuple):
+    """The difference between two versions of a FlatSchema.
+
+    The delta can only be applied to a copy of the schema it was computed
+    against, as identified by its version id.  Every map field is either
+    None, if the corresponding map is shared by both versions, or the
+    entries to set or delete in the base version.
+    """
+
+    base_version: uuid.UUID
+    base_size: int
+    version: uuid.UUID
+    generation: int
+    id_to_data: Optional[MapDelta]
+    id_to_type: Optional[MapDelta]
+    name_to_id: Optional[MapDelta]
+    shortname_to_id: Optional[MapDelta]
+    globalname_to_id: Optional[MapDelta]
+    refs_to: Optional[MapDelta]
+
+    def get_size(self) -> int:
+        size = 0
+        for delta in self[_FLAT_SCHEMA_DELTA_MAPS:]:
+            if delta is not None:
+                size += len(delta.updates) + len(delta.deletions)
+        return size
+
+
+def _diff_maps(base: immu.Map[Any, Any], new: immu.Map[Any, Any]) -> MapDelta:
+    missing = object()
+    updates = {k: v for k, v in new.items() if base.get(k, missing) is not v}
+    deletions = tuple(k for k in base if k not in new)
+    return MapDelta(updates=updates, deletions=deletions)
+
+
+def _apply_map_delta(
+    base: immu.Map[Any, Any],
+    delta: MapDelta,
+) -> immu.Map[Any, Any]:
+    with base.mutate() as mm:
+        for k in delta.deletions:
+            del mm[k]
+        mm.update(delta.updates)
+        return mm.finish()
+
+
 class FlatSchema(Schema):
 
     _id_to_data: immu.Map[uuid.UUID, Tuple[Any, ...]]
@@ -494,6 +546,10 @@ class FlatSchema(Schema):
     ]
     _refs_to: Refs_T
     _generation: int
+    # Every version of the schema gets a new random id, which is kept
+    # when it is pickled.  Unlike the generation, it tells apart two
+    # schemas derived from the same parent.
+    _version_id: uuid.UUID
 
     def __init__(self) -> None:
         self._id_to_data = immu.Map()
@@ -503,6 +559,7 @@ class FlatSchema(Schema):
         self._globalname_to_id = immu.Map()
         self._refs_to = immu.Map()
         self._generation = 0
+        self._version_id = uuid.uuid4()
 
     def _replace(
         self,
@@ -554,9 +611,53 @@ class FlatSchema(Schema):
             new._refs_to = refs_to
 
         new._generation = self._generation + 1
+        new._version_id = uuid.uuid4()
 
         return new
 
+    def get_delta(self, base: FlatSchema) -> FlatSchemaDelta:
+        """Compute the difference between *base* and this schema.
+
+        Since the schema maps are persistent, the unchanged entries are
+        shared by both versions and are skipped by an identity check.
+        """
+        deltas = []
+        for field in _FLAT_SCHEMA_MAPS:
+            base_map = getattr(base, field)
+            new_map = getattr(self, field)
+            if base_map is new_map:
+                deltas.append(None)
+            else:
+                deltas.append(_diff_maps(base_map, new_map))
+
+        return FlatSchemaDelta(
+            base._version_id,
+            len(base._id_to_data),
+            self._version_id,
+            self._generation,
+            *deltas,
+        )
+
+    def apply_delta(self, delta: FlatSchemaDelta) -> FlatSchema:
+        """Reconstruct the schema that *delta* was computed for."""
+        if delta.base_version != self._version_id:
+            raise ValueError(
+                f'cannot apply schema delta: expected base version '
+                f'{delta.base_version}, got {self._version_id}')
+
+        updates = {}
+        for field, map_delta in zip(
+            _FLAT_SCHEMA_MAPS, delta[_FLAT_SCHEMA_DELTA_MAPS:]
+        ):
+            if map_delta is not None:
+                updates[field[1:]] = _apply_map_delta(
+                    getattr(self, field), map_delta)
+
+        new = self._replace(**updates)
+        new._generation = delta.generation
+        new._version_id = delta.version
+        return new
+
     def _update_obj_name(
         self,
         obj_id: uuid.UUID,
@@ -1469,6 +1570,18 @@ class FlatSchema(Schema):
             f'<{type(self).__name__} gen:{self._generation} at {id(self):#x}>')
 
 
+_FLAT_SCHEMA_MAPS = (
+    '_id_to_data',
+    '_id_to_type',
+    '_name_to_id',
+    '_shortname_to_id',
+    '_globalname_to_id',
+    '_refs_to',
+)
+# The index of the first map field of FlatSchemaDelta.
+_FLAT_SCHEMA_DELTA_MAPS = 4
+
+
 class SchemaIterator(Generic[so.Object_T]):
     def __init__(
         self,
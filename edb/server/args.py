@@ -37,6 +37,7 @@ from edb.schema import defines as schema_defines
 from edb.pgsql import params as pgsql_params
 
 from . import defines
+from .connpool import qos as connpool_qos
 
 
 MIB = 1024 * 1024
@@ -181,8 +182,21 @@ class ServerConfig(NamedTuple):
     daemon_user: str
     daemon_group: str
     runstate_dir: pathlib.Path
+    query_cache_dir: Optional[pathlib.Path]
+    shared_query_cache: bool
+    shared_query_cache_secret: Optional[bytes]
+    query_cache_memory_limit: Optional[int]
+    query_cache_database_memory_limit: int
+    query_cache_recompile_after_ddl: int
     max_backend_connections: Optional[int]
+    min_idle_backend_connections: int
+    dump_jobs: int
+    connpool_trace_file: Optional[pathlib.Path]
+    connpool_trace_max_size: int
+    connpool_trace_max_duration: float
+    connpool_qos: Optional[connpool_qos.QosPolicy]
     compiler_pool_size: int
+    compiler_pool_batch_size: int
     compiler_pool_mode: CompilerPoolMode
     compiler_pool_addr: str
     echo_runtime_info: bool
@@ -320,6 +334,14 @@ def _validate_max_backend_connections(ctx, param, value):
     return value
 
 
+def _validate_min_idle_backend_connections(ctx, param, value):
+    if value < 0:
+        raise click.BadParameter(
+            'the minimum number of idle backend connections must not be '
+            'negative')
+    return value
+
+
 def compute_default_max_backend_connections() -> int:
     total_mem = psutil.virtual_memory().total
     total_mem_mb = total_mem // MIB
@@ -349,6 +371,66 @@ def _validate_compiler_pool_size(ctx, param, value):
     return value
 
 
+def _validate_compiler_pool_batch_size(ctx, param, value):
+    if value < 1:
+        raise click.BadParameter(
+            'the minimum value for the compiler pool batch size option is 1')
+    return value
+
+
+def _validate_dump_jobs(ctx, param, value):
+    if value < 1:
+        raise click.BadParameter(
+            'the minimum value for the dump jobs option is 1')
+    return value
+
+
+def _validate_connpool_trace_file(ctx, param, value):
+    if value is None:
+        return None
+    # The trace is started while the server is being set up; check that
+    # it can be written before that.
+    try:
+        with open(value, 'ab'):
+            pass
+    except OSError as e:
+        raise click.BadParameter(
+            f'could not open the connection pool trace file: {e}')
+    return value
+
+
+def _validate_connpool_trace_limit(ctx, param, value):
+    if value <= 0:
+        raise click.BadParameter(
+            'the connection pool trace limits must be positive')
+    return value
+
+
+def _validate_connpool_qos_file(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return connpool_qos.load_policy(value)
+    except (OSError, ValueError) as e:
+        raise click.BadParameter(
+            f'could not load the connection pool QoS policy: {e}')
+
+
+def _validate_query_cache_memory_limit(ctx, param, value):
+    if value is not None and value < 0:
+        raise click.BadParameter(
+            'the query cache memory limit must not be negative')
+    return value
+
+
+def _validate_query_cache_recompile_after_ddl(ctx, param, value):
+    if value < 0:
+        raise click.BadParameter(
+            'the number of queries to recompile after DDL must not be '
+            'negative')
+    return value
+
+
 def _validate_host_port(ctx, param, value):
     if value is None:
         return None
@@ -638,6 +720,53 @@ _server_options = [
         help=f'directory where UNIX sockets and other temporary '
              f'runtime files will be placed ({_get_runstate_dir_default()} '
              f'by default)'),
+    click.option(
+        '--query-cache-dir', type=PathPath(), default=None,
+        envvar="EDGEDB_SERVER_QUERY_CACHE_DIR",
+        help='directory where compiled queries are persisted, so that '
+             'the query cache survives server restarts; the cache is '
+             'kept in memory only if not set'),
+    click.option(
+        '--enable-shared-query-cache', 'shared_query_cache', is_flag=True,
+        envvar="EDGEDB_SERVER_SHARED_QUERY_CACHE", cls=EnvvarResolver,
+        help='If enabled, compiled queries are also stored in the backend '
+             'database, so that they can be reused by other EdgeDB '
+             'servers running against the same backend cluster. '
+             'Requires --shared-query-cache-key-file. '
+             'Default is disabled.'),
+    click.option(
+        '--shared-query-cache-key-file', type=PathPath(), default=None,
+        envvar="EDGEDB_SERVER_SHARED_QUERY_CACHE_KEY_FILE",
+        help='A file with the secret used to sign the compiled queries '
+             'stored in the backend database.  All servers sharing the '
+             'query cache must use the same secret.  Entries without a '
+             'valid signature are ignored.'),
+    click.option(
+        '--query-cache-memory-limit', type=int, metavar='BYTES',
+        envvar="EDGEDB_SERVER_QUERY_CACHE_MEMORY_LIMIT",
+        callback=_validate_query_cache_memory_limit,
+        help='The approximate maximum number of BYTES used by compiled '
+             'queries cached in memory across all databases. When the '
+             'limit is exceeded, queries of the least recently used '
+             'databases are evicted first. Unlimited if not set.'),
+    click.option(
+        '--query-cache-database-memory-limit', type=int, metavar='BYTES',
+        default=defines._MAX_QUERIES_CACHE_WEIGHT,
+        envvar="EDGEDB_SERVER_QUERY_CACHE_DATABASE_MEMORY_LIMIT",
+        callback=_validate_query_cache_memory_limit,
+        help=f'The approximate maximum number of BYTES used by each of '
+             f'the compiled query caches of a database. Default is '
+             f'{defines._MAX_QUERIES_CACHE_WEIGHT}.'),
+    click.option(
+        '--query-cache-recompile-after-ddl', type=int, metavar='NUM',
+        default=0,
+        envvar="EDGEDB_SERVER_QUERY_CACHE_RECOMPILE_AFTER_DDL",
+        callback=_validate_query_cache_recompile_after_ddl,
+        help='After a DDL command changes the schema of a database, '
+             'recompile up to NUM of its most recently used cached queries '
+             'in the background, using idle compiler workers, instead of '
+             'waiting for the queries to be sent again. Disabled (0) by '
+             'default.'),
     click.option(
         '--max-backend-connections', type=int, metavar='NUM',
         help=f'The maximum NUM of connections this EdgeDB instance could make '
@@ -647,6 +776,57 @@ _server_options = [
              f'Postgres or pg_settings.max_connections for remote Postgres, '
              f'minus the NUM of --reserved-pg-connections.',
         callback=_validate_max_backend_connections),
+    click.option(
+        '--min-idle-backend-connections', type=int, metavar='NUM',
+        default=0,
+        envvar="EDGEDB_SERVER_MIN_IDLE_BACKEND_CONNECTIONS",
+        callback=_validate_min_idle_backend_connections,
+        help='The NUM of backend connections to open in advance to each '
+             'database on startup and after a backend failover, and to '
+             'keep open for the databases in use instead of closing idle '
+             'ones, as long as the pool has room for them. Default is 0, '
+             'which disables prewarming.'),
+    click.option(
+        '--dump-jobs', type=int, metavar='NUM', default=1,
+        envvar="EDGEDB_SERVER_DUMP_JOBS",
+        callback=_validate_dump_jobs,
+        help='The maximum NUM of backend connections a single database '
+             'dump reads data through concurrently. All of them see the '
+             'same snapshot of the database. Capped at half of the '
+             'backend connections the database may use; fewer are used '
+             'if they are busy. Default is 1.'),
+    click.option(
+        '--connpool-trace-file', type=PathPath(), metavar='PATH',
+        envvar="EDGEDB_SERVER_CONNPOOL_TRACE_FILE",
+        callback=_validate_connpool_trace_file,
+        help='Record the traffic of the backend connection pool into a '
+             'compact binary trace at PATH, which can be replayed with '
+             '"edb pool-bench --trace". Recording stops when either of '
+             'the trace limits is reached.'),
+    click.option(
+        '--connpool-trace-max-size', type=int, metavar='BYTES',
+        default=64 * 1024 * 1024,
+        envvar="EDGEDB_SERVER_CONNPOOL_TRACE_MAX_SIZE",
+        callback=_validate_connpool_trace_limit,
+        help='The maximum size of the connection pool trace in BYTES. '
+             'Default is 64MiB.'),
+    click.option(
+        '--connpool-trace-max-duration', type=float, metavar='SECONDS',
+        default=600.0,
+        envvar="EDGEDB_SERVER_CONNPOOL_TRACE_MAX_DURATION",
+        callback=_validate_connpool_trace_limit,
+        help='The maximum number of SECONDS the connection pool traffic '
+             'is recorded for. Default is 600.'),
+    click.option(
+        '--connpool-qos-file', 'connpool_qos', type=PathPath(),
+        metavar='PATH',
+        envvar="EDGEDB_SERVER_CONNPOOL_QOS_FILE",
+        callback=_validate_connpool_qos_file,
+        help='A JSON file assigning databases to quality of service '
+             'classes of the backend connection pool.  Every class may '
+             'set the weight of its databases when connections are '
+             'divided between them, the number of connections guaranteed '
+             'to each of them, and the maximum number each may hold.'),
     click.option(
         '--compiler-pool-size', type=int,
         callback=_validate_compiler_pool_size),
@@ -661,6 +841,15 @@ _server_options = [
              'down to the demand. Defaults to "fixed" in production mode and '
              '"on_demand" in development mode.',
     ),
+    click.option(
+        '--compiler-pool-batch-size', type=int, default=1,
+        callback=_validate_compiler_pool_batch_size,
+        help='The maximum number of concurrent compile requests against '
+             'the same database schema that are sent to a compiler worker '
+             'in one call. Identical requests in flight share the result. '
+             'Ignored if --compiler-pool-mode=remote. Default is 1, which '
+             'disables batching.',
+    ),
     click.option(
         '--compiler-pool-addr',
         hidden=True,
@@ -1225,6 +1414,22 @@ def parse_args(**kwargs: Any):
 
     del kwargs['bootstrap_script']
 
+    shared_query_cache_key_file = kwargs.pop('shared_query_cache_key_file')
+    kwargs['shared_query_cache_secret'] = None
+    if kwargs['shared_query_cache']:
+        if shared_query_cache_key_file is None:
+            abort('--enable-shared-query-cache requires '
+                  '--shared-query-cache-key-file to be set.')
+        try:
+            secret = shared_query_cache_key_file.read_bytes().strip()
+        except OSError as e:
+            abort(f'cannot read the shared query cache key file: {e}')
+        if len(secret) < 16:
+            abort(f'the shared query cache key file '
+                  f'"{shared_query_cache_key_file}" must contain a secret '
+                  f'of at least 16 bytes')
+        kwargs['shared_query_cache_secret'] = secret
+
     bootstrap_script_text: Optional[str]
     if kwargs['bootstrap_command_file']:
         with open(kwargs['bootstrap_command_file']) as f:
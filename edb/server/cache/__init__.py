@@ -20,6 +20,7 @@
 from __future__ import annotations
 
 from .stmt_cache import StatementsCache
+from .tinylfu import TinyLFUCache
 
 
-__all__ = ('StatementsCache',)
+__all__ = ('StatementsCache', 'TinyLFUCache')
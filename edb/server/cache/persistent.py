@@ -0,0 +1,286 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2016-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from __future__ import annotations
+from typing import *
+
+import asyncio
+import collections
+import functools
+import logging
+import os
+import pathlib
+import pickle
+import urllib.parse
+
+from edb.server import metrics
+
+
+logger = logging.getLogger("edb.server")
+
+FORMAT_TAG = 'edgedb-query-cache'
+FORMAT_VERSION = 1
+
+# How long (in seconds) newly compiled queries are buffered in memory
+# before they are appended to the cache file.
+FLUSH_DELAY: float = 1.0
+
+
+class PersistentQueryCache:
+    """An on-disk, write-behind store of compiled queries of a database.
+
+    The file is an append-only sequence of pickled records; the first
+    record is a header carrying the *version* token the entries were
+    compiled against.  Whenever the owner switches to a different version
+    (schema or configuration change) all entries are discarded.
+
+    All file operations run in the default executor, one at a time and
+    in the order they were requested, so that the event loop never
+    blocks on the disk.  The entries stored for a version are passed to
+    *on_load* once they have been read.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        *,
+        maxsize: int,
+        snapshot: Callable[[], Iterable[Tuple[Any, Any]]],
+        on_load: Callable[[bytes, List[Tuple[Any, Any]]], None],
+    ) -> None:
+        self._path = path
+        self._maxsize = maxsize
+        # Called to fetch the entries that are still alive when the file
+        # has accumulated too many superseded records and is compacted.
+        self._snapshot = snapshot
+        self._on_load = on_load
+        self._version: Optional[bytes] = None
+        self._pending: List[Tuple[Any, Any]] = []
+        # The number of records in the file; only updated by the file
+        # operations, and read on the event loop as an estimate.
+        self._records = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._ops: Deque[Callable[[], Any]] = collections.deque()
+        self._writer: Optional[asyncio.Task[None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def for_database(
+        cls,
+        cache_dir: pathlib.Path,
+        tenant_id: str,
+        dbname: str,
+        *,
+        maxsize: int,
+        snapshot: Callable[[], Iterable[Tuple[Any, Any]]],
+        on_load: Callable[[bytes, List[Tuple[Any, Any]]], None],
+    ) -> PersistentQueryCache:
+        fn = urllib.parse.quote(f'{tenant_id}-{dbname}', safe='')
+        return cls(
+            cache_dir / f'{fn}.qcache',
+            maxsize=maxsize,
+            snapshot=snapshot,
+            on_load=on_load,
+        )
+
+    def set_version(self, version: Optional[bytes]) -> None:
+        """Switch to *version* and load the entries stored for it.
+
+        A version of None means the entries cannot be persisted (e.g.
+        the database schema has not been introspected yet).
+        """
+        self._cancel_flush()
+        if version is not None and version == self._version:
+            # The in-memory cache was dropped without an actual schema
+            # or configuration change; reread everything we have.
+            self._append()
+        else:
+            self._pending.clear()
+            self._version = version
+            if version is None:
+                return
+
+        self._submit(self._load_entries, version)
+
+    def add(self, key: Any, value: Any) -> None:
+        if self._version is None:
+            return
+        self._pending.append((key, value))
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                FLUSH_DELAY, self.flush)
+
+    def flush(self) -> None:
+        self._cancel_flush()
+        if not self._pending or self._version is None:
+            return
+
+        if self._records + len(self._pending) > self._maxsize * 2:
+            # Too many superseded records; compact the file.
+            self._pending.clear()
+            self._rewrite(self._snapshot())
+        else:
+            self._append()
+
+    def clear(self) -> None:
+        self._cancel_flush()
+        self._pending.clear()
+        self._version = None
+        self._submit(self._unlink)
+
+    async def wait(self) -> None:
+        """Wait until all scheduled file operations are done."""
+        while self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    def _cancel_flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _submit(self, op: Callable[..., Any], *args: Any) -> None:
+        self._ops.append(functools.partial(op, *args))
+        if self._writer is None:
+            self._loop = asyncio.get_running_loop()
+            self._writer = self._loop.create_task(self._run_ops())
+
+    async def _run_ops(self) -> None:
+        assert self._loop is not None
+        try:
+            while self._ops:
+                op = self._ops.popleft()
+                try:
+                    await self._loop.run_in_executor(None, op)
+                except Exception as ex:
+                    self._log_error('could not update', ex)
+        finally:
+            self._writer = None
+
+    def _append(self) -> None:
+        pending, self._pending = self._pending, []
+        if pending:
+            self._submit(self._append_records, pending)
+
+    def _rewrite(self, entries: Iterable[Tuple[Any, Any]]) -> None:
+        assert self._version is not None
+        # The snapshot reads the in-memory cache, so it is taken here
+        # rather than in the executor.
+        self._submit(self._rewrite_records, self._version, list(entries))
+
+    def _loaded(self, version: bytes, entries: List[Tuple[Any, Any]]) -> None:
+        if version == self._version:
+            self._on_load(version, entries)
+        # Otherwise we switched to another version while loading.
+
+    # The methods below run in the executor.
+
+    def _append_records(self, records: List[Tuple[Any, Any]]) -> None:
+        try:
+            with open(self._path, 'ab') as f:
+                for record in records:
+                    pickle.dump(record, f, -1)
+        except Exception as ex:
+            self._log_error_threadsafe('could not write', ex)
+        else:
+            self._records += len(records)
+
+    def _load_entries(self, version: bytes) -> None:
+        try:
+            entries = self._load(version)
+        except Exception as ex:
+            self._log_error_threadsafe('could not load', ex)
+            entries = []
+
+        if entries:
+            assert self._loop is not None
+            self._loop.call_soon_threadsafe(self._loaded, version, entries)
+        else:
+            # Either there was nothing to load or the file is for
+            # another version of the schema; start over.
+            self._rewrite_records(version, ())
+
+    def _load(self, version: bytes) -> List[Tuple[Any, Any]]:
+        entries: Dict[Any, Any] = {}
+        records = 0
+        try:
+            f = open(self._path, 'rb')
+        except FileNotFoundError:
+            return []
+
+        with f:
+            try:
+                header = pickle.load(f)
+            except EOFError:
+                return []
+            if header != (FORMAT_TAG, FORMAT_VERSION, version):
+                return []
+
+            while True:
+                try:
+                    key, value = pickle.load(f)
+                except Exception:
+                    # EOF, or a torn write at the end of the file caused
+                    # by a crash; keep whatever was read so far.
+                    break
+                entries.pop(key, None)
+                entries[key] = value
+                records += 1
+
+        self._records = records
+        # Keep the most recently written entries only.
+        return list(entries.items())[-self._maxsize:]
+
+    def _rewrite_records(
+        self,
+        version: bytes,
+        records: Iterable[Tuple[Any, Any]],
+    ) -> None:
+        tmp = self._path.with_suffix('.tmp')
+        records_written = 0
+        try:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump((FORMAT_TAG, FORMAT_VERSION, version), f, -1)
+                for record in records:
+                    pickle.dump(record, f, -1)
+                    records_written += 1
+            os.replace(tmp, self._path)
+        except Exception as ex:
+            self._log_error_threadsafe('could not write', ex)
+        else:
+            self._records = records_written
+
+    def _unlink(self) -> None:
+        try:
+            self._path.unlink(missing_ok=True)
+        except OSError as ex:
+            self._log_error_threadsafe('could not remove', ex)
+        else:
+            self._records = 0
+
+    def _log_error_threadsafe(self, action: str, ex: Exception) -> None:
+        assert self._loop is not None
+        self._loop.call_soon_threadsafe(self._log_error, action, ex)
+
+    def _log_error(self, action: str, ex: Exception) -> None:
+        metrics.background_errors.inc(1.0, 'persistent_query_cache')
+        logger.warning(
+            "%s the persistent query cache file %s: %s",
+            action, self._path, ex,
+        )
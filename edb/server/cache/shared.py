@@ -0,0 +1,168 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2016-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from __future__ import annotations
+from typing import *
+
+import hashlib
+import hmac
+import logging
+import time
+
+from edb.server import defines
+from edb.server import metrics
+
+
+logger = logging.getLogger("edb.server")
+
+LOOKUP_QUERY = b'''\
+    SELECT data FROM edgedb._query_cache
+    WHERE key = $1 AND version = $2
+'''
+
+STORE_QUERY = b'''\
+    INSERT INTO edgedb._query_cache (key, version, data)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (key, version) DO NOTHING
+'''
+
+EVICT_QUERY = b'''\
+    DELETE FROM edgedb._query_cache
+    WHERE version = $1
+'''
+
+EXPIRE_QUERY = b'''\
+    DELETE FROM edgedb._query_cache
+    WHERE stored_at < now() - $1::text::interval
+'''
+
+MAC_SIZE = 32
+
+
+class SharedQueryCache:
+    """Compiled queries of a database shared by all servers of a backend.
+
+    Entries live in the ``edgedb._query_cache`` table of the backend
+    database and are keyed by the digest of the query cache key and the
+    version of the schema and configuration they were compiled against.
+    When a server switches to a new schema version (i.e. on local or
+    remote DDL) it evicts the entries of the version it used before.
+    Servers differing in their configuration or build use different
+    versions and never evict each other's entries.  Entries expire
+    ``SHARED_QUERY_CACHE_MAX_AGE`` seconds after they were stored, so
+    that those of versions no server uses anymore (e.g. of crashed
+    servers, replaced builds or old configurations) do not pile up.
+
+    The data of the entries is authenticated with a MAC keyed by the
+    secret shared by all servers (``--shared-query-cache-key-file``),
+    which also covers the cache key and version of the entry.  Entries
+    that fail the check are ignored: the table is writable by anyone
+    with access to the backend database, and the data is unpickled.
+
+    Failures to reach the table are never fatal: lookups fall back to
+    compiling the query and writes are simply dropped.
+    """
+
+    def __init__(self, server, dbname: str, secret: bytes) -> None:
+        self._server = server
+        self._dbname = dbname
+        # The secret is read from a file and may have any length, but
+        # keys of blake2b are limited to 64 bytes.
+        self._mac_key = hashlib.blake2b(secret, digest_size=32).digest()
+        self._next_expire = 0.0
+
+    async def lookup(self, key: bytes, version: bytes) -> Optional[bytes]:
+        try:
+            conn = await self._server.acquire_pgcon(self._dbname)
+        except Exception as ex:
+            self._log_error('lookup', ex)
+            return None
+
+        try:
+            signed = await conn.sql_fetch_val(
+                LOOKUP_QUERY, args=(key, version), use_prep_stmt=True)
+        except Exception as ex:
+            self._log_error('lookup', ex)
+            return None
+        finally:
+            self._server.release_pgcon(self._dbname, conn)
+
+        if signed is None:
+            return None
+        mac, data = signed[:MAC_SIZE], signed[MAC_SIZE:]
+        if not hmac.compare_digest(mac, self._sign(key, version, data)):
+            metrics.background_errors.inc(1.0, 'shared_query_cache')
+            logger.warning(
+                "ignoring a shared query cache entry of database %r with "
+                "an invalid signature", self._dbname,
+            )
+            return None
+        return data
+
+    def store(self, key: bytes, version: bytes, data: bytes) -> None:
+        signed = self._sign(key, version, data) + data
+        self._run_in_background(STORE_QUERY, (key, version, signed))
+
+        # Expired entries are deleted as new ones come in, at most every
+        # SHARED_QUERY_CACHE_EXPIRE_INTERVAL.
+        now = time.monotonic()
+        if now >= self._next_expire:
+            self._next_expire = (
+                now + defines.SHARED_QUERY_CACHE_EXPIRE_INTERVAL)
+            max_age = f'{defines.SHARED_QUERY_CACHE_MAX_AGE} seconds'
+            self._run_in_background(EXPIRE_QUERY, (max_age.encode(),))
+
+    def evict(self, version: bytes) -> None:
+        # Only entries of the version this server no longer uses are
+        # evicted; other servers may still be using other versions.
+        self._run_in_background(EVICT_QUERY, (version,))
+
+    def _sign(self, key: bytes, version: bytes, data: bytes) -> bytes:
+        h = hashlib.blake2b(key=self._mac_key, digest_size=MAC_SIZE)
+        for part in (key, version):
+            h.update(len(part).to_bytes(4, 'big'))
+            h.update(part)
+        h.update(data)
+        return h.digest()
+
+    def _run_in_background(self, query: bytes, args: Tuple[bytes, ...]):
+        if self._server._accept_new_tasks:
+            self._server.create_task(
+                self._execute(query, args), interruptable=True)
+
+    async def _execute(self, query: bytes, args: Tuple[bytes, ...]):
+        try:
+            conn = await self._server.acquire_pgcon(self._dbname)
+        except Exception as ex:
+            self._log_error('update', ex)
+            return
+
+        try:
+            await conn.sql_fetch(query, args=args, use_prep_stmt=True)
+        except Exception as ex:
+            self._log_error('update', ex)
+        finally:
+            self._server.release_pgcon(self._dbname, conn)
+
+    def _log_error(self, action: str, ex: Exception) -> None:
+        metrics.background_errors.inc(1.0, 'shared_query_cache')
+        logger.warning(
+            "could not %s the shared query cache of database %r: %s",
+            action, self._dbname, ex,
+        )
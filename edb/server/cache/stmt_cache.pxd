@@ -17,14 +17,13 @@
 #
 
 
-cdef class StatementsCache:
+from edb.server.cache.tinylfu cimport TinyLFUCache
+
+
+cdef class StatementsCache(TinyLFUCache):
 
     cdef:
-        object _dict
-        int _maxsize
-        object _dict_move_to_end
-        object _dict_get
+        object _evicted
 
-    cpdef get(self, key, default)
     cpdef needs_cleanup(self)
     cpdef cleanup_one(self)
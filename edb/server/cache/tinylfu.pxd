@@ -0,0 +1,68 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+
+from libc.stdint cimport uint8_t, uint64_t
+
+
+cdef class FrequencySketch:
+
+    cdef:
+        uint8_t *_table
+        uint64_t _width
+        uint64_t _additions
+        uint64_t _sample_size
+
+    cdef int frequency(self, uint64_t h)
+    cdef increment(self, uint64_t h)
+    cdef _reset(self)
+
+
+cdef class TinyLFUCache:
+
+    cdef:
+        object _window
+        object _probation
+        object _protected
+        dict _index
+        object _weigher
+        FrequencySketch _sketch
+
+        Py_ssize_t _maxsize
+        Py_ssize_t _maxweight
+        Py_ssize_t _window_maxsize
+        Py_ssize_t _main_maxsize
+        Py_ssize_t _protected_maxsize
+        Py_ssize_t _weight
+
+        readonly unsigned long long hits
+        readonly unsigned long long misses
+        readonly unsigned long long evictions
+        readonly unsigned long long weight_evictions
+
+    cpdef get(self, key, default=*)
+    cpdef peek(self, key, default=*)
+    cpdef trim(self, Py_ssize_t maxweight)
+
+    cdef _touch(self, key, segment, entry)
+    cdef _admit(self, key, entry)
+    cdef _evict(self)
+    cdef _evict_entry(self, key, segment)
+    cdef _on_insert(self, key)
+    cdef _on_evict(self, key)
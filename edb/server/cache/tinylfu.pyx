@@ -0,0 +1,336 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+
+import collections
+
+cimport cython
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
+from libc.stdint cimport uint8_t, uint64_t
+from libc.string cimport memset
+
+
+DEF SKETCH_DEPTH = 4
+DEF MAX_FREQUENCY = 15
+
+
+cdef object _MISSING = object()
+
+
+cdef inline uint64_t _sketch_index(
+    uint64_t h, uint64_t row, uint64_t width
+):
+    h = (h + row) * <uint64_t>0x9E3779B97F4A7C15
+    h ^= h >> 32
+    return row * width + (h & (width - 1))
+
+
+@cython.final
+cdef class FrequencySketch:
+
+    # A Count-Min sketch of 4-bit counters used to estimate how often
+    # keys were accessed recently.  All counters are halved once the
+    # number of recorded accesses reaches the sample size, so that the
+    # popularity of keys decays over time.
+
+    def __cinit__(self, capacity):
+        cdef uint64_t width = 16
+        while width < capacity:
+            width <<= 1
+
+        self._table = <uint8_t *>PyMem_Malloc(width * SKETCH_DEPTH)
+        if self._table is NULL:
+            raise MemoryError
+        memset(self._table, 0, width * SKETCH_DEPTH)
+
+        self._width = width
+        self._additions = 0
+        self._sample_size = width * 10
+
+    def __dealloc__(self):
+        PyMem_Free(self._table)
+        self._table = NULL
+
+    cdef int frequency(self, uint64_t h):
+        cdef:
+            uint64_t row
+            int freq = MAX_FREQUENCY
+
+        for row in range(SKETCH_DEPTH):
+            freq = min(freq, self._table[_sketch_index(h, row, self._width)])
+        return freq
+
+    cdef increment(self, uint64_t h):
+        cdef:
+            uint64_t row, i
+            int freq = self.frequency(h)
+
+        if freq >= MAX_FREQUENCY:
+            return
+
+        # Conservative update: only bump the counters that are at the
+        # minimum, which reduces the overestimation of rare keys.
+        for row in range(SKETCH_DEPTH):
+            i = _sketch_index(h, row, self._width)
+            if self._table[i] == freq:
+                self._table[i] = freq + 1
+
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._reset()
+
+    cdef _reset(self):
+        cdef uint64_t i
+
+        for i in range(self._width * SKETCH_DEPTH):
+            self._table[i] >>= 1
+        self._additions >>= 1
+
+
+cdef class TinyLFUCache:
+
+    # A W-TinyLFU cache.  New entries are put into a small LRU "window";
+    # entries leaving the window have to compete for admission into the
+    # main segmented LRU with its least recently used entry, and the one
+    # that was accessed more often according to the frequency sketch
+    # wins.  A burst of one-off keys thus only churns the window instead
+    # of flushing the working set.  The main cache is split into the
+    # "probation" segment for newly admitted entries and the "protected"
+    # segment for entries that were accessed again after admission.
+    #
+    # The cache is bounded both by the number of entries (*maxsize*) and,
+    # optionally, by the total weight of the entries (*maxweight*) as
+    # computed by *weigher(key, value)*.
+
+    def __init__(self, *, maxsize, maxweight=None, weigher=None):
+        if maxsize <= 0:
+            raise ValueError(
+                f'maxsize is expected to be greater than 0, got {maxsize}')
+        if maxweight is not None and weigher is None:
+            raise ValueError('maxweight requires a weigher')
+
+        self._window = collections.OrderedDict()
+        self._probation = collections.OrderedDict()
+        self._protected = collections.OrderedDict()
+        self._index = {}
+        self._weigher = weigher
+        self._sketch = FrequencySketch(maxsize)
+
+        self._maxsize = maxsize
+        self._maxweight = maxweight if maxweight is not None else -1
+        self._window_maxsize = max(1, maxsize // 100)
+        self._main_maxsize = maxsize - self._window_maxsize
+        self._protected_maxsize = self._main_maxsize * 4 // 5
+        self._weight = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The evictions made by trim(), i.e. to respect a weight limit
+        # rather than the maximum number of entries.
+        self.weight_evictions = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def maxweight(self):
+        return self._maxweight if self._maxweight >= 0 else None
+
+    @property
+    def weight(self):
+        return self._weight
+
+    cpdef get(self, key, default=None):
+        segment = self._index.get(key)
+        self._sketch.increment(<uint64_t>hash(key))
+        if segment is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        entry = segment[key]
+        self._touch(key, segment, entry)
+        return entry[0]
+
+    cpdef peek(self, key, default=None):
+        # Look the entry up without counting it as an access.
+        segment = self._index.get(key)
+        if segment is None:
+            return default
+        return segment[key][0]
+
+    def __getitem__(self, key):
+        o = self.get(key, _MISSING)
+        if o is _MISSING:
+            raise KeyError(key)
+        return o
+
+    def __setitem__(self, key, o):
+        weight = 0
+        if self._weigher is not None:
+            weight = self._weigher(key, o)
+
+        if self._maxweight >= 0 and weight > self._maxweight:
+            # Would evict everything else and then itself.
+            if key in self._index:
+                del self[key]
+            return
+
+        entry = (o, weight)
+        self._sketch.increment(<uint64_t>hash(key))
+        segment = self._index.get(key)
+        if segment is not None:
+            self._weight += weight - segment[key][1]
+            segment[key] = entry
+            self._touch(key, segment, entry)
+        else:
+            self._window[key] = entry
+            self._index[key] = self._window
+            self._weight += weight
+            self._on_insert(key)
+
+        self._evict()
+
+    def __delitem__(self, key):
+        segment = self._index.pop(key)
+        _, weight = segment.pop(key)
+        self._weight -= weight
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def items(self):
+        # Unlike iterating and looking up every key this doesn't count as
+        # an access to the entries.
+        for segment in (self._probation, self._protected, self._window):
+            for key, (o, _) in segment.items():
+                yield key, o
+
+    def recent_keys(self, n):
+        # Up to *n* keys, most valuable first: the reverse of the order
+        # in which trim() evicts the entries.  Doesn't count as an
+        # access to the entries.
+        keys = []
+        for segment in (self._window, self._protected, self._probation):
+            for key in reversed(segment):
+                if len(keys) >= n:
+                    return keys
+                keys.append(key)
+        return keys
+
+    def clear(self):
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+        self._index.clear()
+        self._weight = 0
+
+    cpdef trim(self, Py_ssize_t maxweight):
+        # Evict entries, least valuable first, until the total weight is
+        # at most *maxweight*.
+        while self._weight > maxweight and self._index:
+            if self._probation:
+                segment = self._probation
+            elif self._protected:
+                segment = self._protected
+            else:
+                segment = self._window
+            self._evict_entry(next(iter(segment)), segment)
+            self.weight_evictions += 1
+
+    cdef _touch(self, key, segment, entry):
+        if segment is self._probation:
+            # Accessed again after admission; protect it.
+            del self._probation[key]
+            self._protected[key] = entry
+            self._index[key] = self._protected
+            while len(self._protected) > self._protected_maxsize:
+                k, e = self._protected.popitem(last=False)
+                self._probation[k] = e
+                self._index[k] = self._probation
+        else:
+            segment.move_to_end(key, last=True)
+
+    cdef _admit(self, key, entry):
+        if len(self._probation) + len(self._protected) < self._main_maxsize:
+            self._probation[key] = entry
+            self._index[key] = self._probation
+            return
+
+        if self._probation:
+            victim_segment = self._probation
+        elif self._protected:
+            victim_segment = self._protected
+        else:
+            victim_segment = None
+
+        if victim_segment is not None:
+            victim = next(iter(victim_segment))
+            if (
+                self._sketch.frequency(<uint64_t>hash(key))
+                > self._sketch.frequency(<uint64_t>hash(victim))
+            ):
+                self._evict_entry(victim, victim_segment)
+                self._probation[key] = entry
+                self._index[key] = self._probation
+                return
+
+        # The candidate lost; it is already out of the window.
+        del self._index[key]
+        self._weight -= entry[1]
+        self.evictions += 1
+        self._on_evict(key)
+
+    cdef _evict(self):
+        while len(self._window) > self._window_maxsize:
+            key, entry = self._window.popitem(last=False)
+            self._admit(key, entry)
+
+        while len(self._index) > self._maxsize:
+            if self._probation:
+                segment = self._probation
+            elif self._protected:
+                segment = self._protected
+            else:
+                segment = self._window
+            self._evict_entry(next(iter(segment)), segment)
+
+        if self._maxweight >= 0:
+            self.trim(self._maxweight)
+
+    cdef _evict_entry(self, key, segment):
+        _, weight = segment.pop(key)
+        del self._index[key]
+        self._weight -= weight
+        self.evictions += 1
+        self._on_evict(key)
+
+    cdef _on_insert(self, key):
+        pass
+
+    cdef _on_evict(self, key):
+        pass
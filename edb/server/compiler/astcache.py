@@ -0,0 +1,87 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from __future__ import annotations
+from typing import *
+
+import pickle
+
+from edb import edgeql
+from edb.edgeql import ast as qlast
+
+from edb.server import defines
+from edb.server import cache
+
+
+def _weigh_entry(key: Tuple[bool, str], pickled: bytes) -> int:
+    return 64 + len(key[1]) + len(pickled)
+
+
+class ASTCache:
+    """A cache of parsed EdgeQL blocks.
+
+    Parse trees do not depend on the schema, so unlike the compiled
+    query caches this cache is not invalidated by DDL, and queries
+    recompiled after a schema change only need to be compiled again,
+    not parsed.
+
+    Entries are keyed by the text of the source.  The normalized cache
+    key cannot be used: the parser contexts refer to the original text,
+    so a tree parsed from a query with other constants would report
+    errors at wrong positions.  The trees are stored pickled: every hit
+    then returns a fresh tree that the compiler is free to modify, and
+    the size of the pickle serves as the weight of the entry.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = defines._MAX_AST_CACHE,
+        maxweight: int = defines._MAX_AST_CACHE_WEIGHT,
+    ) -> None:
+        self._cache = cache.TinyLFUCache(
+            maxsize=maxsize,
+            maxweight=maxweight,
+            weigher=_weigh_entry,
+        )
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    @property
+    def weight(self) -> int:
+        return self._cache.weight
+
+    def parse_block(self, source: edgeql.Source) -> List[qlast.Base]:
+        # Normalized sources are parsed with their constants extracted,
+        # so the same text parses into a different tree.
+        key = (isinstance(source, edgeql.NormalizedSource), source.text())
+
+        pickled = self._cache.get(key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+
+        statements = edgeql.parse_block(source)
+        self._cache[key] = pickle.dumps(statements, -1)
+        return statements
@@ -71,6 +71,7 @@ from edb.pgsql import params as pg_params
 from edb.pgsql import patches as pg_patches
 from edb.pgsql import types as pg_types
 
+from . import astcache
 from . import dbstate
 from . import enums
 from . import sertypes
@@ -372,6 +373,9 @@ class CompilerState:
     local_intro_query: Optional[str]
     global_intro_query: Optional[str]
 
+    ast_cache: astcache.ASTCache = dataclasses.field(
+        default_factory=astcache.ASTCache, compare=False, repr=False)
+
 
 class Compiler:
 
@@ -773,6 +777,7 @@ class Compiler:
         global_schema: s_schema.Schema,
         database_config: immutables.Map[str, config.SettingValue],
         protocol_version: Tuple[int, int],
+        incremental_since: Optional[int] = None,
     ) -> DumpDescriptor:
         schema = s_schema.ChainedSchema(
             self.state.std_schema,
@@ -816,7 +821,8 @@ class Compiler:
             if objtype.is_union_type(schema) or objtype.is_view(schema):
                 continue
             descriptors.extend(_describe_object(schema, objtype,
-                                                protocol_version))
+                                                protocol_version,
+                                                incremental_since))
 
         dynamic_ddl = []
         if sequences:
@@ -844,6 +850,7 @@ class Compiler:
         schema_ids: List[Tuple[str, str, bytes]],
         blocks: List[Tuple[bytes, bytes]],  # type_id, typespec
         protocol_version: Tuple[int, int],
+        incremental: bool = False,
     ) -> RestoreDescriptor:
         schema_object_ids = {
             (
@@ -916,19 +923,35 @@ class Compiler:
             and dump_server_ver.stage is not verutils.VersionStage.DEV
         )
 
-        schema_ddl_text = schema_ddl.decode('utf-8')
+        if incremental:
+            # An incremental dump is applied on top of the database
+            # restored from the previous dumps of the chain, so instead
+            # of recreating the schema we check that it is the same one.
+            units = []
+            schema = ctx.state.current_tx().get_schema(
+                ctx.compiler_state.std_schema)
+            for (name, _), objid in schema_object_ids.items():
+                if schema.get_by_id(objid, None) is None:
+                    raise errors.SchemaError(
+                        f'cannot apply the incremental dump: schema '
+                        f'object {str(name)!r} does not exist in the '
+                        f'database; restore the preceding dumps first'
+                    )
+            allow_dml_in_functions = False
+        else:
+            schema_ddl_text = schema_ddl.decode('utf-8')
 
-        if allow_dml_in_functions:
-            schema_ddl_text = (
-                'CONFIGURE CURRENT DATABASE '
-                'SET allow_dml_in_functions := true;\n'
-                + schema_ddl_text
-            )
+            if allow_dml_in_functions:
+                schema_ddl_text = (
+                    'CONFIGURE CURRENT DATABASE '
+                    'SET allow_dml_in_functions := true;\n'
+                    + schema_ddl_text
+                )
 
-        ddl_source = edgeql.Source.from_string(schema_ddl_text)
-        units = compile(ctx=ctx, source=ddl_source).units
-        schema = ctx.state.current_tx().get_schema(
-            ctx.compiler_state.std_schema)
+            ddl_source = edgeql.Source.from_string(schema_ddl_text)
+            units = compile(ctx=ctx, source=ddl_source).units
+            schema = ctx.state.current_tx().get_schema(
+                ctx.compiler_state.std_schema)
 
         if allow_dml_in_functions:
             # Check if any functions actually contained DML.
@@ -946,6 +969,8 @@ class Compiler:
 
         restore_blocks = []
         tables = []
+        pre_load_sql = []
+        post_load_sql = []
         for schema_object_id, typedesc in blocks:
             schema_object_id = uuidgen.from_bytes(schema_object_id)
             obj = schema.get_by_id(schema_object_id)
@@ -1051,17 +1076,60 @@ class Compiler:
             elided_cols = tuple(i for i, pn in enumerate(desc_ptrs)
                                 if pn in elided_col_set)
 
-            col_list = (
+            col_list = ", ".join(
                 pg_common.quote_ident(cols[pn])
                 for pn in desc_ptrs
                 if pn not in elided_col_set
             )
 
-            stmt = (
-                f'COPY {table_name} '
-                f'({", ".join(col_list)})'
-                f'FROM STDIN WITH BINARY'
-            ).encode()
+            live_ids_stmt = None
+            if incremental and isinstance(obj, s_objtypes.ObjectType):
+                # The inserted and updated objects are loaded into a
+                # staging table and merged into the table once all data
+                # is in; the objects missing from the ids of the live
+                # ones were deleted since the previous dump.
+                staging = pg_common.quote_ident(
+                    f'restore_{schema_object_id}')
+                live = pg_common.quote_ident(
+                    f'restore_live_{schema_object_id}')
+
+                pre_load_sql.append(
+                    f'CREATE TEMPORARY TABLE {staging} '
+                    f'(LIKE {table_name}) ON COMMIT DROP'
+                )
+                pre_load_sql.append(
+                    f'CREATE TEMPORARY TABLE {live} '
+                    f'(id uuid) ON COMMIT DROP'
+                )
+                post_load_sql.append(
+                    f'DELETE FROM {table_name} AS t '
+                    f'USING {staging} AS s WHERE t.id = s.id'
+                )
+                post_load_sql.append(
+                    f'DELETE FROM {table_name} AS t WHERE NOT EXISTS '
+                    f'(SELECT FROM {live} AS l WHERE l.id = t.id)'
+                )
+                post_load_sql.append(
+                    f'INSERT INTO {table_name} ({col_list}) '
+                    f'SELECT {col_list} FROM {staging}'
+                )
+
+                stmt = (
+                    f'COPY {staging} ({col_list}) FROM STDIN WITH BINARY'
+                ).encode()
+                live_ids_stmt = (
+                    f'COPY {live} (id) FROM STDIN WITH BINARY'
+                ).encode()
+            else:
+                if incremental:
+                    # Link and property tables are always dumped in full.
+                    pre_load_sql.append(f'DELETE FROM {table_name}')
+
+                stmt = (
+                    f'COPY {table_name} '
+                    f'({col_list})'
+                    f'FROM STDIN WITH BINARY'
+                ).encode()
 
             restore_blocks.append(
                 RestoreBlockDescriptor(
@@ -1069,6 +1137,7 @@ class Compiler:
                     sql_copy_stmt=stmt,
                     compat_elided_cols=elided_cols,
                     data_mending_desc=tuple(mending_desc),
+                    sql_copy_live_ids_stmt=live_ids_stmt,
                 )
             )
 
@@ -1078,6 +1147,8 @@ class Compiler:
             units=units,
             blocks=restore_blocks,
             tables=tables,
+            pre_load_sql=[q.encode() for q in pre_load_sql],
+            post_load_sql=[q.encode() for q in post_load_sql],
         )
 
 
@@ -1754,7 +1825,7 @@ def _try_compile(
 ) -> dbstate.QueryUnitGroup:
 
     default_cardinality = enums.Cardinality.NO_RESULT
-    statements = edgeql.parse_block(source)
+    statements = ctx.compiler_state.ast_cache.parse_block(source)
     statements_len = len(statements)
 
     if ctx.skip_first:
@@ -2138,6 +2209,7 @@ def _describe_object(
     schema: s_schema.Schema,
     source: s_obj.Object,
     protocol_version: Tuple[int, int],
+    incremental_since: Optional[int] = None,
 ) -> List[DumpBlockDescriptor]:
 
     cols = []
@@ -2240,11 +2312,28 @@ def _describe_object(
         schema, source, catenate=True
     )
 
-    stmt = (
-        f'COPY {table_name} '
-        f'({", ".join(pg_common.quote_ident(c) for c in cols)}) '
-        f'TO STDOUT WITH BINARY'
-    ).encode()
+    col_list = ", ".join(pg_common.quote_ident(c) for c in cols)
+    live_ids_stmt = None
+
+    if incremental_since is not None and isinstance(
+        source, s_objtypes.ObjectType
+    ):
+        # Only dump the objects inserted or updated by the transactions
+        # that are not older than the baseline.  Link and property tables
+        # have no stable row identity and are dumped in full.
+        baseline = pg_common.quote_literal(str(incremental_since % 2 ** 32))
+        stmt = (
+            f'COPY (SELECT {col_list} FROM {table_name} '
+            f'WHERE age(xmin) <= age({baseline}::xid)) '
+            f'TO STDOUT WITH BINARY'
+        ).encode()
+        live_ids_stmt = (
+            f'COPY (SELECT id FROM {table_name}) TO STDOUT WITH BINARY'
+        ).encode()
+    else:
+        stmt = (
+            f'COPY {table_name} ({col_list}) TO STDOUT WITH BINARY'
+        ).encode()
 
     return [DumpBlockDescriptor(
         schema_object_id=source.id,
@@ -2253,6 +2342,7 @@ def _describe_object(
         type_desc_id=type_id,
         type_desc=type_data,
         sql_copy_stmt=stmt,
+        sql_copy_live_ids_stmt=live_ids_stmt,
     )] + ptrdesc
 
 
@@ -2374,6 +2464,10 @@ class DumpBlockDescriptor(NamedTuple):
     type_desc_id: uuid.UUID
     type_desc: bytes
     sql_copy_stmt: bytes
+    #: In incremental dumps, the COPY statement for the ids of all the
+    #: objects that still exist, which lets the restore find the deleted
+    #: ones.
+    sql_copy_live_ids_stmt: Optional[bytes] = None
 
 
 class RestoreDescriptor(NamedTuple):
@@ -2381,6 +2475,10 @@ class RestoreDescriptor(NamedTuple):
     units: Sequence[dbstate.QueryUnit]
     blocks: Sequence[RestoreBlockDescriptor]
     tables: Sequence[str]
+    #: SQL to run before and after the data of an incremental dump is
+    #: loaded: creating the staging tables and merging them in.
+    pre_load_sql: Sequence[bytes] = ()
+    post_load_sql: Sequence[bytes] = ()
 
 
 class DataMendingDescriptor(NamedTuple):
@@ -2408,3 +2506,6 @@ class RestoreBlockDescriptor(NamedTuple):
     #: this will contain the recursive descriptor on which parts of
     #: each datum need mending.
     data_mending_desc: Tuple[Optional[DataMendingDescriptor], ...]
+    #: In incremental restores, the COPY statement for the ids of the
+    #: objects that still exist.
+    sql_copy_live_ids_stmt: Optional[bytes] = None
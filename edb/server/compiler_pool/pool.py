@@ -24,6 +24,7 @@ import asyncio
 import functools
 import hmac
 import logging
+import math
 import os
 import os.path
 import pickle
@@ -36,12 +37,14 @@ import immutables
 
 from edb.common import debug
 from edb.common import taskgroup
+from edb.common import windowedsum
 
 from edb.pgsql import params as pgparams
 
 from edb.server import args as srvargs
 from edb.server import defines
 from edb.server import metrics
+from edb.server.connpool import rolavg
 
 from . import amsg
 from . import queue
@@ -52,6 +55,16 @@ PROCESS_INITIAL_RESPONSE_TIMEOUT: float = 60.0
 KILL_TIMEOUT: float = 10.0
 ADAPTIVE_SCALE_UP_WAIT_TIME: float = 3.0
 ADAPTIVE_SCALE_DOWN_WAIT_TIME: float = 60.0
+# How often the adaptive pool re-estimates the number of workers it needs
+# from the recent compile arrival rate and compile duration.
+ADAPTIVE_PREDICT_INTERVAL: float = 1.0
+# Provision this many times the estimated number of busy workers ...
+ADAPTIVE_PREDICT_HEADROOM: float = 1.5
+# ... plus this many idle workers to absorb bursts while new workers spawn.
+ADAPTIVE_SPARE_WORKERS: int = 1
+# Send the whole user schema instead of a delta if the delta touches more
+# than this fraction of the schema objects.
+SCHEMA_DELTA_MAX_RATIO: float = 0.5
 WORKER_PKG: str = __name__.rpartition('.')[0] + '.'
 
 
@@ -70,6 +83,15 @@ def _pickle_memoized(schema):
     return pickle.dumps(schema, -1)
 
 
+@functools.lru_cache()
+def _pickle_schema_delta(base_schema, user_schema):
+    delta = user_schema.get_delta(base_schema)
+    if delta.get_size() > delta.base_size * SCHEMA_DELTA_MAX_RATIO:
+        return _pickle_memoized(user_schema)
+    else:
+        return pickle.dumps(delta, -1)
+
+
 class BaseWorker:
 
     _dbs: state.DatabasesState
@@ -117,8 +139,11 @@ class BaseWorker:
             return data[0]
         elif status == 1:
             exc, tb = data
-            if (sync_state is not None and
-                    not isinstance(exc, state.FailedStateSync)):
+            if isinstance(exc, state.FailedStateSync):
+                # We no longer know what the worker has, so make sure
+                # the next call sends the full state instead of deltas.
+                self._dbs = immutables.Map()
+            elif sync_state is not None:
                 sync_state()
             exc.__formatted_error__ = tb
             raise exc
@@ -168,7 +193,22 @@ class Worker(BaseWorker):
             pass
 
 
+class _CompileBatch:
+
+    def __init__(self, state):
+        # The (dbname, user_schema, global_schema, reflection_cache,
+        # database_config, system_config) tuple all requests of the
+        # batch are compiled against.
+        self.state = state
+        self.requests: Dict[bytes, asyncio.Future] = {}
+
+
 class AbstractPool:
+
+    # The maximum number of compile requests sent to a worker in one
+    # call; 1 disables batching.
+    _batch_size: int = 1
+
     def __init__(
         self,
         *,
@@ -188,6 +228,14 @@ class AbstractPool:
         self._refl_schema = refl_schema
         self._schema_class_layout = schema_class_layout
 
+        self._compile_batches: Dict[Tuple[int, ...], _CompileBatch] = {}
+        self._compiles_in_flight: Dict[
+            Tuple[Tuple[int, ...], bytes], asyncio.Future] = {}
+        self._compile_batch_tasks: Set[asyncio.Task] = set()
+
+        self._stats_sync_hits = 0
+        self._stats_sync_misses = 0
+
     @functools.lru_cache(maxsize=None)
     def _get_init_args(self):
         init_args = self._get_init_args_uncached()
@@ -311,7 +359,8 @@ class AbstractPool:
         else:
             if worker_db.user_schema is not user_schema:
                 preargs += (
-                    _pickle_memoized(user_schema),
+                    self._pickle_user_schema(
+                        worker_db.user_schema, user_schema),
                 )
                 to_update['user_schema'] = user_schema
             else:
@@ -356,17 +405,63 @@ class AbstractPool:
                 dbname=dbname,
                 **to_update
             )
+            self._stats_sync_misses += 1
+            metrics.compiler_pool_worker_syncs.inc(1.0, 'miss')
         else:
             callback = None
+            self._stats_sync_hits += 1
+            metrics.compiler_pool_worker_syncs.inc(1.0, 'hit')
 
         return preargs, callback
 
+    def _sync_weighter(
+        self,
+        dbname,
+        user_schema,
+        global_schema,
+        reflection_cache,
+        database_config,
+        system_config,
+        worker,
+    ):
+        # Prefer the workers that already have the database, then those
+        # that have its current schema, then the ones that need the
+        # fewest other parts of the state synced.
+        worker_db = worker._dbs.get(dbname)
+        if worker_db is None:
+            return (False, False, 0)
+        return (
+            True,
+            worker_db.user_schema is user_schema,
+            (worker_db.reflection_cache is reflection_cache)
+            + (worker_db.database_config is database_config)
+            + (worker._global_schema is global_schema)
+            + (worker._system_config is system_config),
+        )
+
+    def get_sync_stats(self):
+        return dict(
+            hits=self._stats_sync_hits,
+            misses=self._stats_sync_misses,
+        )
+
+    def _pickle_user_schema(self, worker_schema, user_schema):
+        return _pickle_memoized(user_schema)
+
     async def _acquire_worker(self, *, condition=None, weighter=None):
         raise NotImplementedError
 
     def _release_worker(self, worker, *, put_in_front: bool = True):
         raise NotImplementedError
 
+    def get_spare_capacity(self) -> int:
+        """Return the number of requests that can be compiled right away.
+
+        Background work should only use this capacity, so that it never
+        delays the compilation of client queries.
+        """
+        raise NotImplementedError
+
     async def compile(
         self,
         dbname,
@@ -377,7 +472,30 @@ class AbstractPool:
         system_config,
         *compile_args
     ):
-        worker = await self._acquire_worker()
+        if self._batch_size > 1:
+            return await self._compile_batched(
+                (
+                    dbname,
+                    user_schema,
+                    global_schema,
+                    reflection_cache,
+                    database_config,
+                    system_config,
+                ),
+                compile_args,
+            )
+
+        worker = await self._acquire_worker(
+            weighter=functools.partial(
+                self._sync_weighter,
+                dbname,
+                user_schema,
+                global_schema,
+                reflection_cache,
+                database_config,
+                system_config,
+            )
+        )
         try:
             preargs, sync_state = await self._compute_compile_preargs(
                 worker,
@@ -404,6 +522,93 @@ class AbstractPool:
         finally:
             self._release_worker(worker)
 
+    async def _compile_batched(self, state, compile_args):
+        # Requests compiled against the very same database state are
+        # queued into a batch that is sent to the first available worker
+        # in one call, so that a burst of compiles doesn't turn into as
+        # many state syncs and round trips.  The state objects are
+        # referenced by the batch, so their ids are stable meanwhile.
+        batch_key = tuple(map(id, state))
+        args_pickled = pickle.dumps(compile_args, -1)
+        request_key = (batch_key, args_pickled)
+
+        fut = self._compiles_in_flight.get(request_key)
+        if fut is None:
+            batch = self._compile_batches.get(batch_key)
+            if batch is None:
+                batch = _CompileBatch(state)
+                self._compile_batches[batch_key] = batch
+                task = self._loop.create_task(
+                    self._run_compile_batch(batch_key, batch))
+                self._compile_batch_tasks.add(task)
+                task.add_done_callback(self._compile_batch_tasks.discard)
+
+            fut = self._loop.create_future()
+            fut.add_done_callback(
+                functools.partial(self._compile_done, request_key))
+            batch.requests[args_pickled] = fut
+            self._compiles_in_flight[request_key] = fut
+            if len(batch.requests) >= self._batch_size:
+                # The batch is full, the next request starts a new one.
+                del self._compile_batches[batch_key]
+
+        # Identical requests share the result; don't let one of them
+        # being cancelled cancel the others.
+        return await asyncio.shield(fut)
+
+    def _compile_done(self, request_key, fut):
+        self._compiles_in_flight.pop(request_key, None)
+        if not fut.cancelled():
+            # Mark the exception as retrieved in case all of the
+            # waiters are gone.
+            fut.exception()
+
+    async def _run_compile_batch(self, batch_key, batch):
+        worker = None
+        try:
+            worker = await self._acquire_worker(
+                weighter=functools.partial(self._sync_weighter, *batch.state))
+            if self._compile_batches.get(batch_key) is batch:
+                del self._compile_batches[batch_key]
+
+            preargs, sync_state = await self._compute_compile_preargs(
+                worker, *batch.state)
+            results = await worker.call(
+                'compile_batch',
+                *preargs,
+                list(batch.requests),
+                sync_state=sync_state,
+            )
+
+            for fut, (status, *data) in zip(
+                batch.requests.values(), results
+            ):
+                if status == 0:
+                    units, pickled_state = data[0]
+                    worker._last_pickled_state = pickled_state
+                    fut.set_result((units, pickled_state, 0))
+                else:
+                    exc, tb = data
+                    exc.__formatted_error__ = tb
+                    fut.set_exception(exc)
+
+        except BaseException as ex:
+            for fut in batch.requests.values():
+                if fut.done():
+                    continue
+                if isinstance(ex, Exception):
+                    fut.set_exception(ex)
+                else:
+                    fut.cancel()
+            if not isinstance(ex, Exception):
+                raise
+
+        finally:
+            if self._compile_batches.get(batch_key) is batch:
+                del self._compile_batches[batch_key]
+            if worker is not None:
+                self._release_worker(worker)
+
     async def compile_in_tx(
         self, txid, pickled_state, state_id, *compile_args
     ):
@@ -466,7 +671,17 @@ class AbstractPool:
         system_config,
         *compile_args
     ):
-        worker = await self._acquire_worker()
+        worker = await self._acquire_worker(
+            weighter=functools.partial(
+                self._sync_weighter,
+                dbname,
+                user_schema,
+                global_schema,
+                reflection_cache,
+                database_config,
+                system_config,
+            )
+        )
         try:
             preargs, sync_state = await self._compute_compile_preargs(
                 worker,
@@ -513,7 +728,17 @@ class AbstractPool:
         system_config,
         *compile_args
     ):
-        worker = await self._acquire_worker()
+        worker = await self._acquire_worker(
+            weighter=functools.partial(
+                self._sync_weighter,
+                dbname,
+                user_schema,
+                global_schema,
+                reflection_cache,
+                database_config,
+                system_config,
+            )
+        )
         try:
             preargs, sync_state = await self._compute_compile_preargs(
                 worker,
@@ -545,7 +770,17 @@ class AbstractPool:
         system_config,
         *compile_args
     ):
-        worker = await self._acquire_worker()
+        worker = await self._acquire_worker(
+            weighter=functools.partial(
+                self._sync_weighter,
+                dbname,
+                user_schema,
+                global_schema,
+                reflection_cache,
+                database_config,
+                system_config,
+            )
+        )
         try:
             preargs, sync_state = await self._compute_compile_preargs(
                 worker,
@@ -613,6 +848,7 @@ class BaseLocalPool(
         *,
         runstate_dir,
         pool_size,
+        batch_size=1,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -628,6 +864,8 @@ class BaseLocalPool(
 
         assert pool_size >= 1
         self._pool_size = pool_size
+        assert batch_size >= 1
+        self._batch_size = batch_size
         self._workers = {}
 
         self._server = amsg.Server(self._poolsock_name, self._loop, self)
@@ -706,11 +944,16 @@ class BaseLocalPool(
             PROCESS_INITIAL_RESPONSE_TIMEOUT
         )
 
-    async def _create_compiler_process(self, numproc=None, version=0):
+    async def _create_compiler_process(
+        self, numproc=None, version=0, std_args_path=None
+    ):
         # Create a new compiler process. When numproc is None, a single
         # standalone compiler worker process is started; if numproc is an int,
         # a compiler template process will be created, which will then fork
         # itself into `numproc` actual worker processes and run as a supervisor
+        #
+        # If std_args_path is set, the process loads the std schema and
+        # the compiler from that file before forking.
 
         env = _ENV
         if debug.flags.server:
@@ -729,6 +972,10 @@ class BaseLocalPool(
             cmdline.extend([
                 '--numproc', str(numproc),
             ])
+        if std_args_path:
+            cmdline.extend([
+                '--std-args', std_args_path,
+            ])
 
         transport, _ = await self._loop.subprocess_exec(
             lambda: self,
@@ -789,6 +1036,16 @@ class BaseLocalPool(
         if worker.get_pid() in self._workers:
             self._workers_queue.release(worker, put_in_front=put_in_front)
 
+    def get_spare_capacity(self) -> int:
+        if self._workers_queue.count_waiters():
+            return 0
+        return self._workers_queue.qsize()
+
+    def _pickle_user_schema(self, worker_schema, user_schema):
+        # Local workers unpickle the schema themselves, so a worker that
+        # has a previous version of it only needs the changed objects.
+        return _pickle_schema_delta(worker_schema, user_schema)
+
 
 @srvargs.CompilerPoolMode.Fixed.assign_implementation
 class FixedPool(BaseLocalPool):
@@ -797,6 +1054,7 @@ class FixedPool(BaseLocalPool):
         self._template_transport = None
         self._template_proc_scheduled = False
         self._template_proc_version = 0
+        self._std_args_path = None
 
     def _worker_attached(self):
         if len(self._workers) > self._pool_size:
@@ -826,8 +1084,54 @@ class FixedPool(BaseLocalPool):
             return self._template_transport.get_pid()
 
     async def _start(self):
+        if self._std_schema is not None:
+            self._write_std_args()
         await self._create_template_proc(retry=False)
 
+    def _write_std_args(self):
+        # The template process preloads the std schema and the compiler
+        # from this file, so that the forked workers share them instead
+        # of each unpickling a private copy in __init_worker__.
+        path = os.path.join(self._runstate_dir, 'compiler-std-args.pickle')
+        with open(path, 'wb') as f:
+            pickle.dump(
+                (
+                    self._backend_runtime_params,
+                    self._std_schema,
+                    self._refl_schema,
+                    self._schema_class_layout,
+                ),
+                f,
+                -1,
+            )
+        self._std_args_path = path
+
+    def _get_pickled_init_args(self, init_args):
+        if self._std_args_path is None:
+            return super()._get_pickled_init_args(init_args)
+        (
+            dbs,
+            backend_runtime_params,
+            _std_schema,
+            _refl_schema,
+            _schema_class_layout,
+            global_schema,
+            system_config,
+        ) = init_args
+        # Workers already have the std schema from the template.
+        return pickle.dumps(
+            (
+                dbs,
+                backend_runtime_params,
+                None,
+                None,
+                None,
+                global_schema,
+                system_config,
+            ),
+            -1,
+        )
+
     async def _create_template_proc(self, retry=True):
         self._template_proc_scheduled = False
         if not self._running:
@@ -840,6 +1144,7 @@ class FixedPool(BaseLocalPool):
             self._template_transport = await self._create_compiler_process(
                 numproc=self._pool_size,
                 version=self._template_proc_version,
+                std_args_path=self._std_args_path,
             )
         except Exception:
             if retry:
@@ -867,6 +1172,12 @@ class FixedPool(BaseLocalPool):
             trans.terminate()
             await trans._wait()
             trans.close()
+        path, self._std_args_path = self._std_args_path, None
+        if path is not None:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
 
 
 @srvargs.CompilerPoolMode.OnDemand.assign_implementation
@@ -877,14 +1188,26 @@ class SimpleAdaptivePool(BaseLocalPool):
         self._expected_num_workers = 0
         self._scale_up_handle = None
         self._scale_down_handle = None
+        self._predict_handle = None
         self._max_num_workers = pool_size
+        self._num_spawning = 0
+        # Compile requests in the last minute and the time they held a
+        # worker, used to spawn workers ahead of demand.
+        self._compile_arrivals = windowedsum.WindowedSum()
+        self._compile_duration_avg = rolavg.RollingAverage(history_size=50)
+        self._acquired_at = {}
 
     async def _start(self):
         async with taskgroup.TaskGroup() as g:
             for _i in range(self._pool_size):
                 g.create_task(self._create_worker())
+        self._predict_handle = self._loop.call_later(
+            ADAPTIVE_PREDICT_INTERVAL, self._predictive_scale)
 
     async def _stop(self):
+        if self._predict_handle is not None:
+            self._predict_handle.cancel()
+            self._predict_handle = None
         self._expected_num_workers = 0
         transports, self._worker_transports = self._worker_transports, {}
         for transport in transports.values():
@@ -910,14 +1233,20 @@ class SimpleAdaptivePool(BaseLocalPool):
         if self._scale_down_handle is not None:
             self._scale_down_handle.cancel()
             self._scale_down_handle = None
-        return await super()._acquire_worker(
+        self._compile_arrivals += 1
+        worker = await super()._acquire_worker(
             condition=condition, weighter=weighter
         )
+        self._acquired_at[worker.get_pid()] = time.monotonic()
+        return worker
 
     def _release_worker(self, worker, *, put_in_front: bool = True):
         if self._scale_down_handle is not None:
             self._scale_down_handle.cancel()
             self._scale_down_handle = None
+        acquired_at = self._acquired_at.pop(worker.get_pid(), None)
+        if acquired_at is not None:
+            self._compile_duration_avg.add(time.monotonic() - acquired_at)
         super()._release_worker(worker, put_in_front=put_in_front)
         if (
             self._running and
@@ -932,6 +1261,7 @@ class SimpleAdaptivePool(BaseLocalPool):
     def worker_disconnected(self, pid):
         num_workers_before = len(self._workers)
         super().worker_disconnected(pid)
+        self._acquired_at.pop(pid, None)
         trans = self._worker_transports.pop(pid, None)
         if trans:
             trans.close()
@@ -959,12 +1289,14 @@ class SimpleAdaptivePool(BaseLocalPool):
                     self._worker_transports.pop(pid, None)
 
     async def _create_worker(self):
+        self._num_spawning += 1
         try:
             # Creates a single compiler worker process.
             transport = await self._create_compiler_process()
             self._worker_transports[transport.get_pid()] = transport
             self._expected_num_workers += 1
         finally:
+            self._num_spawning -= 1
             self._scale_up_handle = None
 
     def _maybe_scale_up(self, starting_num_waiters):
@@ -976,22 +1308,66 @@ class SimpleAdaptivePool(BaseLocalPool):
                 "spawn a new compiler worker process now.",
                 ADAPTIVE_SCALE_UP_WAIT_TIME,
             )
+            metrics.compiler_pool_scaling_decisions.inc(1.0, 'reactive_up')
             self._loop.create_task(self._create_worker())
         else:
             self._scale_up_handle = None
 
+    def _predict_num_workers(self):
+        # By Little's law the average number of busy workers is the
+        # arrival rate of compile requests times the average time each
+        # of them holds a worker.  The arrivals are summed over a minute.
+        rate = float(self._compile_arrivals) / 60
+        if not rate:
+            return self._pool_size
+        busy = rate * self._compile_duration_avg.avg()
+        num_workers = (
+            math.ceil(busy * ADAPTIVE_PREDICT_HEADROOM)
+            + ADAPTIVE_SPARE_WORKERS
+        )
+        return max(self._pool_size, min(num_workers, self._max_num_workers))
+
+    def _predictive_scale(self):
+        self._predict_handle = None
+        if not self._running:
+            return
+
+        num_workers = self._predict_num_workers()
+        metrics.predicted_compiler_processes.set(num_workers)
+        missing = num_workers - self._expected_num_workers - self._num_spawning
+        if missing > 0:
+            logger.info(
+                "Compile request rate is growing, spawn %d new compiler "
+                "worker process%s ahead of demand.",
+                missing, 'es' if missing > 1 else '',
+            )
+            metrics.compiler_pool_scaling_decisions.inc(
+                missing, 'predictive_up')
+            for _i in range(missing):
+                self._loop.create_task(self._create_worker())
+
+        self._predict_handle = self._loop.call_later(
+            ADAPTIVE_PREDICT_INTERVAL, self._predictive_scale)
+
     def _scale_down(self):
         self._scale_down_handle = None
-        if not self._running or len(self._workers) <= self._pool_size:
+        if not self._running:
+            return
+        # Keep the workers the recent traffic still calls for, including
+        # the warm spares.
+        num_workers = self._predict_num_workers()
+        if len(self._workers) <= num_workers:
             return
         logger.info(
             "The compiler pool is not used in %d seconds, scaling down to %d.",
-            ADAPTIVE_SCALE_DOWN_WAIT_TIME, self._pool_size,
+            ADAPTIVE_SCALE_DOWN_WAIT_TIME, num_workers,
         )
-        self._expected_num_workers = self._pool_size
+        metrics.compiler_pool_scaling_decisions.inc(
+            len(self._workers) - num_workers, 'down')
+        self._expected_num_workers = num_workers
         for worker in sorted(
             self._workers.values(), key=lambda w: w._last_used
-        )[:-self._pool_size]:
+        )[:-num_workers]:
             worker.close()
 
 
@@ -1118,7 +1494,7 @@ class RemotePool(AbstractPool):
             self._worker = self._loop.create_future()
             self._loop.create_task(self.start(retry=True))
 
-    async def _acquire_worker(self, *, condition=None, cmp=None):
+    async def _acquire_worker(self, *, condition=None, weighter=None):
         await self._semaphore.acquire()
         return await self._worker
 
@@ -1127,6 +1503,11 @@ class RemotePool(AbstractPool):
             self._sync_lock.release()
         self._semaphore.release()
 
+    def get_spare_capacity(self) -> int:
+        # The load of the remote compiler is unknown; only compile in
+        # the background when none of our requests are waiting.
+        return 0 if self._semaphore.locked() else 1
+
     async def compile_in_tx(
         self, txid, pickled_state, state_id, *compile_args
     ):
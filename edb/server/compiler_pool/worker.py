@@ -21,6 +21,7 @@ from __future__ import annotations
 from typing import *  # NoQA
 
 import pickle
+import traceback
 
 import immutables
 
@@ -37,6 +38,9 @@ from . import worker_proc
 
 
 INITED: bool = False
+# Whether the std schema and the compiler were loaded by the template
+# process this worker was forked from.
+PRELOADED: bool = False
 DBS: state.DatabasesState = immutables.Map()
 BACKEND_RUNTIME_PARAMS: pgparams.BackendRuntimeParams = \
     pgparams.get_default_runtime_params()
@@ -47,6 +51,37 @@ GLOBAL_SCHEMA: s_schema.FlatSchema
 INSTANCE_CONFIG: immutables.Map[str, config.SettingValue]
 
 
+def __preload_std__(
+    std_args_path: str,
+) -> None:
+    # Called in the template process before it forks the workers, so that
+    # they share the pages of the std schema and the compiler.
+    global PRELOADED
+    global BACKEND_RUNTIME_PARAMS
+    global COMPILER
+    global STD_SCHEMA
+
+    with open(std_args_path, 'rb') as f:
+        (
+            backend_runtime_params,
+            std_schema,
+            refl_schema,
+            schema_class_layout,
+        ) = pickle.load(f)
+
+    PRELOADED = True
+    BACKEND_RUNTIME_PARAMS = backend_runtime_params
+    STD_SCHEMA = std_schema
+
+    COMPILER = compiler.new_compiler(
+        std_schema,
+        refl_schema,
+        schema_class_layout,
+        backend_runtime_params=BACKEND_RUNTIME_PARAMS,
+        load_config=True,
+    )
+
+
 def __init_worker__(
     init_args_pickled: bytes,
 ) -> None:
@@ -70,11 +105,20 @@ def __init_worker__(
 
     INITED = True
     DBS = dbs
-    BACKEND_RUNTIME_PARAMS = backend_runtime_params
-    STD_SCHEMA = std_schema
     GLOBAL_SCHEMA = global_schema
     INSTANCE_CONFIG = system_config
 
+    if std_schema is None:
+        # The pool omits the std schema for workers forked from
+        # a template that has it preloaded.
+        if not PRELOADED:
+            raise RuntimeError(
+                "compiler worker was not forked from a preloaded template")
+        return
+
+    BACKEND_RUNTIME_PARAMS = backend_runtime_params
+    STD_SCHEMA = std_schema
+
     COMPILER = compiler.new_compiler(
         std_schema,
         refl_schema,
@@ -103,6 +147,7 @@ def __sync__(
             assert reflection_cache is not None
             assert database_config is not None
             user_schema_unpacked = pickle.loads(user_schema)
+            assert isinstance(user_schema_unpacked, s_schema.FlatSchema)
             reflection_cache_unpacked = pickle.loads(reflection_cache)
             database_config_unpacked = pickle.loads(database_config)
             db = state.DatabaseState(
@@ -116,7 +161,11 @@ def __sync__(
             updates = {}
 
             if user_schema is not None:
-                updates['user_schema'] = pickle.loads(user_schema)
+                user_schema_unpacked = pickle.loads(user_schema)
+                if isinstance(user_schema_unpacked, s_schema.FlatSchemaDelta):
+                    user_schema_unpacked = db.user_schema.apply_delta(
+                        user_schema_unpacked)
+                updates['user_schema'] = user_schema_unpacked
             if reflection_cache is not None:
                 updates['reflection_cache'] = pickle.loads(reflection_cache)
             if database_config is not None:
@@ -177,6 +226,50 @@ def compile(
     return units, pickled_state
 
 
+def compile_batch(
+    dbname: str,
+    user_schema: Optional[bytes],
+    reflection_cache: Optional[bytes],
+    global_schema: Optional[bytes],
+    database_config: Optional[bytes],
+    system_config: Optional[bytes],
+    batch: List[bytes],
+):
+    db = __sync__(
+        dbname,
+        user_schema,
+        reflection_cache,
+        global_schema,
+        database_config,
+        system_config,
+    )
+
+    global LAST_STATE
+    results = []
+    for compile_args in batch:
+        try:
+            units, cstate = COMPILER.compile(
+                db.user_schema,
+                GLOBAL_SCHEMA,
+                db.reflection_cache,
+                db.database_config,
+                INSTANCE_CONFIG,
+                *pickle.loads(compile_args),
+            )
+        except Exception as ex:
+            worker_proc.prepare_exception(ex)
+            results.append((1, ex, traceback.format_exc()))
+            continue
+
+        LAST_STATE = cstate
+        pickled_state = None
+        if cstate is not None:
+            pickled_state = pickle.dumps(cstate, -1)
+        results.append((0, (units, pickled_state)))
+
+    return results
+
+
 def compile_in_tx(cstate, *args, **kwargs):
     global LAST_STATE
     if cstate == state.REUSE_LAST_STATE_MARKER:
@@ -314,6 +407,8 @@ def compile_sql(
 def get_handler(methname):
     if methname == "__init_worker__":
         meth = __init_worker__
+    elif methname == "__preload_std__":
+        meth = __preload_std__
     else:
         if not INITED:
             raise RuntimeError(
@@ -321,6 +416,8 @@ def get_handler(methname):
             )
         if methname == "compile":
             meth = compile
+        elif methname == "compile_batch":
+            meth = compile_batch
         elif methname == "compile_in_tx":
             meth = compile_in_tx
         elif methname == "compile_notebook":
@@ -113,9 +113,19 @@ def main(get_handler):
     parser.add_argument("--sockname")
     parser.add_argument("--numproc")
     parser.add_argument("--version-serial", type=int)
+    parser.add_argument("--std-args")
     args = parser.parse_args()
 
+    if args.numproc is not None:
+        # Avoid garbage collections leaving freed holes in the pages the
+        # forked workers are going to share with the template.
+        gc.disable()
+
+    if args.std_args:
+        get_handler("__preload_std__")(args.std_args)
     ql_parser.preload(allow_rebuild=False)
+    # Move everything loaded so far into the permanent generation, so
+    # that collections in the workers don't touch (and copy) the pages.
     gc.freeze()
 
     listen_for_debugger()
@@ -197,4 +207,5 @@ def main(get_handler):
 
     # child process - clear the SIGTERM handler for potential Rust impl
     signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
     run_worker(args.sockname, args.version_serial, get_handler)
@@ -17,6 +17,8 @@
 #
 
 from .pool import Pool, _NaivePool  # NoQA
+from .qos import QosClass, QosPolicy  # NoQA
+from .trace import TraceRecorder  # NoQA
 
 
-__all__ = ('Pool',)
+__all__ = ('Pool', 'QosClass', 'QosPolicy', 'TraceRecorder')
@@ -26,7 +26,9 @@ import collections
 import dataclasses
 import time
 
+from . import qos
 from . import rolavg
+from . import trace
 
 
 MIN_CONN_TIME_THRESHOLD = 0.01
@@ -34,6 +36,12 @@ MIN_QUERY_TIME_THRESHOLD = 0.001
 MIN_LOG_TIME_THRESHOLD = 1
 CONNECT_FAILURE_RETRIES = 3
 MIN_IDLE_TIME_BEFORE_GC = 120
+# Blocks that acquired a connection within this many seconds are kept
+# with at least the minimum number of idle connections.
+MIN_IDLE_HOT_TIME = 600
+# Number of the most recently used connections that are checked for a
+# preferred connection on acquire.
+PREFER_SCAN_DEPTH = 8
 
 logger = logging.getLogger("edb.server")
 
@@ -96,6 +104,7 @@ class ConnectionState:
     in_use_since: float = 0
     in_use: bool = False
     in_stack_since: float = 0
+    requested_at: float = 0
 
 
 class Block(typing.Generic[C]):
@@ -120,10 +129,12 @@ class Block(typing.Generic[C]):
 
     loop: asyncio.AbstractEventLoop
     dbname: str
+    qos: qos.QosClass
     conns: typing.Dict[C, ConnectionState]
     quota: int
     pending_conns: int
     last_connect_timestamp: float
+    last_acquire_timestamp: float
 
     conn_acquired_num: int
     conn_waiters_num: int
@@ -144,12 +155,15 @@ class Block(typing.Generic[C]):
         self,
         dbname: str,
         loop: asyncio.AbstractEventLoop,
+        qos_class: qos.QosClass,
     ) -> None:
         self.dbname = dbname
+        self.qos = qos_class
         self.conns = {}
         self.quota = 1
         self.pending_conns = 0
         self.last_connect_timestamp = 0
+        self.last_acquire_timestamp = 0
 
         self.loop = loop
 
@@ -185,6 +199,14 @@ class Block(typing.Generic[C]):
         # Number of future connections that are still pending in connecting
         return self.pending_conns
 
+    def count_guaranteed_conns(self) -> int:
+        # How many connections the QoS class of the block guarantees it
+        # with its current demand
+        return min(
+            self.qos.min_conns,
+            self.conn_waiters_num + self.conn_acquired_num,
+        )
+
     def count_conns_over_quota(self) -> int:
         # How many connections over the quota
         return max(self.count_conns() - self.quota, 0)
@@ -226,7 +248,10 @@ class Block(typing.Generic[C]):
 
         return self.conn_stack.popleft()
 
-    async def acquire(self) -> C:
+    async def acquire(
+        self,
+        prefer: typing.Optional[typing.Callable[[C], bool]] = None,
+    ) -> C:
         # There can be a race between a waiter scheduled for to wake up
         # and a connection being stolen (due to quota being enforced,
         # for example).  In which case the waiter might get finally
@@ -256,7 +281,8 @@ class Block(typing.Generic[C]):
 
                 try:
                     await waiter
-                except Exception:
+                except BaseException:
+                    # Including cancellation, e.g. by a timeout.
                     if not waiter.done():
                         waiter.cancel()
                     try:
@@ -271,6 +297,18 @@ class Block(typing.Generic[C]):
                         self._wakeup_next_waiter()
                     raise
 
+            if prefer is not None:
+                # All idle connections cost the same to acquire, so take
+                # the one the caller prefers if it's near the top of the
+                # stack.  Connections deeper in the stack are left for GC.
+                stack = self.conn_stack
+                top = len(stack) - 1
+                for i in range(top, max(top - PREFER_SCAN_DEPTH, -1), -1):
+                    conn = stack[i]
+                    if prefer(conn):
+                        del stack[i]
+                        return conn
+
             # Yield the most recently used connection from the top of the stack
             return self.conn_stack.pop()
         finally:
@@ -365,6 +403,10 @@ class BasePool(typing.Generic[C]):
 
     _conntime_avg: rolavg.RollingAverage
 
+    _recorder: typing.Optional[trace.TraceRecorder]
+
+    _qos_policy: qos.QosPolicy
+
     def __init__(
         self,
         *,
@@ -372,6 +414,7 @@ class BasePool(typing.Generic[C]):
         disconnect: Disconnector[C],
         max_capacity: int,
         stats_collector: typing.Optional[StatsCollector]=None,
+        qos_policy: typing.Optional[qos.QosPolicy]=None,
     ) -> None:
         self._connect_cb = connect
         self._disconnect_cb = disconnect
@@ -393,6 +436,10 @@ class BasePool(typing.Generic[C]):
 
         self._conntime_avg = rolavg.RollingAverage(history_size=10)
 
+        self._recorder = None
+
+        self._qos_policy = qos_policy or qos.DEFAULT_POLICY
+
     @property
     def max_capacity(self) -> int:
         return self._max_capacity
@@ -414,6 +461,21 @@ class BasePool(typing.Generic[C]):
             block.count_pending_conns() for block in self._blocks.values()
         )
 
+    def get_qos_class(self, dbname: str) -> qos.QosClass:
+        return self._qos_policy.get_class(dbname)
+
+    def start_recording(self, recorder: trace.TraceRecorder) -> None:
+        """Record every acquired connection into the given trace."""
+        if self._recorder is not None:
+            self._recorder.close()
+        self._recorder = recorder
+
+    async def stop_recording(self) -> None:
+        if self._recorder is not None:
+            recorder, self._recorder = self._recorder, None
+            recorder.close()
+            await recorder.wait()
+
     def _get_loop(self) -> asyncio.AbstractEventLoop:
         if self._loop is None:
             self._loop = asyncio.get_running_loop()
@@ -485,7 +547,8 @@ class BasePool(typing.Generic[C]):
 
     def _new_block(self, dbname: str) -> Block[C]:
         assert dbname not in self._blocks
-        block: Block[C] = Block(dbname, self._get_loop())
+        block: Block[C] = Block(
+            dbname, self._get_loop(), self._qos_policy.get_class(dbname))
         self._blocks[dbname] = block
         block.quota = 1
         if self._is_starving:
@@ -663,6 +726,7 @@ class Pool(BasePool[C]):
     _to_drop: typing.List[Block[C]]
     _gc_interval: float  # minimum seconds between GC runs
     _gc_requests: int  # number of GC requests
+    _min_idle: int  # number of connections kept in hot blocks by GC
 
     def __init__(
         self,
@@ -672,12 +736,15 @@ class Pool(BasePool[C]):
         max_capacity: int,
         stats_collector: typing.Optional[StatsCollector]=None,
         min_idle_time_before_gc: float = MIN_IDLE_TIME_BEFORE_GC,
+        min_idle: int = 0,
+        qos_policy: typing.Optional[qos.QosPolicy]=None,
     ) -> None:
         super().__init__(
             connect=connect,
             disconnect=disconnect,
             stats_collector=stats_collector,
             max_capacity=max_capacity,
+            qos_policy=qos_policy,
         )
 
         self._new_blocks_waitlist = collections.OrderedDict()
@@ -690,6 +757,7 @@ class Pool(BasePool[C]):
         self._to_drop = []
         self._gc_interval = min_idle_time_before_gc
         self._gc_requests = 0
+        self._min_idle = min_idle
 
     def _maybe_schedule_tick(self) -> None:
         if self._first_tick:
@@ -742,7 +810,8 @@ class Pool(BasePool[C]):
         self._to_drop.clear()
         for block in self._blocks.values():
             nwaiters = block.count_waiters() + block.conn_acquired_num
-            block.quota = nwaiters  # will likely be overwritten below
+            # will likely be overwritten below
+            block.quota = block.qos.cap(nwaiters)
             total_nwaiters += nwaiters
             block.nwaiters_avg.add(nwaiters)
             nwaiters_avg = block.nwaiters_avg.avg()
@@ -758,7 +827,8 @@ class Pool(BasePool[C]):
 
             demand = (
                 max(nwaiters_avg, nwaiters) *
-                max(block.querytime_avg.avg(), MIN_QUERY_TIME_THRESHOLD)
+                max(block.querytime_avg.avg(), MIN_QUERY_TIME_THRESHOLD) *
+                block.qos.weight
             )
             total_calibrated_demand += demand
             block._cached_calibrated_demand = demand
@@ -802,7 +872,11 @@ class Pool(BasePool[C]):
 
             for block in tuple(self._blocks.values()):
                 nconns = block.count_conns()
-                if nconns == 1:
+                if nconns and block.count_guaranteed_conns():
+                    # The QoS class of the block guarantees it connections,
+                    # so it's not taking part in the round-robin.
+                    block.quota = 1
+                elif nconns == 1:
                     if (
                         now - block.last_connect_timestamp <
                             max(self._conntime_avg.avg(),
@@ -851,22 +925,66 @@ class Pool(BasePool[C]):
 
             assert capacity_left > 0
 
-            acc: float = 0
+            self._distribute_quota(capacity_left)
+
             for block in self._blocks.values():
-                demand = block._cached_calibrated_demand
-                if not demand:
-                    continue
+                if block._cached_calibrated_demand:
+                    self._log_to_snapshot(
+                        dbname=block.dbname, event='set-quota',
+                        value=block.quota)
+
+            self._maybe_rebalance()
+
+    def _distribute_quota(self, capacity: int) -> None:
+        # Distribute the capacity between the blocks with demand, in
+        # proportion to their calibrated demand.  The quotas are then
+        # clamped to the shares guaranteed and allowed by the QoS classes
+        # of the blocks, and the rest of the capacity is distributed again
+        # between the remaining blocks, until all quotas are within their
+        # limits.
+        blocks = [
+            block for block in self._blocks.values()
+            if block._cached_calibrated_demand
+        ]
+        fixed: typing.Dict[Block[C], int] = {}
+        fixed_capacity = 0
+
+        while True:
+            capacity_left = capacity - fixed_capacity
+            free_blocks = [block for block in blocks if block not in fixed]
+            total_demand = sum(
+                block._cached_calibrated_demand for block in free_blocks)
+            if not free_blocks or capacity_left <= 0:
+                for block in free_blocks:
+                    block.quota = 0
+                break
 
+            acc: float = 0
+            for block in free_blocks:
                 old_acc = acc
                 acc += (
-                    (capacity_left * demand) / total_calibrated_demand
+                    (capacity_left * block._cached_calibrated_demand) /
+                    total_demand
                 )
                 block.quota = round(acc) - round(old_acc)
 
-                self._log_to_snapshot(
-                    dbname=block.dbname, event='set-quota', value=block.quota)
-
-            self._maybe_rebalance()
+            clamped = False
+            for block in free_blocks:
+                quota = block.qos.cap(block.quota)
+                guaranteed = block.count_guaranteed_conns()
+                if (
+                    quota < guaranteed and
+                    fixed_capacity + guaranteed <= capacity
+                ):
+                    quota = guaranteed
+                if quota != block.quota:
+                    block.quota = quota
+                    fixed[block] = quota
+                    fixed_capacity += quota
+                    clamped = True
+
+            if not clamped:
+                break
 
     def _maybe_rebalance(self) -> None:
         if self._is_starving:
@@ -1015,8 +1133,9 @@ class Pool(BasePool[C]):
             return 'first-conn', to_block
 
         # Find if there are blocks without a single connection.
-        # Find the one that is starving the most.
-        max_need = 0
+        # Find the one that is starving the most, by the weight of its
+        # QoS class.
+        max_need: float = 0
         for block in self._blocks.values():
             block_size = block.count_conns()
             block_demand = block.count_waiters()
@@ -1024,23 +1143,28 @@ class Pool(BasePool[C]):
             if block_size or not block_demand:
                 continue
 
-            if block_demand > max_need:
-                max_need = block_demand
+            need = block_demand * block.qos.weight
+            if need > max_need:
+                max_need = need
                 to_block = block
 
         if to_block is not None:
             return 'revive-conn', to_block
 
         # Find all blocks that are under quota and award the most
-        # starving one.
-        max_need = 0
+        # starving one.  Blocks below the share guaranteed by their QoS
+        # class come first.
+        max_priority: typing.Tuple[bool, float] = (False, 0)
         for block in self._blocks.values():
             block_size = block.count_conns()
             block_quota = block.quota
             if block_quota > block_size:
-                need = block_quota - block_size
-                if need > max_need:
-                    max_need = need
+                priority = (
+                    block_size < block.count_guaranteed_conns(),
+                    (block_quota - block_size) * block.qos.weight,
+                )
+                if priority > max_priority:
+                    max_priority = priority
                     to_block = block
 
         if to_block:
@@ -1048,11 +1172,18 @@ class Pool(BasePool[C]):
 
         return None, None
 
-    async def _acquire(self, dbname: str) -> C:
+    async def _acquire(
+        self,
+        dbname: str,
+        prefer: typing.Optional[typing.Callable[[C], bool]],
+    ) -> C:
         block = self._get_block(dbname)
 
-        room_for_new_conns = self._cur_capacity < self._max_capacity
         block_nconns = block.count_conns()
+        room_for_new_conns = (
+            self._cur_capacity < self._max_capacity and
+            block.qos.cap(block_nconns + 1) > block_nconns
+        )
 
         if room_for_new_conns:
             # First, schedule new connections if needed.
@@ -1076,7 +1207,7 @@ class Pool(BasePool[C]):
                 # Block has no connections at all, or not enough connections.
                 self._schedule_new_conn(block)
 
-            return await block.acquire()
+            return await block.acquire(prefer)
 
         if not block_nconns:
             # This is a block without any connections.
@@ -1084,15 +1215,15 @@ class Pool(BasePool[C]):
             # reallocated for this block.
             if not self._try_steal_conn(block):
                 self._new_blocks_waitlist[block] = True
-            return await block.acquire()
+            return await block.acquire(prefer)
 
         if block_nconns < block.quota:
             # Let's see if we can steal a connection from some block
             # that's over quota and open a new one.
             self._try_steal_conn(block)
-            return await block.acquire()
+            return await block.acquire(prefer)
 
-        return await block.acquire()
+        return await block.acquire(prefer)
 
     def _run_gc(self) -> None:
         loop = self._get_loop()
@@ -1114,24 +1245,94 @@ class Pool(BasePool[C]):
         # Make sure the unused connections stay in the pool for at least one
         # GC interval. So theoretically unused connections are usually GC-ed
         # within 1-2 GC intervals.
-        only_older_than = time.monotonic() - self._gc_interval
+        now = time.monotonic()
+        only_older_than = now - self._gc_interval
         for block in self._blocks.values():
-            while (conn := block.try_steal(only_older_than)) is not None:
+            # Don't reap the blocks that are still in use below the
+            # minimum, so that they don't pay for new connections again.
+            if now - block.last_acquire_timestamp < MIN_IDLE_HOT_TIME:
+                keep = self._min_idle
+            else:
+                keep = 0
+            while (
+                block.count_conns() > keep
+                and (conn := block.try_steal(only_older_than)) is not None
+            ):
                 loop.create_task(self._discard_conn(block, conn))
 
-    async def acquire(self, dbname: str) -> C:
+    def prewarm(
+        self,
+        dbnames: typing.Optional[typing.Iterable[str]] = None,
+    ) -> None:
+        """Open connections to the given databases up to the minimum.
+
+        If *dbnames* is not given, the databases that acquired connections
+        recently are prewarmed, the most recently used ones first (e.g.
+        after all connections were pruned on a failover).  The connections
+        are opened in parallel in the background, as long as there is
+        room in the pool.  If a prewarmed database is not used after all,
+        its connections are reaped by GC like any other idle ones.
+        """
+        if not self._min_idle:
+            return
+
+        now = time.monotonic()
+        if dbnames is None:
+            blocks = sorted(
+                (
+                    block for block in self._blocks.values()
+                    if now - block.last_acquire_timestamp < MIN_IDLE_HOT_TIME
+                ),
+                key=lambda block: block.last_acquire_timestamp,
+                reverse=True,
+            )
+        else:
+            blocks = [self._get_block(dbname) for dbname in dbnames]
+
+        for block in blocks:
+            min_idle = block.qos.cap(self._min_idle)
+            for _ in range(min_idle - block.count_conns()):
+                if self._cur_capacity >= self._max_capacity:
+                    return
+                self._schedule_new_conn(block, 'prewarmed')
+
+    async def _connect(
+        self, block: Block[C], started_at: float, event: str
+    ) -> None:
+        await super()._connect(block, started_at, event)
+        if event == 'prewarmed':
+            # Nobody may ever acquire a prewarmed connection, so have GC
+            # look at it just like at a released one.
+            self._request_gc()
+
+    async def acquire(
+        self,
+        dbname: str,
+        *,
+        prefer: typing.Optional[typing.Callable[[C], bool]] = None,
+    ) -> C:
+        """Acquire a connection to the given database.
+
+        If *prefer* is given, an idle connection for which it returns True
+        is chosen over the other idle ones, e.g. a connection that already
+        has the statement about to be run prepared.
+        """
+        requested_at = time.monotonic()
         self._nacquires += 1
         self._maybe_schedule_tick()
         try:
-            conn = await self._acquire(dbname)
+            conn = await self._acquire(dbname, prefer)
         finally:
             self._nacquires -= 1
 
         block = self._blocks[dbname]
-        assert not block.conns[conn].in_use
+        conn_state = block.conns[conn]
+        assert not conn_state.in_use
         block.inc_acquire_counter()
-        block.conns[conn].in_use = True
-        block.conns[conn].in_use_since = time.monotonic()
+        block.last_acquire_timestamp = now = time.monotonic()
+        conn_state.in_use = True
+        conn_state.in_use_since = now
+        conn_state.requested_at = requested_at
 
         return conn
 
@@ -1158,8 +1359,14 @@ class Pool(BasePool[C]):
                 f'never acquired from the pool'
             ) from None
 
+        now = time.monotonic()
         block.dec_acquire_counter()
-        block.querytime_avg.add(time.monotonic() - conn_state.in_use_since)
+        block.querytime_avg.add(now - conn_state.in_use_since)
+        if self._recorder is not None:
+            self._recorder.record(
+                dbname, conn_state.requested_at, conn_state.in_use_since, now)
+            if not self._recorder.active:
+                self._recorder = None
         conn_state.in_use = False
         conn_state.in_use_since = 0
 
@@ -1178,11 +1385,14 @@ class Pool(BasePool[C]):
             block.release(conn)
 
             # Only request for GC if the connection is released unused
-            self._gc_requests += 1
-            if self._gc_requests == 1:
-                # Only schedule GC for the very first request - following
-                # requests will be grouped into the next GC
-                self._get_loop().call_later(self._gc_interval, self._run_gc)
+            self._request_gc()
+
+    def _request_gc(self) -> None:
+        self._gc_requests += 1
+        if self._gc_requests == 1:
+            # Only schedule GC for the very first request - following
+            # requests will be grouped into the next GC
+            self._get_loop().call_later(self._gc_interval, self._run_gc)
 
     async def prune_inactive_connections(self, dbname: str) -> None:
         try:
@@ -0,0 +1,172 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Quality of service classes of the databases in the connection pool.
+
+A QoS policy assigns databases to classes, and every class has:
+
+* ``weight`` -- how much the demand of its databases counts when the
+  pool divides connections between databases at its max capacity.
+* ``min_conns`` -- the number of connections guaranteed to each of its
+  databases, as long as the database has that many concurrent requests.
+* ``max_conns`` -- the maximum number of connections each of its
+  databases may hold at any time.
+
+Policies are loaded from JSON:
+
+    {
+        "classes": {
+            "premium": {"weight": 4, "min_conns": 5},
+            "batch": {"weight": 0.5, "max_conns": 10}
+        },
+        "databases": {"main": "premium", "etl": "batch"}
+    }
+
+Databases that are not listed belong to the ``default`` class, which
+has a weight of 1 and no limits unless it is defined explicitly.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import typing
+
+
+DEFAULT_CLASS = 'default'
+
+
+@dataclasses.dataclass(frozen=True)
+class QosClass:
+    name: str
+    weight: float = 1.0
+    min_conns: int = 0
+    max_conns: typing.Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if (
+            not isinstance(self.weight, (int, float))
+            or isinstance(self.weight, bool)
+        ):
+            raise ValueError(
+                f'QoS class {self.name!r}: weight must be a number')
+        for field in ('min_conns', 'max_conns'):
+            value = getattr(self, field)
+            if value is None and field == 'max_conns':
+                continue
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(
+                    f'QoS class {self.name!r}: {field} must be an integer')
+        if self.weight <= 0:
+            raise ValueError(
+                f'QoS class {self.name!r}: weight must be positive')
+        if self.min_conns < 0:
+            raise ValueError(
+                f'QoS class {self.name!r}: min_conns must not be negative')
+        if self.max_conns is not None:
+            if self.max_conns < 1:
+                raise ValueError(
+                    f'QoS class {self.name!r}: max_conns must be positive')
+            if self.min_conns > self.max_conns:
+                raise ValueError(
+                    f'QoS class {self.name!r}: min_conns must not be '
+                    f'greater than max_conns')
+
+    def cap(self, nconns: int) -> int:
+        if self.max_conns is not None and nconns > self.max_conns:
+            return self.max_conns
+        return nconns
+
+
+class QosPolicy:
+
+    _classes: typing.Dict[str, QosClass]
+    _databases: typing.Dict[str, QosClass]
+    _default: QosClass
+
+    def __init__(
+        self,
+        classes: typing.Iterable[QosClass] = (),
+        databases: typing.Optional[typing.Mapping[str, str]] = None,
+    ) -> None:
+        self._classes = {cls.name: cls for cls in classes}
+        self._default = self._classes.setdefault(
+            DEFAULT_CLASS, QosClass(DEFAULT_CLASS))
+        self._databases = {}
+        for dbname, clsname in (databases or {}).items():
+            try:
+                self._databases[dbname] = self._classes[clsname]
+            except KeyError:
+                raise ValueError(
+                    f'database {dbname!r} is assigned to an undefined '
+                    f'QoS class {clsname!r}') from None
+
+    @property
+    def classes(self) -> typing.Iterable[QosClass]:
+        return self._classes.values()
+
+    def get_class(self, dbname: str) -> QosClass:
+        return self._databases.get(dbname, self._default)
+
+    @classmethod
+    def from_dict(cls, data: typing.Mapping[str, typing.Any]) -> QosPolicy:
+        if not isinstance(data, dict):
+            raise ValueError('QoS policy must be a JSON object')
+        unknown = set(data) - {'classes', 'databases'}
+        if unknown:
+            raise ValueError(
+                f'unexpected QoS policy keys: {", ".join(sorted(unknown))}')
+
+        class_specs = data.get('classes', {})
+        if not isinstance(class_specs, dict):
+            raise ValueError('QoS policy "classes" must be a JSON object')
+        databases = data.get('databases', {})
+        if not isinstance(databases, dict):
+            raise ValueError('QoS policy "databases" must be a JSON object')
+
+        classes = []
+        for name, spec in class_specs.items():
+            try:
+                if not isinstance(spec, dict):
+                    raise TypeError
+                classes.append(QosClass(name, **spec))
+            except TypeError:
+                raise ValueError(
+                    f'QoS class {name!r}: expected an object with weight, '
+                    f'min_conns and max_conns') from None
+
+        for dbname, clsname in databases.items():
+            if not isinstance(clsname, str):
+                raise ValueError(
+                    f'database {dbname!r} must be assigned to a QoS class '
+                    f'name')
+
+        return cls(classes, databases)
+
+
+DEFAULT_POLICY = QosPolicy()
+
+
+def load_policy(path: typing.Union[str, os.PathLike]) -> QosPolicy:
+    with open(path) as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'invalid JSON: {e}') from None
+    return QosPolicy.from_dict(data)
@@ -0,0 +1,241 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Compact binary traces of the connection pool traffic.
+
+A trace file starts with MAGIC, followed by records that start with a
+one-byte kind:
+
+* ``D`` -- a database name: uint16 length and the UTF-8 encoded name.
+  Databases are numbered in the order of their ``D`` records.
+* ``A`` -- a released connection: uint16 database number, and uint32
+  microseconds since the start of the trace when the connection was
+  requested, for how long the request waited, and for how long the
+  connection was held.
+
+All integers are little-endian.  The records are written in the order
+of releases.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import functools
+import logging
+import os
+import struct
+import time
+import typing
+
+
+logger = logging.getLogger('edb.server')
+
+MAGIC = b'EDBCPTR1'
+
+# Buffered records are written out when they reach this many bytes.
+FLUSH_SIZE = 64 * 1024
+
+# Durations are stored in uint32 microseconds.
+MAX_DURATION = 0xFFFFFFFF / 1_000_000
+
+_DB = struct.Struct('<cH')
+_ACQUIRE = struct.Struct('<cHIII')
+
+
+class TraceRecorder:
+    """Writes a trace of the pool traffic until it reaches its limits.
+
+    Records are buffered on the event loop; full buffers are written to
+    the file one at a time, in order, in the default executor.
+    """
+
+    _file: typing.Optional[typing.BinaryIO]
+    _dbs: typing.Dict[str, int]
+    _ops: typing.Deque[typing.Callable[[], None]]
+    _writer: typing.Optional[asyncio.Task[None]]
+
+    def __init__(
+        self,
+        path: typing.Union[str, os.PathLike],
+        *,
+        max_size: int,
+        max_duration: float,
+    ) -> None:
+        self._path = path
+        self._max_size = max_size
+        self._max_duration = min(max_duration, MAX_DURATION)
+        self._dbs = {}
+        self._buf = bytearray()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        # The number of bytes handed to the writer.
+        self._size = len(MAGIC)
+        self._started_at = time.monotonic()
+        self._closed = False
+        self._ops = collections.deque()
+        self._writer = None
+
+    @property
+    def active(self) -> bool:
+        # The file is closed by the writer if a write fails.
+        return not self._closed and self._file is not None
+
+    def record(
+        self,
+        dbname: str,
+        requested_at: float,
+        acquired_at: float,
+        released_at: float,
+    ) -> None:
+        if not self.active:
+            return
+
+        if released_at - self._started_at > self._max_duration:
+            self.close()
+            return
+
+        rec = b''
+        db = self._dbs.get(dbname)
+        if db is None:
+            db = len(self._dbs)
+            name = dbname.encode('utf-8')
+            rec = _DB.pack(b'D', len(name)) + name
+
+        rec += _ACQUIRE.pack(
+            b'A',
+            db & 0xFFFF,
+            _to_us(max(requested_at - self._started_at, 0)),
+            _to_us(acquired_at - requested_at),
+            _to_us(released_at - acquired_at),
+        )
+
+        if (
+            self._size + len(self._buf) + len(rec) > self._max_size
+            or db > 0xFFFF
+        ):
+            self.close()
+            return
+
+        self._dbs[dbname] = db
+        self._buf += rec
+
+        if len(self._buf) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.active or not self._buf:
+            return
+        data = bytes(self._buf)
+        self._buf.clear()
+        self._size += len(data)
+        self._submit(self._write, data)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._submit(self._close)
+
+    async def wait(self) -> None:
+        """Wait until everything recorded so far is written."""
+        while self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    def _submit(self, op: typing.Callable[..., None], *args: bytes) -> None:
+        self._ops.append(functools.partial(op, *args))
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(
+                self._run_ops())
+
+    async def _run_ops(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._ops:
+                await loop.run_in_executor(None, self._ops.popleft())
+        finally:
+            self._writer = None
+
+    # The methods below run in the executor.
+
+    def _write(self, data: bytes) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.write(data)
+            self._file.flush()
+        except OSError as ex:
+            logger.warning(
+                'could not write the connection pool trace %s: %s',
+                self._path, ex)
+            self._file.close()
+            self._file = None
+
+    def _close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        logger.info(
+            'finished recording the connection pool trace %s '
+            '(%d bytes)', self._path, self._size)
+
+
+def _to_us(seconds: float) -> int:
+    return min(max(int(seconds * 1_000_000), 0), 0xFFFFFFFF)
+
+
+def read_trace(
+    data: bytes,
+) -> typing.Iterator[typing.Tuple[str, float, float, float]]:
+    """Yield (dbname, requested_at, wait, hold) of the recorded requests.
+
+    All times are in seconds; *requested_at* is relative to the start of
+    the trace.  A record truncated by a crash ends the trace.
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a connection pool trace')
+
+    dbs: typing.List[str] = []
+    pos = len(MAGIC)
+    end = len(data)
+    while pos < end:
+        kind = data[pos:pos + 1]
+        if kind == b'A':
+            if pos + _ACQUIRE.size > end:
+                return
+            _, db, requested_at, wait, hold = _ACQUIRE.unpack_from(data, pos)
+            pos += _ACQUIRE.size
+            yield (
+                dbs[db],
+                requested_at / 1_000_000,
+                wait / 1_000_000,
+                hold / 1_000_000,
+            )
+        elif kind == b'D':
+            if pos + _DB.size > end:
+                return
+            _, namelen = _DB.unpack_from(data, pos)
+            pos += _DB.size
+            if pos + namelen > end:
+                return
+            dbs.append(data[pos:pos + namelen].decode('utf-8'))
+            pos += namelen
+        else:
+            raise ValueError(f'unexpected trace record kind {kind!r}')
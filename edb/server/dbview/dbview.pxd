@@ -67,6 +67,9 @@ cdef class DatabaseIndex:
         object _std_schema
         object _global_schema
         object _factory
+        Py_ssize_t _query_cache_weight
+
+    cdef _enforce_query_cache_budget(self)
 
 
 cdef class Database:
@@ -74,6 +77,14 @@ cdef class Database:
     cdef:
         object _eql_to_compiled
         object _sql_to_compiled
+        object _compiles_in_flight
+        object _persistent_cache
+        object _shared_cache
+        object _query_cache_version
+        Py_ssize_t _query_cache_weight
+        Py_ssize_t _query_cache_evictions
+        Py_ssize_t _query_cache_weight_evictions
+        double _query_cache_last_used
         DatabaseIndex _index
         object _views
         object _introspection_lock
@@ -92,9 +103,15 @@ cdef class Database:
 
     cdef _invalidate_caches(self)
     cdef _cache_compiled_query(self, key, query_unit)
+    cdef _update_query_cache_version(self)
+    cdef _get_query_cache_version(self)
+    cdef _account_query_cache(self, str weight_reason)
+    cdef _query_cache_updated(self)
+    cdef _trim_query_cache(self, Py_ssize_t excess)
     cdef _new_view(self, query_cache, protocol_version)
     cdef _remove_view(self, view)
     cdef _update_backend_ids(self, new_types)
+    cdef _schedule_recompile(self, keys)
     cdef _set_and_signal_new_user_schema(
         self,
         new_schema,
@@ -173,6 +190,8 @@ cdef class DatabaseConnectionView:
 
     cdef cache_compiled_query(self, object key, object query_unit)
     cdef lookup_compiled_query(self, object key)
+    cdef _cache_shared_compiled_query(
+        self, object key, object query_unit_group, object version)
 
     cdef tx_error(self)
 
@@ -22,7 +22,9 @@ from typing import (
 
 import asyncio
 import base64
+import hashlib
 import json
+import logging
 import os.path
 import pickle
 import struct
@@ -33,12 +35,15 @@ import weakref
 import immutables
 
 from edb import errors
-from edb.common import lru, uuidgen
+from edb.common import uuidgen
 from edb import edgeql
 from edb.edgeql import qltypes
 from edb.schema import extensions as s_ext
 from edb.schema import schema as s_schema
+from edb.schema import version as s_ver
 from edb.server import compiler, defines, config, metrics
+from edb.server import cache
+from edb.server.cache import persistent, shared
 from edb.server.compiler import dbstate, sertypes
 from edb.pgsql import dbops
 
@@ -46,6 +51,8 @@ cimport cython
 
 __all__ = ('DatabaseIndex', 'DatabaseConnectionView', 'SideEffects')
 
+cdef object logger = logging.getLogger('edb.server')
+
 cdef DEFAULT_MODALIASES = immutables.Map({None: defines.DEFAULT_MODULE_ALIAS})
 cdef DEFAULT_CONFIG = immutables.Map()
 cdef DEFAULT_GLOBALS = immutables.Map()
@@ -63,6 +70,133 @@ cdef next_dbver():
     return VER_COUNTER
 
 
+def _weigh_compiled(key, value):
+    # A rough estimate of the memory held by a query cache entry, which
+    # is dominated by the SQL and the type descriptors.
+    compiled, _ = value
+    size = 512
+    if isinstance(compiled, dbstate.QueryUnitGroup):
+        size += len(compiled.in_type_data) + len(compiled.out_type_data)
+        for unit in compiled:
+            size += len(unit.in_type_data) + len(unit.out_type_data)
+            for sql in unit.sql:
+                size += len(sql)
+    else:
+        for sql in compiled:
+            size += len(sql)
+    return size
+
+
+cdef _config_digest(settings):
+    # Settings maps are not ordered, sort them to get a stable digest
+    # across server restarts.
+    spec = config.get_settings()
+    return json.dumps(
+        sorted(
+            (name, config.value_to_json_value(spec[name], value.value))
+            for name, value in settings.items()
+        )
+    ).encode('utf-8')
+
+
+cdef _persistent_query_key(key):
+    query_req, modaliases, session_config = key
+    source = query_req.source
+    return (
+        isinstance(source, edgeql.NormalizedSource),
+        source.text(),
+        query_req.protocol_version,
+        query_req.output_format,
+        query_req.input_format,
+        query_req.expect_one,
+        query_req.implicit_limit,
+        query_req.inline_typeids,
+        query_req.inline_typenames,
+        query_req.inline_objectids,
+        modaliases,
+        session_config,
+    )
+
+
+cdef _query_key_from_persistent(data):
+    (
+        normalized,
+        text,
+        protocol_version,
+        output_format,
+        input_format,
+        expect_one,
+        implicit_limit,
+        inline_typeids,
+        inline_typenames,
+        inline_objectids,
+        modaliases,
+        session_config,
+    ) = data
+
+    if normalized:
+        source = edgeql.NormalizedSource.from_string(text)
+    else:
+        source = edgeql.Source.from_string(text)
+
+    query_req = QueryRequestInfo(
+        source,
+        protocol_version,
+        output_format=output_format,
+        input_format=input_format,
+        expect_one=expect_one,
+        implicit_limit=implicit_limit,
+        inline_typeids=inline_typeids,
+        inline_typenames=inline_typenames,
+        inline_objectids=inline_objectids,
+    )
+    return query_req, modaliases, session_config
+
+
+async def _recompile_query(compiler_pool, compile_args, key):
+    query_req, modaliases, session_config = key
+    query_unit_group, _, _ = await compiler_pool.compile(
+        *compile_args,
+        query_req.source,
+        modaliases,
+        session_config,
+        query_req.output_format,
+        query_req.expect_one,
+        query_req.implicit_limit,
+        query_req.inline_typeids,
+        query_req.inline_typenames,
+        False,  # skip_first
+        query_req.protocol_version,
+        query_req.inline_objectids,
+        query_req.input_format is compiler.InputFormat.JSON,
+    )
+    return query_unit_group
+
+
+cdef _shared_query_key(dbname, key):
+    # Unlike _persistent_query_key() this must produce the same value in
+    # all server processes, so hash only the stable parts of the key.
+    query_req, modaliases, session_config = key
+    source = query_req.source
+    h = hashlib.blake2b(digest_size=32)
+    h.update(dbname.encode('utf-8'))
+    h.update(source.cache_key())
+    h.update(pickle.dumps((
+        isinstance(source, edgeql.NormalizedSource),
+        query_req.protocol_version,
+        query_req.output_format,
+        query_req.input_format,
+        query_req.expect_one,
+        query_req.implicit_limit,
+        query_req.inline_typeids,
+        query_req.inline_typenames,
+        query_req.inline_objectids,
+        sorted(modaliases.items(), key=lambda kv: kv[0] or ''),
+    ), -1))
+    h.update(_config_digest(session_config))
+    return h.digest()
+
+
 @cython.final
 cdef class QueryRequestInfo:
 
@@ -162,10 +296,46 @@ cdef class Database:
 
         self._introspection_lock = asyncio.Lock()
 
-        self._eql_to_compiled = lru.LRUMapping(
-            maxsize=defines._MAX_QUERIES_CACHE)
-        self._sql_to_compiled = lru.LRUMapping(
-            maxsize=defines._MAX_QUERIES_CACHE)
+        maxweight = index._server.get_query_cache_database_memory_limit()
+        self._eql_to_compiled = cache.TinyLFUCache(
+            maxsize=defines._MAX_QUERIES_CACHE,
+            maxweight=maxweight,
+            weigher=_weigh_compiled,
+        )
+        self._sql_to_compiled = cache.TinyLFUCache(
+            maxsize=defines._MAX_QUERIES_CACHE,
+            maxweight=maxweight,
+            weigher=_weigh_compiled,
+        )
+        # The weight and the number of evictions of the caches last
+        # reported to the index and to the metrics.
+        self._query_cache_weight = 0
+        self._query_cache_evictions = 0
+        self._query_cache_weight_evictions = 0
+        self._query_cache_last_used = time.monotonic()
+
+        # Maps query cache keys to [future, dbver, number of waiters]
+        # of the compilations in progress.
+        self._compiles_in_flight = {}
+        self._query_cache_version = None
+        self._persistent_cache = None
+        cache_dir = index._server.get_query_cache_dir()
+        if cache_dir is not None:
+            self._persistent_cache = (
+                persistent.PersistentQueryCache.for_database(
+                    cache_dir,
+                    index._server.get_tenant_id(),
+                    name,
+                    maxsize=defines._MAX_QUERIES_CACHE,
+                    snapshot=self._persistable_queries,
+                    on_load=self._load_persistent_queries,
+                )
+            )
+        self._shared_cache = None
+        shared_secret = index._server.get_shared_query_cache_secret()
+        if shared_secret is not None:
+            self._shared_cache = shared.SharedQueryCache(
+                index._server, name, shared_secret)
 
         self.db_config = db_config
         self.user_schema = user_schema
@@ -179,6 +349,9 @@ cdef class Database:
         else:
             self.extensions = extensions
 
+        self._update_query_cache_version()
+        self._query_cache_updated()
+
     @property
     def server(self):
         return self._index._server
@@ -214,7 +387,95 @@ cdef class Database:
             self.reflection_cache = reflection_cache
         if db_config is not None:
             self.db_config = db_config
+
+        # Pick the queries to recompile before the cache is cleared.
+        recompile = ()
+        recompile_limit = (
+            self._index._server.get_query_cache_recompile_after_ddl())
+        if recompile_limit:
+            recompile = self._eql_to_compiled.recent_keys(recompile_limit)
         self._invalidate_caches()
+        if recompile:
+            self._schedule_recompile(recompile)
+
+    cdef _schedule_recompile(self, keys):
+        server = self._index._server
+        if server._accept_new_tasks:
+            server.create_task(
+                self._recompile_queries(keys, self.dbver),
+                interruptable=True,
+            )
+
+    async def _recompile_queries(self, keys, dbver):
+        # Recompile the queries that were cached before a schema change
+        # against the new schema, so that they don't all miss the cache
+        # at once.  Only idle compiler workers are used, and the results
+        # are cached all at once when done, unless the schema changed
+        # again in the meantime.
+        compiler_pool = self._index._server.get_compiler_pool()
+        compile_args = (
+            self.name,
+            self.user_schema,
+            self._index._global_schema,
+            self.reflection_cache,
+            self.db_config,
+            self._index._comp_sys_config,
+        )
+        keys = list(keys)
+        compiled = []
+        failed = 0
+
+        while keys:
+            if self.dbver != dbver:
+                break
+
+            spare = compiler_pool.get_spare_capacity()
+            if not spare:
+                await asyncio.sleep(
+                    defines.QUERY_CACHE_RECOMPILE_RETRY_INTERVAL)
+                continue
+
+            batch = []
+            while keys and len(batch) < spare:
+                key = keys.pop(0)
+                _, cached_dbver = self._eql_to_compiled.peek(
+                    key, DICTDEFAULT)
+                if cached_dbver != dbver:
+                    # Not compiled by a client request in the meantime.
+                    batch.append(key)
+            if not batch:
+                continue
+
+            results = await asyncio.gather(
+                *(
+                    _recompile_query(compiler_pool, compile_args, key)
+                    for key in batch
+                ),
+                return_exceptions=True,
+            )
+            for key, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.debug(
+                        'could not recompile a query of database %r '
+                        'after DDL: %s', self.name, result)
+                    failed += 1
+                elif result.cacheable:
+                    compiled.append((key, result))
+
+        if failed:
+            metrics.query_cache_recompilations.inc(failed, 'failed')
+
+        if self.dbver != dbver:
+            metrics.query_cache_recompilations.inc(
+                len(compiled) + len(keys), 'outdated')
+            return
+
+        for key, query_unit_group in compiled:
+            self._cache_compiled_query(key, query_unit_group)
+        metrics.query_cache_recompilations.inc(len(compiled), 'cached')
+        logger.debug(
+            'recompiled %d cached queries of database %r after DDL',
+            len(compiled), self.name)
 
     cdef _update_backend_ids(self, new_types):
         self.backend_ids.update(new_types)
@@ -223,29 +484,148 @@ cdef class Database:
         self._eql_to_compiled.clear()
         self._sql_to_compiled.clear()
         self._state_serializers.clear()
+        self._update_query_cache_version()
+        self._query_cache_updated()
+
+    cdef _get_query_cache_version(self):
+        if self.user_schema is None or self.db_config is None:
+            return None
+
+        schema_ver = self.user_schema.get_global(
+            s_ver.SchemaVersion, '__schema_version__', None)
+        global_ver = self._index._global_schema.get_global(
+            s_ver.GlobalSchemaVersion, '__global_schema_version__', None)
+        if schema_ver is None or global_ver is None:
+            return None
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str(defines.EDGEDB_CATALOG_VERSION).encode())
+        h.update(schema_ver.get_version(self.user_schema).bytes)
+        h.update(global_ver.get_version(self._index._global_schema).bytes)
+        h.update(_config_digest(self.db_config))
+        h.update(_config_digest(self._index._comp_sys_config))
+        return h.digest()
+
+    cdef _update_query_cache_version(self):
+        # Compiled queries are only valid for the exact schema and
+        # configuration they were compiled against, which the version
+        # digest captures; switching to a new version drops everything
+        # that was persisted or shared for the previous one.
+        if self._persistent_cache is None and self._shared_cache is None:
+            return
+
+        version = self._get_query_cache_version()
+
+        if self._persistent_cache is not None:
+            # The persisted queries are loaded in the background and
+            # passed to _load_persistent_queries().
+            self._persistent_cache.set_version(version)
+
+        if (
+            self._shared_cache is not None
+            and self._query_cache_version is not None
+            and version != self._query_cache_version
+        ):
+            self._shared_cache.evict(self._query_cache_version)
+
+        self._query_cache_version = version
+
+    cdef _account_query_cache(self, str weight_reason):
+        # Evictions made to respect a weight limit are attributed to
+        # *weight_reason*; the rest were made to respect the maximum
+        # number of entries or lost the admission to the cache.
+        weight = self._eql_to_compiled.weight + self._sql_to_compiled.weight
+        evictions = (
+            self._eql_to_compiled.evictions + self._sql_to_compiled.evictions
+        )
+        weight_evictions = (
+            self._eql_to_compiled.weight_evictions
+            + self._sql_to_compiled.weight_evictions
+        )
+        delta = weight - self._query_cache_weight
+        self._query_cache_weight = weight
+        self._index._query_cache_weight += delta
+        metrics.query_cache_memory.set(self._index._query_cache_weight)
+
+        weight_delta = weight_evictions - self._query_cache_weight_evictions
+        size_delta = evictions - self._query_cache_evictions - weight_delta
+        if weight_delta > 0:
+            metrics.query_cache_evictions.inc(weight_delta, weight_reason)
+        if size_delta > 0:
+            metrics.query_cache_evictions.inc(size_delta, 'capacity')
+        self._query_cache_evictions = evictions
+        self._query_cache_weight_evictions = weight_evictions
+        return delta
+
+    cdef _query_cache_updated(self):
+        if self._account_query_cache('database_budget') > 0:
+            self._query_cache_last_used = time.monotonic()
+            self._index._enforce_query_cache_budget()
+
+    cdef _trim_query_cache(self, Py_ssize_t excess):
+        target = max(self._query_cache_weight - excess, 0)
+        self._eql_to_compiled.trim(
+            max(target - self._sql_to_compiled.weight, 0))
+        self._sql_to_compiled.trim(
+            max(target - self._eql_to_compiled.weight, 0))
+        self._account_query_cache('global_budget')
+
+    def _persistable_queries(self):
+        for key, (compiled, dbver) in self._eql_to_compiled.items():
+            if dbver == self.dbver:
+                yield _persistent_query_key(key), compiled
+
+    def _load_persistent_queries(self, version, entries):
+        if version != self._query_cache_version:
+            return
+        for data, compiled in entries:
+            try:
+                key = _query_key_from_persistent(data)
+            except errors.EdgeQLSyntaxError:
+                continue
+            # Queries compiled while the file was being read are newer.
+            if key not in self._eql_to_compiled:
+                self._eql_to_compiled[key] = compiled, self.dbver
+        self._query_cache_updated()
+
+    async def flush_persistent_cache(self):
+        if self._persistent_cache is not None:
+            self._persistent_cache.flush()
+            await self._persistent_cache.wait()
+
+    def drop_persistent_cache(self):
+        if self._persistent_cache is not None:
+            self._persistent_cache.clear()
 
     cdef _cache_compiled_query(self, key, compiled: dbstate.QueryUnitGroup):
         assert compiled.cacheable
 
-        existing, dbver = self._eql_to_compiled.get(key, DICTDEFAULT)
+        existing, dbver = self._eql_to_compiled.peek(key, DICTDEFAULT)
         if existing is not None and dbver == self.dbver:
             # We already have a cached query for a more recent DB version.
             return
 
         self._eql_to_compiled[key] = compiled, self.dbver
+        self._query_cache_updated()
+        if self._persistent_cache is not None:
+            self._persistent_cache.add(_persistent_query_key(key), compiled)
 
     def cache_compiled_sql(self, key, compiled: list[str]):
-        existing, dbver = self._sql_to_compiled.get(key, DICTDEFAULT)
+        existing, dbver = self._sql_to_compiled.peek(key, DICTDEFAULT)
         if existing is not None and dbver == self.dbver:
             # We already have a cached query for a more recent DB version.
             return
 
         self._sql_to_compiled[key] = compiled, self.dbver
+        self._query_cache_updated()
 
     def lookup_compiled_sql(self, key):
         rv, cached_dbver = self._sql_to_compiled.get(key, DICTDEFAULT)
-        if rv is not None and cached_dbver != self.dbver:
-            rv = None
+        if rv is not None:
+            if cached_dbver != self.dbver:
+                rv = None
+            else:
+                self._query_cache_last_used = time.monotonic()
         return rv
 
     cdef _new_view(self, query_cache, protocol_version):
@@ -273,6 +653,21 @@ cdef class Database:
     def get_query_cache_size(self):
         return len(self._eql_to_compiled) + len(self._sql_to_compiled)
 
+    def get_query_cache_stats(self):
+        return {
+            name: dict(
+                size=len(lfu),
+                weight=lfu.weight,
+                hits=lfu.hits,
+                misses=lfu.misses,
+                evictions=lfu.evictions,
+            )
+            for name, lfu in (
+                ('edgeql', self._eql_to_compiled),
+                ('sql', self._sql_to_compiled),
+            )
+        }
+
     async def introspection(self):
         if self.user_schema is None:
             async with self._introspection_lock:
@@ -314,7 +709,7 @@ cdef class DatabaseConnectionView:
 
         # Whenever we are in a transaction that had executed a
         # DDL command, we use this cache for compiled queries.
-        self._eql_to_compiled = lru.LRUMapping(
+        self._eql_to_compiled = cache.TinyLFUCache(
             maxsize=defines._MAX_QUERIES_CACHE)
 
         self._reset_tx_state()
@@ -749,11 +1144,56 @@ cdef class DatabaseConnectionView:
         else:
             query_unit_group, qu_dbver = self._db._eql_to_compiled.get(
                 key, DICTDEFAULT)
-            if query_unit_group is not None and qu_dbver != self._db.dbver:
-                query_unit_group = None
+            if query_unit_group is not None:
+                if qu_dbver != self._db.dbver:
+                    query_unit_group = None
+                else:
+                    self._db._query_cache_last_used = time.monotonic()
 
         return query_unit_group
 
+    async def lookup_shared_compiled_query(self, query_req, version):
+        shared_cache = self._db._shared_cache
+        if (
+            shared_cache is None
+            or version is None
+            or self._in_tx
+            or not self._query_cache_enabled
+        ):
+            return None
+
+        key = (query_req, self.get_modaliases(), self.get_session_config())
+        data = await shared_cache.lookup(
+            _shared_query_key(self._db.name, key), version)
+        if data is None or version != self._db._query_cache_version:
+            return None
+
+        try:
+            return pickle.loads(data)
+        except Exception:
+            # Most likely pickled by a server running a different build.
+            return None
+
+    cdef _cache_shared_compiled_query(
+        self, object key, object query_unit_group, object version
+    ):
+        shared_cache = self._db._shared_cache
+        if (
+            shared_cache is None
+            or version is None
+            or self._in_tx
+            # The schema has changed while the query was being compiled.
+            or version != self._db._query_cache_version
+        ):
+            return
+
+        key = (key, self.get_modaliases(), self.get_session_config())
+        shared_cache.store(
+            _shared_query_key(self._db.name, key),
+            version,
+            pickle.dumps(query_unit_group, -1),
+        )
+
     cdef tx_error(self):
         if self._in_tx:
             self._tx_error = True
@@ -974,13 +1414,14 @@ cdef class DatabaseConnectionView:
     ) -> CompiledQuery:
         source = query_req.source
         query_unit_group = self.lookup_compiled_query(query_req)
-        cached = True
+        path = 'cache'
         if query_unit_group is None:
-            # Cache miss; need to compile this query.
-            cached = False
-
+            # Cache miss; need to compile this query, unless another
+            # server has compiled it already.
+            shared_version = self._db._query_cache_version
             try:
-                query_unit_group = await self._compile(query_req)
+                query_unit_group, path = await self._compile_single_flight(
+                    query_req, shared_version)
             except (errors.EdgeQLSyntaxError, errors.InternalServerError):
                 raise
             except errors.EdgeDBError:
@@ -995,6 +1436,7 @@ cdef class DatabaseConnectionView:
                 else:
                     raise
 
+        if path != 'cache':
             allowed_capabilities = (
                 query_req.allow_capabilities & self._capability_mask)
             if query_unit_group.capabilities & ~allowed_capabilities:
@@ -1016,13 +1458,14 @@ cdef class DatabaseConnectionView:
             ):
                 self.raise_in_tx_error()
 
-        if not cached and query_unit_group.cacheable:
-            self.cache_compiled_query(query_req, query_unit_group)
+        if path != 'cache' and query_unit_group.cacheable:
+            if path != 'deduplicated':
+                self.cache_compiled_query(query_req, query_unit_group)
+            if path == 'compiler':
+                self._cache_shared_compiled_query(
+                    query_req, query_unit_group, shared_version)
 
-        metrics.edgeql_query_compilations.inc(
-            1.0,
-            'cache' if cached else 'compiler'
-        )
+        metrics.edgeql_query_compilations.inc(1.0, path)
 
         return CompiledQuery(
             query_unit_group=query_unit_group,
@@ -1031,6 +1474,81 @@ cdef class DatabaseConnectionView:
             extra_blobs=source.extra_blobs(),
         )
 
+    async def _compile_single_flight(
+        self,
+        query_req: QueryRequestInfo,
+        shared_version: Optional[bytes],
+    ) -> tuple[dbstate.QueryUnitGroup, str]:
+        # Concurrent cache misses on the same query await the shared
+        # cache lookup and the compilation started by the first one
+        # instead of flooding the backend and the compiler pool with
+        # identical requests.  Returns the compiled query and the path
+        # it was obtained through: 'shared_cache', 'compiler', or
+        # 'deduplicated' if it was obtained on behalf of another request.
+        if self._in_tx or not self._query_cache_enabled:
+            return await self._lookup_shared_or_compile(
+                query_req, shared_version)
+
+        db = self._db
+        key = (query_req, self.get_modaliases(), self.get_session_config())
+        while True:
+            in_flight = db._compiles_in_flight.get(key)
+            if in_flight is None or in_flight[1] != db.dbver:
+                break
+            fut = in_flight[0]
+            in_flight[2] += 1
+            try:
+                query_unit_group = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # The request that was compiling the query went away;
+                # the first of its waiters to wake up compiles it on
+                # behalf of the others.
+                continue
+            # Non-cacheable results may depend on the state of the
+            # connection, e.g. start a transaction; compile those on
+            # our own.
+            if query_unit_group.cacheable:
+                return query_unit_group, 'deduplicated'
+            return await self._compile(query_req), 'compiler'
+
+        in_flight = [asyncio.get_running_loop().create_future(), db.dbver, 0]
+        db._compiles_in_flight[key] = in_flight
+        fut = in_flight[0]
+        try:
+            query_unit_group, path = await self._lookup_shared_or_compile(
+                query_req, shared_version)
+        except Exception as ex:
+            fut.set_exception(ex)
+            # Don't complain about the exception when nobody waited.
+            fut.exception()
+            raise
+        except BaseException:
+            fut.cancel()
+            raise
+        else:
+            fut.set_result(query_unit_group)
+        finally:
+            if db._compiles_in_flight.get(key) is in_flight:
+                del db._compiles_in_flight[key]
+            metrics.edgeql_query_compilation_storm_size.observe(
+                1 + in_flight[2])
+
+        return query_unit_group, path
+
+    async def _lookup_shared_or_compile(
+        self,
+        query_req: QueryRequestInfo,
+        shared_version: Optional[bytes],
+    ) -> tuple[dbstate.QueryUnitGroup, str]:
+        # See if another server has compiled this query.
+        query_unit_group = await self.lookup_shared_compiled_query(
+            query_req, shared_version)
+        if query_unit_group is not None:
+            return query_unit_group, 'shared_cache'
+        return await self._compile(query_req), 'compiler'
+
     async def _compile(
         self,
         query_req: QueryRequestInfo,
@@ -1110,6 +1628,8 @@ cdef class DatabaseIndex:
         self._global_schema = global_schema
         self.update_sys_config(sys_config)
         self._factory = sertypes.StateSerializerFactory(std_schema)
+        # The total weight of the compiled query caches of all databases.
+        self._query_cache_weight = 0
 
     def count_connections(self, dbname: str):
         try:
@@ -1176,7 +1696,31 @@ cdef class DatabaseIndex:
             self._dbs[dbname] = db
 
     def unregister_db(self, dbname):
-        self._dbs.pop(dbname)
+        cdef Database db
+        db = self._dbs.pop(dbname)
+        db.drop_persistent_cache()
+        self._query_cache_weight -= db._query_cache_weight
+        metrics.query_cache_memory.set(self._query_cache_weight)
+
+    cdef _enforce_query_cache_budget(self):
+        cdef Database db
+
+        limit = self._server.get_query_cache_memory_limit()
+        if limit is None or self._query_cache_weight <= limit:
+            return
+
+        # Evict from the caches of the least recently used databases
+        # first; the database that was just updated is normally the
+        # most recently used one and is trimmed last.
+        dbs = sorted(
+            self._dbs.values(),
+            key=lambda d: (<Database>d)._query_cache_last_used,
+        )
+        for db in dbs:
+            excess = self._query_cache_weight - limit
+            if excess <= 0:
+                break
+            db._trim_query_cache(excess)
 
     def iter_dbs(self):
         return iter(self._dbs.values())
@@ -52,6 +52,25 @@ BACKEND_COMPILER_POOL_SIZE_MIN = 1
 BACKEND_COMPILER_TEMPLATE_PROC_RESTART_INTERVAL = 1
 
 _MAX_QUERIES_CACHE = 1000
+# Approximate number of bytes the compiled queries of a database may take.
+_MAX_QUERIES_CACHE_WEIGHT = 64 * 1024 * 1024
+# Maximum number of parsed queries cached by each compiler, and the
+# approximate number of bytes they may take.
+_MAX_AST_CACHE = 10000
+_MAX_AST_CACHE_WEIGHT = 32 * 1024 * 1024
+
+# The time in seconds to wait for an idle compiler worker before
+# recompiling the next batch of cached queries after DDL.
+QUERY_CACHE_RECOMPILE_RETRY_INTERVAL = 0.1
+
+# The time in seconds after which queries stored in the shared query
+# cache expire, and how often a server deletes the expired ones.
+SHARED_QUERY_CACHE_MAX_AGE = 24 * 60 * 60
+SHARED_QUERY_CACHE_EXPIRE_INTERVAL = 60 * 60
+
+# The time in seconds a dump waits for each of its extra backend
+# connections before going on with the ones it has got already.
+DUMP_WORKER_ACQUIRE_TIMEOUT = 1.0
 
 _QUERY_ROLLING_AVG_LEN = 10
 _QUERIES_ROLLING_AVG_LEN = 300
@@ -177,8 +177,22 @@ async def _run_server(
             cluster=cluster,
             runstate_dir=runstate_dir,
             internal_runstate_dir=internal_runstate_dir,
+            query_cache_dir=args.query_cache_dir,
+            shared_query_cache_secret=args.shared_query_cache_secret,
+            query_cache_memory_limit=args.query_cache_memory_limit,
+            query_cache_database_memory_limit=(
+                args.query_cache_database_memory_limit),
+            query_cache_recompile_after_ddl=(
+                args.query_cache_recompile_after_ddl),
             max_backend_connections=args.max_backend_connections,
+            min_idle_backend_connections=args.min_idle_backend_connections,
+            dump_jobs=args.dump_jobs,
+            connpool_trace_file=args.connpool_trace_file,
+            connpool_trace_max_size=args.connpool_trace_max_size,
+            connpool_trace_max_duration=args.connpool_trace_max_duration,
+            connpool_qos=args.connpool_qos,
             compiler_pool_size=args.compiler_pool_size,
+            compiler_pool_batch_size=args.compiler_pool_batch_size,
             compiler_pool_mode=args.compiler_pool_mode,
             compiler_pool_addr=args.compiler_pool_addr,
             nethosts=args.bind_addresses,
@@ -32,6 +32,26 @@ current_compiler_processes = registry.new_gauge(
     'Current number of active compiler processes.'
 )
 
+predicted_compiler_processes = registry.new_gauge(
+    'compiler_processes_predicted',
+    'Number of compiler processes the adaptive compiler pool estimates '
+    'it needs for the recent compile request rate.'
+)
+
+compiler_pool_worker_syncs = registry.new_labeled_counter(
+    'compiler_pool_worker_syncs_total',
+    'Number of compile requests by whether the compiler process had to '
+    'be sent the database state first.',
+    labels=('result',)
+)
+
+compiler_pool_scaling_decisions = registry.new_labeled_counter(
+    'compiler_pool_scaling_decisions_total',
+    'Number of compiler processes the adaptive compiler pool decided '
+    'to spawn or stop.',
+    labels=('decision',)
+)
+
 total_backend_connections = registry.new_counter(
     'backend_connections_total',
     'Total number of backend connections established.'
@@ -53,6 +73,30 @@ backend_connection_establishment_latency = registry.new_histogram(
     unit=prom.Unit.SECONDS,
 )
 
+backend_connection_establishment_phase_latency = (
+    registry.new_labeled_histogram(
+        'backend_connection_establishment_phase_latency',
+        'Time it takes to complete each phase of establishing a backend '
+        'connection.',
+        unit=prom.Unit.SECONDS,
+        labels=('phase',),
+    )
+)
+
+backend_connection_acquire_latency = registry.new_labeled_histogram(
+    'backend_connection_acquire_latency',
+    'Time it takes to acquire a backend connection from the pool.',
+    unit=prom.Unit.SECONDS,
+    labels=('qos_class',),
+)
+
+backend_connection_statement_affinity = registry.new_labeled_counter(
+    'backend_connection_statement_affinity_total',
+    'Number of backend connections acquired to run a prepared statement, '
+    'by whether the statement was prepared on the connection already.',
+    labels=('result',)
+)
+
 backend_connection_aborted = registry.new_labeled_counter(
     'backend_connections_aborted_total',
     'Number of aborted backend connections.',
@@ -92,6 +136,31 @@ edgeql_query_compilation_duration = registry.new_histogram(
     unit=prom.Unit.SECONDS,
 )
 
+edgeql_query_compilation_storm_size = registry.new_histogram(
+    'edgeql_query_compilation_storm_size',
+    'Number of concurrent requests served by one compilation of '
+    'an EdgeQL query or script.',
+    buckets=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+)
+
+query_cache_memory = registry.new_gauge(
+    'query_cache_memory',
+    'Approximate memory used by compiled queries cached in memory.',
+    unit=prom.Unit.BYTES,
+)
+
+query_cache_evictions = registry.new_labeled_counter(
+    'query_cache_evictions_total',
+    'Number of compiled queries evicted from the in-memory cache.',
+    labels=('reason',),
+)
+
+query_cache_recompilations = registry.new_labeled_counter(
+    'query_cache_recompilations_total',
+    'Number of cached queries recompiled in the background after DDL.',
+    labels=('result',),
+)
+
 background_errors = registry.new_labeled_counter(
     'background_errors_total',
     'Number of unhandled errors in background server routines.',
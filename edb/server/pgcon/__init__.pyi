@@ -104,3 +104,6 @@ class PGConnection:
 
     def get_server_parameter_status(self, parameter: str) -> Optional[str]:
         ...
+
+    def has_prepared(self, stmt_name: bytes) -> bool:
+        ...
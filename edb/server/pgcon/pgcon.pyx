@@ -243,9 +243,10 @@ class _RetryConnectSignal(Exception):
     pass
 
 
-async def _connect(connargs, dbname, ssl):
+async def _connect(connargs, dbname, ssl, setup_script):
 
     loop = asyncio.get_running_loop()
+    started_at = time.monotonic()
 
     host = connargs.get("host")
     port = connargs.get("port")
@@ -272,8 +273,11 @@ async def _connect(connargs, dbname, ssl):
                 host=host, port=port)
             _set_tcp_keepalive(trans)
 
+    metrics.backend_connection_establishment_phase_latency.observe(
+        time.monotonic() - started_at, 'transport')
+
     try:
-        await pgcon.connect()
+        await pgcon.connect(setup_script)
     except pgerror.BackendError as e:
         pgcon.terminate()
         if not e.code_is(pgerror.ERROR_INVALID_AUTHORIZATION_SPECIFICATION):
@@ -311,24 +315,7 @@ async def connect(
 ):
     global INIT_CON_SCRIPT
 
-    # This is different than parsing DSN and use the default sslmode=prefer,
-    # because connargs can be set manually thru set_connection_params(), and
-    # the caller should be responsible for aligning sslmode with ssl.
-    sslmode = connargs.get('sslmode', pgconnparams.SSLMode.disable)
-    ssl = connargs.get('ssl')
-    if sslmode == pgconnparams.SSLMode.allow:
-        try:
-            pgcon = await _connect(connargs, dbname, ssl=None)
-        except _RetryConnectSignal:
-            pgcon = await _connect(connargs, dbname, ssl=ssl)
-    elif sslmode == pgconnparams.SSLMode.prefer:
-        try:
-            pgcon = await _connect(connargs, dbname, ssl=ssl)
-        except _RetryConnectSignal:
-            pgcon = await _connect(connargs, dbname, ssl=None)
-    else:
-        pgcon = await _connect(connargs, dbname, ssl=ssl)
-
+    role_sql = None
     if (
         backend_params.has_create_role
         and backend_params.session_authorization_role
@@ -340,17 +327,58 @@ async def connect(
             # accessing Postgres directly through EdgeDB, SET ROLE is mostly
             # fine here. (Also hosted backends like Postgres on DigitalOcean
             # support only SET ROLE)
-            await pgcon.sql_execute(f'SET ROLE {pg_qi(sup_role)}'.encode())
+            role_sql = f'SET ROLE {pg_qi(sup_role)}'.encode()
+
+    # The session setup script is sent right after the authentication
+    # messages, without waiting for the backend to confirm that we're
+    # authenticated, which saves a round trip per connection.  The init
+    # script depends on the Postgres version (see below), so it can only
+    # be pipelined once the first connection has told us what it is.
+    pipelined = not apply_init_script or INIT_CON_SCRIPT is not None
+    setup_script = None
+    if pipelined:
+        setup_script = _build_setup_script(
+            role_sql, INIT_CON_SCRIPT if apply_init_script else None)
+
+    # This is different than parsing DSN and use the default sslmode=prefer,
+    # because connargs can be set manually thru set_connection_params(), and
+    # the caller should be responsible for aligning sslmode with ssl.
+    sslmode = connargs.get('sslmode', pgconnparams.SSLMode.disable)
+    ssl = connargs.get('ssl')
+    try:
+        if sslmode == pgconnparams.SSLMode.allow:
+            try:
+                pgcon = await _connect(
+                    connargs, dbname, ssl=None, setup_script=setup_script)
+            except _RetryConnectSignal:
+                pgcon = await _connect(
+                    connargs, dbname, ssl=ssl, setup_script=setup_script)
+        elif sslmode == pgconnparams.SSLMode.prefer:
+            try:
+                pgcon = await _connect(
+                    connargs, dbname, ssl=ssl, setup_script=setup_script)
+            except _RetryConnectSignal:
+                pgcon = await _connect(
+                    connargs, dbname, ssl=None, setup_script=setup_script)
+        else:
+            pgcon = await _connect(
+                connargs, dbname, ssl=ssl, setup_script=setup_script)
+    except pgerror.BackendError as e:
+        if (
+            setup_script is not None
+            and e.code_is(pgerror.ERROR_READ_ONLY_SQL_TRANSACTION)
+        ):
+            # The pipelined init script could not create its temporary
+            # table: we have connected to a hot standby.
+            raise _hot_standby_error() from e
+        raise
 
     if 'in_hot_standby' in pgcon.parameter_status:
         # in_hot_standby is always present in Postgres 14 and above
         if pgcon.parameter_status['in_hot_standby'] == 'on':
             # Abort if we're connecting to a hot standby
             pgcon.terminate()
-            raise pgerror.BackendError(fields=dict(
-                M="cannot use a hot standby",
-                C=pgerror.ERROR_READ_ONLY_SQL_TRANSACTION,
-            ))
+            raise _hot_standby_error()
         if INIT_CON_SCRIPT is None:
             INIT_CON_SCRIPT = _build_init_con_script(
                 check_pg_is_in_recovery=False
@@ -363,12 +391,34 @@ async def connect(
                 check_pg_is_in_recovery=True
             )
 
-    if apply_init_script:
-        await pgcon.sql_execute(INIT_CON_SCRIPT)
+    if not pipelined:
+        started_at = time.monotonic()
+        await pgcon.sql_execute(_build_setup_script(role_sql, INIT_CON_SCRIPT))
+        metrics.backend_connection_establishment_phase_latency.observe(
+            time.monotonic() - started_at, 'setup')
 
     return pgcon
 
 
+def _build_setup_script(
+    role_sql: Optional[bytes],
+    init_script: Optional[bytes],
+) -> Optional[bytes]:
+    parts = [sql for sql in (role_sql, init_script) if sql]
+    if not parts:
+        return None
+    # SET ROLE must come first, so that the objects created by the
+    # init script are owned by the session role.
+    return b';\n'.join(parts)
+
+
+def _hot_standby_error():
+    return pgerror.BackendError(fields=dict(
+        M="cannot use a hot standby",
+        C=pgerror.ERROR_READ_ONLY_SQL_TRANSACTION,
+    ))
+
+
 class TLSUpgradeProto(asyncio.Protocol):
     def __init__(self, loop, host, port, ssl_context, ssl_is_advisory):
         self.on_data = loop.create_future()
@@ -568,6 +618,11 @@ cdef class PGConnection:
     def get_server_parameter_status(self, parameter: str) -> Optional[str]:
         return self.parameter_status.get(parameter)
 
+    def has_prepared(self, bytes stmt_name) -> bool:
+        # Peek, so that looking for a connection to run the statement on
+        # doesn't count as using the statement on every one of them.
+        return self.prep_stmts.peek(stmt_name) is not None
+
     def abort(self):
         if not self.transport:
             return
@@ -965,6 +1020,7 @@ cdef class PGConnection:
         bint use_prep_stmt,
         bytes state,
         int dbver,
+        int32_t fetch_size,
     ):
         cdef:
             WriteBuffer out
@@ -980,6 +1036,17 @@ cdef class PGConnection:
             bint discard_result = (
                 fe_conn is not None and query.output_format == FMT_NONE)
 
+            # Fetch the rows of the portal in batches of fetch_size,
+            # waiting for the frontend to consume every batch before
+            # fetching the next one.
+            bint paged = (
+                fetch_size > 0
+                and fe_conn is not None
+                and has_result
+                and not discard_result
+                and len(query.sql) == 1
+            )
+
             uint64_t msgs_num = <uint64_t>(len(query.sql))
             uint64_t msgs_executed = 0
             uint64_t i
@@ -1055,10 +1122,15 @@ cdef class PGConnection:
 
             buf = WriteBuffer.new_message(b'E')
             buf.write_bytestring(b'')  # portal name
-            buf.write_int32(0)  # limit: 0 - return all rows
+            buf.write_int32(fetch_size if paged else 0)  # limit
             out.write_buffer(buf.end_message())
 
-        self.write_sync(out)
+        if paged:
+            # A SYNC would close the portal, so only flush until the
+            # last batch is fetched.
+            out.write_buffer(WriteBuffer.new_message(b'H').end_message())
+        else:
+            self.write_sync(out)
         self.write(out)
 
         result = None
@@ -1134,7 +1206,24 @@ cdef class PGConnection:
                     elif mtype == b's':  ## result
                         # PortalSuspended
                         self.buffer.discard_message()
-                        break
+                        if not paged:
+                            break
+
+                        if buf is not None:
+                            fe_conn.write(buf)
+                            buf = None
+                        fe_conn.flush()
+                        await fe_conn.drain()
+
+                        out = WriteBuffer.new()
+                        buf = WriteBuffer.new_message(b'E')
+                        buf.write_bytestring(b'')  # portal name
+                        buf.write_int32(fetch_size)  # limit
+                        out.write_buffer(buf.end_message())
+                        out.write_buffer(
+                            WriteBuffer.new_message(b'H').end_message())
+                        self.write(out)
+                        buf = None
 
                     elif mtype == b'2':
                         # BindComplete
@@ -1155,6 +1244,12 @@ cdef class PGConnection:
                 finally:
                     self.buffer.finish_message()
         finally:
+            if paged:
+                # Also makes Postgres skip the rest of the messages
+                # after an error, or close a portal we stopped fetching.
+                out = WriteBuffer.new()
+                self.write_sync(out)
+                self.write(out)
             await self.wait_for_sync()
 
         return result
@@ -1168,6 +1263,7 @@ cdef class PGConnection:
         bint use_prep_stmt = False,
         bytes state = None,
         int dbver = 0,
+        int32_t fetch_size = 0,
     ):
         self.before_command()
         started_at = time.monotonic()
@@ -1179,6 +1275,7 @@ cdef class PGConnection:
                 use_prep_stmt,
                 state,
                 dbver,
+                fetch_size,
             )
         finally:
             metrics.backend_query_duration.observe(time.monotonic() - started_at)
@@ -2412,12 +2509,14 @@ cdef class PGConnection:
         finally:
             await self.after_command()
 
-    async def connect(self):
+    async def connect(self, bytes setup_script=None):
         cdef:
             WriteBuffer outbuf
             WriteBuffer buf
+            WriteBuffer setup_msg = None
             char mtype
             int32_t status
+            bint authenticated = False
 
         if self.connected_fut is not None:
             await self.connected_fut
@@ -2453,6 +2552,19 @@ cdef class PGConnection:
         # Need this to handle first ReadyForQuery
         self.waiting_for_sync += 1
 
+        if setup_script is not None:
+            # The setup script is sent as soon as we've sent our last
+            # authentication message; the backend will run it right after
+            # the startup is complete.  If the authentication fails, the
+            # backend closes the connection without reading it.
+            setup_msg = WriteBuffer.new_message(b'Q')
+            setup_msg.write_bytestring(setup_script)
+            setup_msg.end_message()
+
+        phase_latency = metrics.backend_connection_establishment_phase_latency
+        started_at = time.monotonic()
+        setup_exc = None
+
         while True:
             if not self.buffer.take_message():
                 await self.wait_for_message()
@@ -2463,15 +2575,27 @@ cdef class PGConnection:
                     # Authentication...
                     status = self.buffer.read_int32()
                     if status == PGAUTH_SUCCESSFUL:
-                        pass
+                        if setup_msg is not None:
+                            # No password was asked for.
+                            self.write(setup_msg)
+                            setup_msg = None
+                            self.waiting_for_sync += 1
+
                     elif status == PGAUTH_REQUIRED_PASSWORDMD5:
                         # Note: MD5 salt is passed as a four-byte sequence
                         md5_salt = self.buffer.read_bytes(4)
-                        self.write(
-                            self.make_auth_password_md5_message(md5_salt))
+                        buf = self.make_auth_password_md5_message(md5_salt)
+                        if setup_msg is not None:
+                            buf.write_buffer(setup_msg)
+                            setup_msg = None
+                            self.waiting_for_sync += 1
+                        self.write(buf)
 
                     elif status == PGAUTH_REQUIRED_SASL:
-                        await self._auth_sasl()
+                        await self._auth_sasl(setup_msg)
+                        if setup_msg is not None:
+                            setup_msg = None
+                            self.waiting_for_sync += 1
 
                     else:
                         raise RuntimeError(f'unsupported auth method: {status}')
@@ -2484,25 +2608,44 @@ cdef class PGConnection:
                 elif mtype == b'E':
                     # ErrorResponse
                     er_cls, er_fields = self.parse_error_message()
-                    raise er_cls(fields=er_fields)
+                    if not authenticated:
+                        raise er_cls(fields=er_fields)
+                    # The setup script failed; wait for its ReadyForQuery.
+                    setup_exc = er_cls(fields=er_fields)
 
                 elif mtype == b'Z':
                     # ReadyForQuery
                     self.parse_sync_message()
-                    self.connected = True
-                    break
+                    if not authenticated:
+                        authenticated = True
+                        self.connected = True
+                        now = time.monotonic()
+                        phase_latency.observe(
+                            now - started_at, 'authentication')
+                        started_at = now
+                    if not self.waiting_for_sync:
+                        break
 
                 elif mtype == b'S':
                     # ParameterStatus
                     name, value = self.parse_parameter_status_message()
                     self.parameter_status[name] = value
 
+                elif authenticated and mtype in (b'T', b'D', b'C', b'I'):
+                    # Results of the setup script
+                    self.buffer.discard_message()
+
                 else:
                     self.fallthrough()
 
             finally:
                 self.buffer.finish_message()
 
+        if setup_script is not None:
+            phase_latency.observe(time.monotonic() - started_at, 'setup')
+            if setup_exc is not None:
+                raise setup_exc
+
     def is_healthy(self):
         return (
             self.connected and
@@ -2771,7 +2914,7 @@ cdef class PGConnection:
         msg.write_bytestring(b'md5' + hash)
         return msg.end_message()
 
-    async def _auth_sasl(self):
+    async def _auth_sasl(self, WriteBuffer then_send=None):
         methods = []
         auth_method = self.buffer.read_null_str()
         while auth_method:
@@ -2831,6 +2974,8 @@ cdef class PGConnection:
         client_final_message = scram.create_client_final_message(password)
         msg.write_bytes(client_final_message)
         msg.end_message()
+        if then_send is not None:
+            msg.write_buffer(then_send)
 
         self.write(msg)
 
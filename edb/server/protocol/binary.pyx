@@ -66,10 +66,12 @@ from edb.server import defines as edbdef
 from edb.server.compiler import errormech
 from edb.server.compiler import enums
 from edb.server.compiler import sertypes
+from edb.server.protocol import dump_compression
 from edb.server.protocol import execute
 from edb.server.protocol cimport frontend
 from edb.server.pgcon cimport pgcon
 from edb.server.pgcon import errors as pgerror
+from edb.pgsql import common as pgcommon
 from edb.server import metrics
 
 from edb.schema import objects as s_obj
@@ -116,6 +118,11 @@ DEF SERVER_HEADER_CAPABILITIES = 0x1001
 
 DEF ALL_CAPABILITIES = 0xFFFFFFFFFFFFFFFF
 
+# The ids of the objects that still exist in a table, dumped next to
+# the data of the table in incremental dumps.
+_LiveIdsBlock = collections.namedtuple(
+    '_LiveIdsBlock', ['schema_object_id', 'sql_copy_stmt'])
+
 
 def parse_capabilities_header(value: bytes) -> uint64_t:
     if len(value) != 8:
@@ -126,6 +133,21 @@ def parse_capabilities_header(value: bytes) -> uint64_t:
     return mask
 
 
+cdef int32_t parse_fetch_size(value: Optional[str]) except -1:
+    if value is None:
+        return 0
+    try:
+        fetch_size = int(value)
+    except ValueError:
+        fetch_size = 0
+    if not 0 < fetch_size < 2 ** 31:
+        raise errors.BinaryProtocolError(
+            f'fetch_size annotation must be a positive 32-bit integer, '
+            f'got {value!r}'
+        )
+    return fetch_size
+
+
 cdef inline bint parse_boolean(value: bytes, header: str):
     cdef bytes lower = value.lower()
     if lower == b'true':
@@ -722,13 +744,15 @@ cdef class EdgeConnection(frontend.FrontendConnection):
         compiled: dbview.CompiledQuery,
         bind_args: bytes,
         use_prep_stmt: bint,
+        fetch_size: int = 0,
     ):
         cdef:
             dbview.DatabaseConnectionView dbv
             pgcon.PGConnection conn
 
         dbv = self.get_dbview()
-        conn = await self.get_pgcon()
+        conn = await self.get_pgcon(
+            compiled.query_unit_group[0].sql_hash if use_prep_stmt else None)
         try:
             await execute.execute(
                 conn,
@@ -737,6 +761,7 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                 bind_args,
                 fe_conn=self,
                 use_prep_stmt=use_prep_stmt,
+                fetch_size=fetch_size,
             )
         finally:
             self.maybe_release_pgcon(conn)
@@ -846,8 +871,13 @@ cdef class EdgeConnection(frontend.FrontendConnection):
             bytes in_tid
             bytes out_tid
             bytes args
+            int32_t fetch_size
 
-        self.ignore_headers()
+        annotations = self.parse_headers()
+        # The client can ask for the result to be fetched from Postgres
+        # in batches of this many rows, each after the previous one is
+        # consumed, to keep large results from piling up in memory.
+        fetch_size = parse_fetch_size(annotations.get('fetch_size'))
 
         query_req = self.parse_execute_request()
         in_tid = self.buffer.read_bytes(16)
@@ -925,7 +955,7 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                 len(query_unit_group) == 1
                 and bool(query_unit_group[0].sql_hash)
             )
-            await self._execute(compiled, args, use_prep)
+            await self._execute(compiled, args, use_prep, fetch_size)
 
         if self._cancelled:
             raise ConnectionAbortedError
@@ -1257,9 +1287,30 @@ cdef class EdgeConnection(frontend.FrontendConnection):
             WriteBuffer msg_buf
             dbview.DatabaseConnectionView _dbview
 
-        self.reject_headers()
+        headers = self.parse_headers()
+        # The client can ask for the data blocks to be compressed with
+        # any of a comma-separated list of codecs.
+        accepted_codecs = headers.pop('compression', None)
+        # An incremental dump only contains the objects changed since
+        # the baseline of a previous dump.
+        incremental_since = headers.pop('incremental_since', None)
+        if headers:
+            raise errors.BinaryProtocolError('unexpected headers')
         self.buffer.finish_message()
 
+        if incremental_since is not None:
+            try:
+                incremental_since = int(incremental_since)
+            except ValueError:
+                raise errors.BinaryProtocolError(
+                    f'invalid incremental_since dump annotation: '
+                    f'{incremental_since!r}'
+                ) from None
+
+        codec = None
+        if accepted_codecs:
+            codec = dump_compression.negotiate(accepted_codecs)
+
         _dbview = self.get_dbview()
         if _dbview.txid:
             raise errors.ProtocolError(
@@ -1271,6 +1322,8 @@ cdef class EdgeConnection(frontend.FrontendConnection):
 
         dbname = _dbview.dbname
         pgcon = await server.acquire_pgcon(dbname)
+        worker_pgcons = []
+        worker_pgcons_done = False
         self._in_dump_restore = True
         try:
             # To avoid having races, we want to:
@@ -1305,12 +1358,29 @@ cdef class EdgeConnection(frontend.FrontendConnection):
             db_config = await server.introspect_db_config(pgcon)
             dump_protocol = self.max_protocol
 
+            # Every transaction older than the snapshot's xmin is
+            # either committed or aborted, so a later incremental dump
+            # can use it as the baseline.
+            baseline = int(await pgcon.sql_fetch_val(
+                b'SELECT txid_snapshot_xmin(txid_current_snapshot())::text'
+            ))
+            if incremental_since is not None and not (
+                0 <= baseline - incremental_since < 2 ** 31
+            ):
+                # Row xids are 32-bit and wrap around; a baseline this
+                # old cannot be compared with them anymore.
+                raise errors.ProtocolError(
+                    f'cannot make an incremental dump since baseline '
+                    f'{incremental_since}; make a full dump instead'
+                )
+
             schema_ddl, schema_dynamic_ddl, schema_ids, blocks = (
                 await compiler_pool.describe_database_dump(
                     user_schema,
                     global_schema,
                     db_config,
                     dump_protocol,
+                    incremental_since,
                 )
             )
 
@@ -1320,15 +1390,57 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                     if result:
                         schema_ddl += '\n' + result.decode('utf-8')
 
+            njobs = min(server.get_dump_jobs(dbname), len(blocks))
+            if njobs > 1:
+                # The extra connections import the snapshot of this
+                # transaction, so that they dump the very same DB state.
+                snapshot_id = await pgcon.sql_fetch_val(
+                    b'SELECT pg_export_snapshot()')
+                worker_tx = (
+                    f'''START TRANSACTION
+                            ISOLATION LEVEL REPEATABLE READ
+                            READ ONLY;
+
+                        SET TRANSACTION SNAPSHOT
+                            {pgcommon.quote_literal(snapshot_id.decode())};
+
+                        SET idle_in_transaction_session_timeout = 0;
+                        SET statement_timeout = 0;
+                    '''
+                ).encode()
+                for _ in range(njobs - 1):
+                    # Waiting for a connection while holding another one
+                    # can deadlock with the other clients of the database
+                    # (e.g. concurrent dumps); go on with fewer jobs.
+                    try:
+                        worker_pgcon = await asyncio.wait_for(
+                            server.acquire_pgcon(dbname),
+                            edbdef.DUMP_WORKER_ACQUIRE_TIMEOUT,
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                    worker_pgcons.append(worker_pgcon)
+                    await worker_pgcon.sql_execute(worker_tx)
+
             msg_buf = WriteBuffer.new_message(b'@')
 
-            msg_buf.write_int16(3)  # number of headers
+            # number of headers
+            msg_buf.write_int16(
+                4 + (codec is not None) + (incremental_since is not None))
             msg_buf.write_int16(DUMP_HEADER_BLOCK_TYPE)
             msg_buf.write_len_prefixed_bytes(DUMP_HEADER_BLOCK_TYPE_INFO)
             msg_buf.write_int16(DUMP_HEADER_SERVER_VER)
             msg_buf.write_len_prefixed_utf8(str(buildmeta.get_version()))
             msg_buf.write_int16(DUMP_HEADER_SERVER_TIME)
             msg_buf.write_len_prefixed_utf8(str(int(time.time())))
+            msg_buf.write_int16(DUMP_HEADER_BASELINE)
+            msg_buf.write_len_prefixed_utf8(str(baseline))
+            if incremental_since is not None:
+                msg_buf.write_int16(DUMP_HEADER_INCREMENTAL_SINCE)
+                msg_buf.write_len_prefixed_utf8(str(incremental_since))
+            if codec is not None:
+                msg_buf.write_int16(DUMP_HEADER_COMPRESSION)
+                msg_buf.write_len_prefixed_utf8(codec.name)
 
             msg_buf.write_int16(dump_protocol[0])
             msg_buf.write_int16(dump_protocol[1])
@@ -1355,15 +1467,25 @@ cdef class EdgeConnection(frontend.FrontendConnection):
             self._transport.write(memoryview(msg_buf.end_message()))
             self.flush()
 
+            # The workers take blocks from the shared queue; every data
+            # message carries its block id and number, so the blocks
+            # can be interleaved in the output.
             blocks_queue = collections.deque(blocks)
-            output_queue = asyncio.Queue(maxsize=2)
+            blocks_queue.extend(
+                _LiveIdsBlock(block.schema_object_id,
+                              block.sql_copy_live_ids_stmt)
+                for block in blocks
+                if block.sql_copy_live_ids_stmt is not None
+            )
+            output_queue = asyncio.Queue(maxsize=len(worker_pgcons) + 2)
 
             async with taskgroup.TaskGroup() as g:
-                g.create_task(pgcon.dump(
-                    blocks_queue,
-                    output_queue,
-                    DUMP_BLOCK_SIZE,
-                ))
+                for con in (pgcon, *worker_pgcons):
+                    g.create_task(con.dump(
+                        blocks_queue,
+                        output_queue,
+                        DUMP_BLOCK_SIZE,
+                    ))
 
                 nstops = 0
                 while True:
@@ -1373,36 +1495,61 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                     out = await output_queue.get()
                     if out is None:
                         nstops += 1
-                        if nstops == 1:
-                            # we only have one worker right now
+                        if nstops == len(worker_pgcons) + 1:
                             break
                     else:
                         block, block_num, data = out
 
+                        if codec is not None:
+                            # Compress every fragment as soon as it is
+                            # copied out, off the event loop, while the
+                            # workers go on copying the next ones.
+                            data = await self.loop.run_in_executor(
+                                None, codec.compress, memoryview(data))
+
                         msg_buf = WriteBuffer.new_message(b'=')
-                        msg_buf.write_int16(4)  # number of headers
+                        # number of headers
+                        msg_buf.write_int16(4 if codec is None else 5)
 
                         msg_buf.write_int16(DUMP_HEADER_BLOCK_TYPE)
-                        msg_buf.write_len_prefixed_bytes(
-                            DUMP_HEADER_BLOCK_TYPE_DATA)
+                        if isinstance(block, _LiveIdsBlock):
+                            msg_buf.write_len_prefixed_bytes(
+                                DUMP_HEADER_BLOCK_TYPE_LIVE_IDS)
+                        else:
+                            msg_buf.write_len_prefixed_bytes(
+                                DUMP_HEADER_BLOCK_TYPE_DATA)
                         msg_buf.write_int16(DUMP_HEADER_BLOCK_ID)
                         msg_buf.write_len_prefixed_bytes(
                             block.schema_object_id.bytes)
                         msg_buf.write_int16(DUMP_HEADER_BLOCK_NUM)
                         msg_buf.write_len_prefixed_bytes(
                             str(block_num).encode())
-                        msg_buf.write_int16(DUMP_HEADER_BLOCK_DATA)
-                        msg_buf.write_len_prefixed_buffer(data)
+                        if codec is not None:
+                            msg_buf.write_int16(DUMP_HEADER_BLOCK_COMPRESSION)
+                            msg_buf.write_len_prefixed_utf8(codec.name)
+                            msg_buf.write_int16(DUMP_HEADER_BLOCK_DATA)
+                            msg_buf.write_len_prefixed_bytes(data)
+                        else:
+                            msg_buf.write_int16(DUMP_HEADER_BLOCK_DATA)
+                            msg_buf.write_len_prefixed_buffer(data)
 
                         self._transport.write(memoryview(msg_buf.end_message()))
                         if self._write_waiter:
                             await self._write_waiter
 
+            for con in worker_pgcons:
+                await con.sql_execute(b"ROLLBACK;")
             await pgcon.sql_execute(b"ROLLBACK;")
+            worker_pgcons_done = True
 
         finally:
             self._in_dump_restore = False
             server.release_pgcon(dbname, pgcon)
+            for con in worker_pgcons:
+                # Don't reuse the connections that might still be in
+                # the dump transaction.
+                server.release_pgcon(
+                    dbname, con, discard=not worker_pgcons_done)
 
         msg_buf = WriteBuffer.new_message(b'C')
         msg_buf.write_int16(0)  # no headers
@@ -1457,7 +1604,7 @@ cdef class EdgeConnection(frontend.FrontendConnection):
             )
 
         self.reject_headers()
-        self.buffer.read_int16()  # discard -j level
+        jobs = self.buffer.read_int16()
 
         # Now parse the embedded dump header message:
 
@@ -1468,12 +1615,15 @@ cdef class EdgeConnection(frontend.FrontendConnection):
         user_schema = _dbview.get_user_schema()
 
         dump_server_ver_str = None
+        incremental = False
         headers_num = self.buffer.read_int16()
         for _ in range(headers_num):
             hdrname = self.buffer.read_int16()
             hdrval = self.buffer.read_len_prefixed_bytes()
             if hdrname == DUMP_HEADER_SERVER_VER:
                 dump_server_ver_str = hdrval.decode('utf-8')
+            elif hdrname == DUMP_HEADER_INCREMENTAL_SINCE:
+                incremental = True
 
         proto_major = self.buffer.read_int16()
         proto_minor = self.buffer.read_int16()
@@ -1508,6 +1658,7 @@ cdef class EdgeConnection(frontend.FrontendConnection):
         self.buffer.finish_message()
         dbname = _dbview.dbname
         pgcon = await server.acquire_pgcon(dbname)
+        pgcon_done = False
 
         self._in_dump_restore = True
         try:
@@ -1527,16 +1678,22 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                 ''',
             )
 
-            schema_sql_units, restore_blocks, tables = \
-                await compiler_pool.describe_database_restore(
-                    user_schema,
-                    global_schema,
-                    dump_server_ver_str,
-                    schema_ddl,
-                    schema_ids,
-                    blocks,
-                    proto,
-                )
+            (
+                schema_sql_units,
+                restore_blocks,
+                tables,
+                pre_load_sql,
+                post_load_sql,
+            ) = await compiler_pool.describe_database_restore(
+                user_schema,
+                global_schema,
+                dump_server_ver_str,
+                schema_ddl,
+                schema_ids,
+                blocks,
+                proto,
+                incremental,
+            )
 
             for query_unit in schema_sql_units:
                 new_types = None
@@ -1581,6 +1738,20 @@ cdef class EdgeConnection(frontend.FrontendConnection):
 
             await pgcon.sql_execute(disable_trigger_q.encode())
 
+            if incremental:
+                # An incremental dump is merged into the existing data,
+                # which is mostly left untouched; keep the indexes.
+                deferred_ddl = []
+                if pre_load_sql:
+                    await pgcon.sql_execute(b';'.join(pre_load_sql))
+            else:
+                # Maintaining the indexes row by row while loading the
+                # data is much slower than building them afterwards.
+                # They are dropped in the restore transaction, so they
+                # are back if anything fails before they are rebuilt.
+                deferred_ddl = await self._defer_restore_indexes(
+                    pgcon, tables)
+
             # Send "RestoreReadyMessage"
             msg = WriteBuffer.new_message(b'+')
             msg.write_int16(0)  # no headers
@@ -1601,6 +1772,7 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                     block_id = None
                     block_num = None
                     block_data = None
+                    block_compression = None
 
                     num_headers = self.buffer.read_int16()
                     for _ in range(num_headers):
@@ -1614,6 +1786,9 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                             block_num = self.buffer.read_len_prefixed_bytes()
                         elif header == DUMP_HEADER_BLOCK_DATA:
                             block_data = self.buffer.read_len_prefixed_bytes()
+                        elif header == DUMP_HEADER_BLOCK_COMPRESSION:
+                            block_compression = (
+                                self.buffer.read_len_prefixed_utf8())
 
                     self.buffer.finish_message()
 
@@ -1621,7 +1796,26 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                             or block_num is None or block_data is None):
                         raise errors.ProtocolError('incomplete data block')
 
+                    if block_compression is not None:
+                        try:
+                            codec = dump_compression.get_codec(
+                                block_compression)
+                        except LookupError as e:
+                            raise errors.ProtocolError(str(e)) from None
+                        block_data = await self.loop.run_in_executor(
+                            None, codec.decompress, block_data)
+
                     restore_block = restore_blocks[block_id]
+                    if block_type == DUMP_HEADER_BLOCK_TYPE_LIVE_IDS:
+                        if restore_block.sql_copy_live_ids_stmt is None:
+                            raise errors.ProtocolError(
+                                'unexpected live ids data block')
+                        restore_block = restore_block._replace(
+                            sql_copy_stmt=(
+                                restore_block.sql_copy_live_ids_stmt),
+                            compat_elided_cols=(),
+                            data_mending_desc=(),
+                        )
                     type_id_map = self._build_type_id_map_for_restore_mending(
                         restore_block)
                     self._transport.pause_reading()
@@ -1635,20 +1829,28 @@ cdef class EdgeConnection(frontend.FrontendConnection):
                 else:
                     self.fallthrough()
 
+            if post_load_sql:
+                await pgcon.sql_execute(b';'.join(post_load_sql))
+            await self._build_deferred_indexes(pgcon, deferred_ddl, jobs)
             await pgcon.sql_execute(enable_trigger_q.encode())
 
         except Exception:
             await pgcon.sql_execute(b'ROLLBACK')
+            pgcon_done = True
             _dbview.abort_tx()
             raise
 
         else:
             await self._execute_utility_stmt('COMMIT', pgcon)
+            pgcon_done = True
 
         finally:
             self._transport.resume_reading()
             self._in_dump_restore = False
-            server.release_pgcon(dbname, pgcon)
+            # Unless the restore transaction is over, e.g. the restore
+            # was cancelled, don't reuse the connection: closing it
+            # rolls back the partial data and the dropped indexes.
+            server.release_pgcon(dbname, pgcon, discard=not pgcon_done)
 
         await server.introspect_db(dbname)
 
@@ -1666,6 +1868,72 @@ cdef class EdgeConnection(frontend.FrontendConnection):
         self.write(msg.end_message())
         self.flush()
 
+    async def _defer_restore_indexes(self, pgcon, tables):
+        # Drop the indexes and the unique and exclusion constraints of the
+        # restored tables, returning the DDL to recreate them.  Primary
+        # keys and the indexes referenced by foreign keys are kept.
+        if not tables:
+            return []
+
+        ddl = await pgcon.sql_fetch_val(
+            b'''
+                WITH t(relid) AS (
+                    SELECT e.name::regclass
+                    FROM json_array_elements_text($1::json) AS e(name)
+                )
+                SELECT coalesce(json_agg(json_build_array(q.d, q.c)), '[]')
+                FROM (
+                    SELECT
+                        format('DROP INDEX %s', i.indexrelid::regclass),
+                        pg_get_indexdef(i.indexrelid)
+                    FROM pg_index AS i
+                    WHERE
+                        i.indrelid IN (SELECT relid FROM t)
+                        AND NOT i.indisprimary
+                        AND NOT EXISTS (
+                            SELECT FROM pg_constraint AS c
+                            WHERE c.conindid = i.indexrelid
+                        )
+                  UNION ALL
+                    SELECT
+                        format(
+                            'ALTER TABLE %s DROP CONSTRAINT %I',
+                            c.conrelid::regclass, c.conname
+                        ),
+                        format(
+                            'ALTER TABLE %s ADD CONSTRAINT %I %s',
+                            c.conrelid::regclass, c.conname,
+                            pg_get_constraintdef(c.oid)
+                        )
+                    FROM pg_constraint AS c
+                    WHERE
+                        c.conrelid IN (SELECT relid FROM t)
+                        AND c.contype IN ('u', 'x')
+                        AND NOT EXISTS (
+                            SELECT FROM pg_constraint AS f
+                            WHERE f.contype = 'f' AND f.conindid = c.conindid
+                        )
+                ) AS q(d, c)
+            ''',
+            args=(json.dumps(list(tables)).encode(),),
+        )
+        ddl = json.loads(ddl)
+        if ddl:
+            await pgcon.sql_execute(
+                ';'.join(drop for drop, _ in ddl).encode())
+        return [create for _, create in ddl]
+
+    async def _build_deferred_indexes(self, pgcon, ddl, jobs):
+        if not ddl:
+            return
+        # Let the backend build the indexes with parallel workers; the
+        # setting is reverted when the restore transaction ends.
+        workers = max(jobs - 1, 0)
+        await pgcon.sql_execute(
+            f'SET LOCAL max_parallel_maintenance_workers = {workers};'.encode()
+        )
+        await pgcon.sql_execute(';'.join(ddl).encode())
+
     def _build_type_id_map_for_restore_mending(self, restore_block):
         type_map = {}
         descriptor_stack = []
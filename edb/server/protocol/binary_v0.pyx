@@ -456,6 +456,13 @@ cdef class EdgeConnectionBackwardsCompatible(EdgeConnection):
             hdrval = self.buffer.read_len_prefixed_bytes()
             if hdrname == DUMP_HEADER_SERVER_VER:
                 dump_server_ver_str = hdrval.decode('utf-8')
+            elif hdrname == DUMP_HEADER_INCREMENTAL_SINCE:
+                # Legacy restore cannot merge the data of an incremental
+                # dump into an existing database.
+                raise errors.ProtocolError(
+                    'cannot restore an incremental dump over a legacy '
+                    'protocol connection; upgrade the client'
+                )
 
         proto_major = self.buffer.read_int16()
         proto_minor = self.buffer.read_int16()
@@ -490,6 +497,7 @@ cdef class EdgeConnectionBackwardsCompatible(EdgeConnection):
         self.buffer.finish_message()
         dbname = _dbview.dbname
         pgcon = await server.acquire_pgcon(dbname)
+        pgcon_done = False
 
         self._in_dump_restore = True
         try:
@@ -509,7 +517,7 @@ cdef class EdgeConnectionBackwardsCompatible(EdgeConnection):
                 ''',
             )
 
-            schema_sql_units, restore_blocks, tables = \
+            schema_sql_units, restore_blocks, tables, _, _ = \
                 await compiler_pool.describe_database_restore(
                     user_schema,
                     global_schema,
@@ -619,15 +627,20 @@ cdef class EdgeConnectionBackwardsCompatible(EdgeConnection):
 
         except Exception:
             await pgcon.sql_execute(b'ROLLBACK')
+            pgcon_done = True
             _dbview.abort_tx()
             raise
 
         else:
             await self._execute_utility_stmt('COMMIT', pgcon)
+            pgcon_done = True
 
         finally:
             self._in_dump_restore = False
-            server.release_pgcon(dbname, pgcon)
+            # Unless the restore transaction is over, e.g. the restore
+            # was cancelled, don't reuse the connection: closing it
+            # rolls back the partial data.
+            server.release_pgcon(dbname, pgcon, discard=not pgcon_done)
 
         await server.introspect_db(dbname)
 
@@ -978,7 +991,8 @@ cdef class EdgeConnectionBackwardsCompatible(EdgeConnection):
             finally:
                 self.maybe_release_pgcon(conn)
         else:
-            conn = await self.get_pgcon()
+            conn = await self.get_pgcon(
+                query_unit.sql_hash if use_prep_stmt else None)
             try:
                 await execute.execute(
                     conn,
@@ -22,11 +22,16 @@ DEF DUMP_BLOCK_SIZE = 1024 * 1024 * 10
 DEF DUMP_HEADER_BLOCK_TYPE = 101
 DEF DUMP_HEADER_BLOCK_TYPE_INFO = b'I'
 DEF DUMP_HEADER_BLOCK_TYPE_DATA = b'D'
+DEF DUMP_HEADER_BLOCK_TYPE_LIVE_IDS = b'L'
 
 DEF DUMP_HEADER_SERVER_TIME = 102
 DEF DUMP_HEADER_SERVER_VER = 103
 DEF DUMP_HEADER_BLOCKS_INFO = 104
+DEF DUMP_HEADER_COMPRESSION = 105
+DEF DUMP_HEADER_BASELINE = 106
+DEF DUMP_HEADER_INCREMENTAL_SINCE = 107
 
 DEF DUMP_HEADER_BLOCK_ID = 110
 DEF DUMP_HEADER_BLOCK_NUM = 111
 DEF DUMP_HEADER_BLOCK_DATA = 112
+DEF DUMP_HEADER_BLOCK_COMPRESSION = 113
@@ -0,0 +1,85 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Compression codecs of the data blocks of database dumps."""
+
+from __future__ import annotations
+from typing import *
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class Codec(NamedTuple):
+
+    name: str
+    # Both functions are called in executor threads, so they must be
+    # safe to run concurrently.
+    compress: Callable[[Any], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+def _zstd_compress(data: Any) -> bytes:
+    # Compressor objects must not be shared between threads.
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _zlib_compress(data: Any) -> bytes:
+    return zlib.compress(data, 1)
+
+
+CODECS: Dict[str, Codec] = {}
+if zstandard is not None:
+    CODECS['zstd'] = Codec('zstd', _zstd_compress, _zstd_decompress)
+if lz4_frame is not None:
+    CODECS['lz4'] = Codec('lz4', lz4_frame.compress, lz4_frame.decompress)
+CODECS['zlib'] = Codec('zlib', _zlib_compress, zlib.decompress)
+
+
+def negotiate(accepted: str) -> Optional[Codec]:
+    """Pick a codec from the comma-separated list a client accepts.
+
+    The client's order of preference is respected; None is returned if
+    none of the codecs is available.
+    """
+    for name in accepted.split(','):
+        codec = CODECS.get(name.strip())
+        if codec is not None:
+            return codec
+    return None
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise LookupError(
+            f'dump block compression {name!r} is not supported') from None
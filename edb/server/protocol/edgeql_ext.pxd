@@ -0,0 +1,33 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from edb.server.protocol cimport frontend
+from edb.server.pgcon cimport pgcon
+from edb.server.pgproto.pgproto cimport WriteBuffer
+
+
+cdef class JsonElementsStream(frontend.AbstractFrontendConnection):
+    cdef:
+        object writer
+        pgcon.PGConnection be_conn
+        bint backend_paused
+        readonly bint started
+
+    cdef attach(self, pgcon.PGConnection be_conn)
+    cdef detach(self)
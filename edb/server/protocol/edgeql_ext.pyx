@@ -17,7 +17,13 @@
 #
 
 
+cimport cython
+cimport cpython
+
+from libc.stdint cimport int16_t, int32_t
+
 import decimal
+import functools
 import http
 import json
 import urllib.parse
@@ -38,7 +44,16 @@ from edb.server import compiler
 from edb.server import config
 from edb.server.compiler import enums
 from edb.server.dbview cimport dbview
-from edb.server.pgproto.pgproto cimport WriteBuffer
+from edb.server.pgcon cimport pgcon
+from edb.server.pgproto cimport hton
+from edb.server.pgproto.pgproto cimport (
+    WriteBuffer,
+
+    FRBuffer,
+    frb_init,
+    frb_read,
+    frb_get_len,
+)
 
 
 async def handle_request(
@@ -57,6 +72,7 @@ async def handle_request(
     variables = None
     globals_ = None
     query = None
+    stream = False
 
     try:
         if request.method == b'POST':
@@ -68,6 +84,7 @@ async def handle_request(
                 query = body.get('query')
                 variables = body.get('variables')
                 globals_ = body.get('globals')
+                stream = body.get('stream', False)
             else:
                 raise TypeError(
                     'unable to interpret EdgeQL POST request')
@@ -97,6 +114,15 @@ async def handle_request(
                         raise TypeError(
                             '"globals" must be a JSON object')
 
+                stream = qs.get('stream')
+                if stream is not None:
+                    try:
+                        stream = json.loads(stream[0])
+                    except Exception:
+                        raise TypeError('"stream" must be a boolean')
+                else:
+                    stream = False
+
         else:
             raise TypeError('expected a GET or a POST request')
 
@@ -109,6 +135,9 @@ async def handle_request(
         if globals_ is not None and not isinstance(globals_, dict):
             raise TypeError('"globals" must be a JSON object')
 
+        if not isinstance(stream, bool):
+            raise TypeError('"stream" must be a boolean')
+
     except Exception as ex:
         if debug.flags.server:
             markup.dump(ex)
@@ -120,6 +149,18 @@ async def handle_request(
 
     response.status = http.HTTPStatus.OK
     response.content_type = b'application/json'
+
+    if stream:
+        response.body_stream = functools.partial(
+            _stream_response,
+            db,
+            query,
+            variables or {},
+            globals_ or {},
+            response,
+        )
+        return
+
     try:
         result = await execute.parse_execute_json(
             db,
@@ -128,20 +169,153 @@ async def handle_request(
             globals_=globals_ or {},
         )
     except Exception as ex:
-        if debug.flags.server:
-            markup.dump(ex)
+        response.body = json.dumps({'error': _encode_error(ex)}).encode()
+    else:
+        response.body = b'{"data":' + result + b'}'
+
 
-        ex_type = type(ex)
-        if not issubclass(ex_type, errors.EdgeDBError):
-            # XXX Fix this when LSP "location" objects are implemented
-            ex_type = errors.InternalServerError
+async def _stream_response(
+    object db,
+    str query,
+    dict variables,
+    dict globals_,
+    object response,
+    object writer,
+):
+    # Unlike the buffered response, the rows are written out as they
+    # arrive from Postgres: `{"data":[` with the first row, and `]}`
+    # after the last one.  An error after the first row is reported
+    # next to the partial data: `{"data":[...],"error":{...}}`.
+    cdef JsonElementsStream fe_conn = JsonElementsStream(writer)
 
-        err_dct = {
-            'message': str(ex),
-            'type': str(ex_type.__name__),
-            'code': ex_type.get_code(),
-        }
+    server = db.server
+    try:
+        dbv, compiled = await execute.parse_json(
+            db,
+            query,
+            output_format=compiler.OutputFormat.JSON_ELEMENTS,
+        )
+        if len(compiled.query_unit_group) > 1:
+            raise errors.UnsupportedFeatureError(
+                'streaming the results of scripts is not supported; '
+                'send the statements in separate requests')
 
-        response.body = json.dumps({'error': err_dct}).encode()
+        be_conn = await server.acquire_pgcon(db.name)
+        fe_conn.attach(be_conn)
+        try:
+            await execute.execute_json(
+                be_conn,
+                dbv,
+                compiled,
+                variables=variables,
+                globals_=globals_,
+                fe_conn=fe_conn,
+            )
+        finally:
+            fe_conn.detach()
+            server.release_pgcon(db.name, be_conn)
+    except Exception as ex:
+        err = json.dumps(_encode_error(ex)).encode()
+        if fe_conn.started:
+            writer.write(b'],"error":' + err + b'}')
+        else:
+            response.body = b'{"error":' + err + b'}'
     else:
-        response.body = b'{"data":' + result + b'}'
+        if fe_conn.started:
+            writer.write(b']}')
+        else:
+            response.body = b'{"data":[]}'
+
+
+cdef dict _encode_error(object ex):
+    if debug.flags.server:
+        markup.dump(ex)
+
+    ex_type = type(ex)
+    if not issubclass(ex_type, errors.EdgeDBError):
+        # XXX Fix this when LSP "location" objects are implemented
+        ex_type = errors.InternalServerError
+
+    return {
+        'message': str(ex),
+        'type': str(ex_type.__name__),
+        'code': ex_type.get_code(),
+    }
+
+
+@cython.final
+cdef class JsonElementsStream(frontend.AbstractFrontendConnection):
+    """Writes the JSON_ELEMENTS rows of a query to a streamed response.
+
+    While the client does not keep up, the backend connection stops
+    reading, so at most one batch of rows is held in memory.
+    """
+
+    def __cinit__(self, writer):
+        self.writer = writer
+        self.be_conn = None
+        self.backend_paused = False
+        self.started = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self.writer.closed
+
+    cdef attach(self, pgcon.PGConnection be_conn):
+        self.be_conn = be_conn
+        self.writer.set_flow_control(self._pause_backend, self._resume_backend)
+
+    cdef detach(self):
+        self.writer.set_flow_control(None, None)
+        self._resume_backend()
+        self.be_conn = None
+
+    def _pause_backend(self):
+        if self.be_conn is None or self.backend_paused:
+            return
+        if self.be_conn.transport is not None:
+            self.be_conn.transport.pause_reading()
+            self.backend_paused = True
+
+    def _resume_backend(self):
+        if not self.backend_paused:
+            return
+        self.backend_paused = False
+        if self.be_conn.transport is not None:
+            self.be_conn.transport.resume_reading()
+
+    cdef write(self, WriteBuffer buf):
+        cdef:
+            bytes data = bytes(buf)
+            FRBuffer rbuf
+            int16_t ncol
+            int32_t col_len
+            list chunk = []
+
+        frb_init(
+            &rbuf,
+            cpython.PyBytes_AS_STRING(data),
+            cpython.Py_SIZE(data))
+
+        # The buffer holds complete DataRow messages of one column each.
+        while frb_get_len(&rbuf):
+            frb_read(&rbuf, 5)  # message type and length
+            ncol = hton.unpack_int16(frb_read(&rbuf, 2))
+            if ncol != 1:
+                raise errors.InternalServerError(
+                    f'unexpected number of columns in a JSON row: {ncol}')
+
+            chunk.append(b',' if self.started else b'{"data":[')
+            self.started = True
+
+            col_len = hton.unpack_int32(frb_read(&rbuf, 4))
+            if col_len == -1:
+                chunk.append(b'null')
+            else:
+                chunk.append(cpython.PyBytes_FromStringAndSize(
+                    frb_read(&rbuf, col_len), col_len))
+
+        self.writer.write(b''.join(chunk))
+
+    cdef flush(self):
+        pass
@@ -20,6 +20,7 @@ from typing import (
     Any,
     Mapping,
     Optional,
+    Tuple,
 )
 
 import decimal
@@ -58,6 +59,9 @@ async def execute(
     # HACK: A hook from the notebook ext, telling us to skip dbview.start
     # so that it can handle things differently.
     skip_start: bint = False,
+    # Fetch the result in batches of this many rows, as fast as fe_conn
+    # consumes them; 0 fetches all rows at once.
+    fetch_size: int = 0,
 ):
     cdef:
         bytes state = None, orig_state = None
@@ -108,6 +112,7 @@ async def execute(
                         use_prep_stmt=use_prep_stmt,
                         state=state,
                         dbver=dbv.dbver,
+                        fetch_size=fetch_size,
                     )
 
                     if query_unit.set_global and data:
@@ -395,15 +400,13 @@ def signal_side_effects(dbv, side_effects):
         )
 
 
-async def parse_execute_json(
+async def parse_json(
     db: dbview.Database,
     query: str,
     *,
-    variables: Mapping[str, Any] = immutables.Map(),
-    globals_: Mapping[str, Any] = immutables.Map(),
     output_format: compiler.OutputFormat = compiler.OutputFormat.JSON,
     query_cache_enabled: Optional[bool] = None,
-) -> bytes:
+) -> Tuple[dbview.DatabaseConnectionView, dbview.CompiledQuery]:
     if query_cache_enabled is None:
         query_cache_enabled = not (
             debug.flags.disable_qcache or debug.flags.edgeql_compile)
@@ -424,7 +427,26 @@ async def parse_execute_json(
     )
 
     compiled = await dbv.parse(query_req)
+    return dbv, compiled
+
+
+async def parse_execute_json(
+    db: dbview.Database,
+    query: str,
+    *,
+    variables: Mapping[str, Any] = immutables.Map(),
+    globals_: Mapping[str, Any] = immutables.Map(),
+    output_format: compiler.OutputFormat = compiler.OutputFormat.JSON,
+    query_cache_enabled: Optional[bool] = None,
+) -> bytes:
+    dbv, compiled = await parse_json(
+        db,
+        query,
+        output_format=output_format,
+        query_cache_enabled=query_cache_enabled,
+    )
 
+    server = db.server
     pgcon = await server.acquire_pgcon(db.name)
     try:
         return await execute_json(
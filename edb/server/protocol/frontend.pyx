@@ -41,6 +41,11 @@ cdef class AbstractFrontendConnection:
     cdef flush(self):
         raise NotImplementedError
 
+    async def drain(self):
+        # Wait until the client accepts more data; used to pace the
+        # fetching of large results.
+        pass
+
 
 cdef class FrontendConnection(AbstractFrontendConnection):
 
@@ -103,7 +108,10 @@ cdef class FrontendConnection(AbstractFrontendConnection):
             # fail all tests if this ever happens.
             self.abort_pinned_pgcon()
 
-    async def get_pgcon(self) -> pgcon.PGConnection:
+    async def get_pgcon(
+        self,
+        bytes stmt_name=None,
+    ) -> pgcon.PGConnection:
         if self._cancelled or self._pgcon_released_in_connection_lost:
             raise RuntimeError(
                 'cannot acquire a pgconn; the connection is closed')
@@ -120,7 +128,8 @@ cdef class FrontendConnection(AbstractFrontendConnection):
                 return self._pinned_pgcon
             if self._pinned_pgcon is not None:
                 raise RuntimeError('there is already a pinned pgcon')
-            conn = await self.server.acquire_pgcon(self.dbname)
+            conn = await self.server.acquire_pgcon(
+                self.dbname, stmt_name=stmt_name)
             self._pinned_pgcon = conn
             conn.pinned_by = self
             return conn
@@ -206,6 +215,12 @@ cdef class FrontendConnection(AbstractFrontendConnection):
             return
         self._write_waiter.set_result(True)
 
+    async def drain(self):
+        if self._write_waiter is not None and not self._write_waiter.done():
+            await self._write_waiter
+        if self._cancelled or self._transport is None:
+            raise ConnectionAbortedError
+
     # I/O read methods
 
     def data_received(self, data):
@@ -434,6 +449,10 @@ cdef class FrontendConnection(AbstractFrontendConnection):
         # 3. We can interrupt some operations like auth with a CancelledError.
         #    Again, those operations don't mutate global state.
 
+        # Nothing is going to be written anymore; let everyone waiting
+        # for the client to read the data notice that.
+        self.resume_writing()
+
         if (self._msg_take_waiter is not None and
             not self._msg_take_waiter.done()):
             # We're parsing the protocol. We can abort that.
@@ -20,6 +20,9 @@
 from edb.server.protocol cimport binary
 
 
+cdef class HttpProtocol
+
+
 cdef class HttpRequest:
 
     cdef:
@@ -43,6 +46,27 @@ cdef class HttpResponse:
         public bytes content_type
         public dict custom_headers
         public bytes body
+        public object body_stream
+
+
+cdef class HttpStreamWriter:
+
+    cdef:
+        HttpProtocol protocol
+        HttpRequest request
+        HttpResponse response
+        bint chunked
+        readonly bint started
+        readonly bint paused
+        readonly bint closed
+        list buffered
+        object on_pause
+        object on_resume
+
+    cdef _pause(self)
+    cdef _resume(self)
+    cdef _close(self)
+    cdef finish(self)
 
 
 cdef class HttpProtocol:
@@ -63,8 +87,10 @@ cdef class HttpProtocol:
         bint is_tls
         object binary_endpoint_security
         object http_endpoint_security
+        object write_waiter
 
         HttpRequest current_request
+        HttpStreamWriter stream_writer
 
     cdef _not_found(self, HttpRequest request, HttpResponse response,
                     str message = ?)
@@ -74,6 +100,9 @@ cdef class HttpProtocol:
     cdef _write(self, bytes req_version, bytes resp_status,
                 bytes content_type, dict custom_headers, bytes body,
                 bint close_connection)
+    cdef _write_head(self, bytes req_version, bytes resp_status,
+                     bytes content_type, dict custom_headers,
+                     bytes framing, bint close_connection, bytes body)
 
     cdef write(self, HttpRequest request, HttpResponse response)
 
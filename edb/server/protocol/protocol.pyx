@@ -79,9 +79,119 @@ cdef class HttpResponse:
         self.content_type = b'text/plain'
         self.custom_headers = {}
         self.body = b''
+        self.body_stream = None
         self.close_connection = False
 
 
+cdef class HttpStreamWriter:
+    """Writes the body of a streamed response as it is produced.
+
+    A handler streams the response by setting ``response.body_stream``
+    to an async callable; once the handler returns, it is awaited with
+    the writer.  The status and the headers of the response are sent
+    with the first written data, so the handler may still report an
+    error in ``response.body`` as long as it has not written anything.
+
+    The body is sent with chunked transfer encoding, or buffered into
+    a regular response for HTTP/1.0 clients.
+    """
+
+    def __cinit__(
+        self,
+        HttpProtocol protocol,
+        HttpRequest request,
+        HttpResponse response,
+    ):
+        self.protocol = protocol
+        self.request = request
+        self.response = response
+        self.chunked = request.version != b'1.0'
+        self.started = False
+        self.paused = (
+            protocol.write_waiter is not None
+            and not protocol.write_waiter.done()
+        )
+        self.closed = False
+        self.buffered = []
+        self.on_pause = None
+        self.on_resume = None
+
+    def write(self, data):
+        if not data or self.closed:
+            return
+
+        if not self.chunked:
+            self.buffered.append(bytes(data))
+            return
+
+        transport = self.protocol.transport
+        if transport is None:
+            return
+
+        if not self.started:
+            self.started = True
+            response = self.response
+            assert type(response.status) is HTTPStatus
+            self.protocol._write_head(
+                self.request.version,
+                f'{response.status.value} {response.status.phrase}'.encode(),
+                response.content_type,
+                response.custom_headers,
+                b'Transfer-Encoding: chunked\r\n',
+                response.close_connection,
+                None,
+            )
+
+        transport.writelines((
+            f'{len(data):x}\r\n'.encode(), data, b'\r\n',
+        ))
+
+    def set_flow_control(self, pause, resume):
+        """Call *pause* and *resume* when the client falls behind.
+
+        The callbacks are called when the transport to the client
+        stops and resumes accepting writes, and let the producer stop
+        generating data in the meantime.  *resume* is also called when
+        the client disconnects, after which the written data is dropped.
+        """
+        self.on_pause = pause
+        self.on_resume = resume
+        if self.paused and pause is not None:
+            pause()
+
+    async def drain(self):
+        waiter = self.protocol.write_waiter
+        if waiter is not None and not waiter.done():
+            await waiter
+
+    cdef _pause(self):
+        if self.paused or self.closed:
+            return
+        self.paused = True
+        if self.on_pause is not None:
+            self.on_pause()
+
+    cdef _resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        if self.on_resume is not None:
+            self.on_resume()
+
+    cdef _close(self):
+        self.closed = True
+        self._resume()
+
+    cdef finish(self):
+        if not self.started:
+            if self.buffered:
+                self.response.body = b''.join(self.buffered)
+                self.buffered = []
+            self.protocol.write(self.request, self.response)
+        elif self.protocol.transport is not None:
+            self.protocol.transport.write(b'0\r\n\r\n')
+
+
 cdef class HttpProtocol:
 
     def __init__(
@@ -106,6 +216,8 @@ cdef class HttpProtocol:
         self.in_response = False
         self.unprocessed = None
         self.first_data_call = True
+        self.write_waiter = None
+        self.stream_writer = None
 
         self.binary_endpoint_security = binary_endpoint_security
         self.http_endpoint_security = http_endpoint_security
@@ -119,12 +231,24 @@ cdef class HttpProtocol:
     def connection_lost(self, exc):
         self.transport = None
         self.unprocessed = None
+        self._wake_writers()
+        if self.stream_writer is not None:
+            self.stream_writer._close()
 
     def pause_writing(self):
-        pass
+        if self.write_waiter is None or self.write_waiter.done():
+            self.write_waiter = self.loop.create_future()
+        if self.stream_writer is not None:
+            self.stream_writer._pause()
 
     def resume_writing(self):
-        pass
+        self._wake_writers()
+        if self.stream_writer is not None:
+            self.stream_writer._resume()
+
+    def _wake_writers(self):
+        if self.write_waiter is not None and not self.write_waiter.done():
+            self.write_waiter.set_result(True)
 
     def eof_received(self):
         pass
@@ -289,12 +413,25 @@ cdef class HttpProtocol:
     cdef _write(self, bytes req_version, bytes resp_status,
                 bytes content_type, dict custom_headers, bytes body,
                 bint close_connection):
+        self._write_head(
+            req_version,
+            resp_status,
+            content_type,
+            custom_headers,
+            f'Content-Length: {len(body)}\r\n'.encode(),
+            close_connection,
+            body,
+        )
+
+    cdef _write_head(self, bytes req_version, bytes resp_status,
+                     bytes content_type, dict custom_headers,
+                     bytes framing, bint close_connection, bytes body):
         if self.transport is None:
             return
         data = [
             b'HTTP/', req_version, b' ', resp_status, b'\r\n',
             b'Content-Type: ', content_type, b'\r\n',
-            b'Content-Length: ', f'{len(body)}'.encode(), b'\r\n',
+            framing,
         ]
 
         for key, value in custom_headers.items():
@@ -386,6 +523,7 @@ cdef class HttpProtocol:
     async def _handle_request(self, HttpRequest request):
         cdef:
             HttpResponse response = HttpResponse()
+            HttpStreamWriter writer = None
 
         if self.transport is None:
             return
@@ -432,11 +570,28 @@ cdef class HttpProtocol:
 
         try:
             await self.handle_request(request, response)
+            if response.body_stream is not None:
+                writer = HttpStreamWriter(self, request, response)
+                self.stream_writer = writer
+                try:
+                    await response.body_stream(writer)
+                finally:
+                    self.stream_writer = None
         except Exception as ex:
-            self.unhandled_exception(ex)
+            if writer is not None and writer.started:
+                # The status is already sent, so leave the chunked body
+                # unterminated to let the client know it is incomplete.
+                if debug.flags.server:
+                    markup.dump(ex)
+                self.close()
+            else:
+                self.unhandled_exception(ex)
             return
 
-        self.write(request, response)
+        if writer is not None:
+            writer.finish()
+        else:
+            self.write(request, response)
         self.in_response = False
 
         if response.close_connection or not request.should_keep_alive:
@@ -158,6 +158,19 @@ class Server(ha_base.ClusterProtocol):
             srvargs.DEFAULT_AUTH_METHODS),
         admin_ui: bool = False,
         instance_name: str,
+        query_cache_dir: Optional[pathlib.Path] = None,
+        shared_query_cache_secret: Optional[bytes] = None,
+        query_cache_memory_limit: Optional[int] = None,
+        query_cache_database_memory_limit: int = (
+            defines._MAX_QUERIES_CACHE_WEIGHT),
+        query_cache_recompile_after_ddl: int = 0,
+        compiler_pool_batch_size: int = 1,
+        dump_jobs: int = 1,
+        connpool_trace_file: Optional[pathlib.Path] = None,
+        connpool_trace_max_size: int = 64 * 1024 * 1024,
+        connpool_trace_max_duration: float = 600.0,
+        min_idle_backend_connections: int = 0,
+        connpool_qos: Optional[connpool.QosPolicy] = None,
     ):
         self.__loop = asyncio.get_running_loop()
         self._config_settings = config.get_settings()
@@ -184,7 +197,15 @@ class Server(ha_base.ClusterProtocol):
             connect=self._pg_connect,
             disconnect=self._pg_disconnect,
             max_capacity=pool_capacity,
+            min_idle=min_idle_backend_connections,
+            qos_policy=connpool_qos,
         )
+        if connpool_trace_file is not None:
+            self._pg_pool.start_recording(connpool.TraceRecorder(
+                connpool_trace_file,
+                max_size=connpool_trace_max_size,
+                max_duration=connpool_trace_max_duration,
+            ))
         self._pg_unavailable_msg = None
 
         # DB state will be initialized in init().
@@ -192,9 +213,18 @@ class Server(ha_base.ClusterProtocol):
 
         self._runstate_dir = runstate_dir
         self._internal_runstate_dir = internal_runstate_dir
+        self._query_cache_dir = query_cache_dir
+        self._shared_query_cache_secret = shared_query_cache_secret
+        self._query_cache_memory_limit = query_cache_memory_limit
+        self._query_cache_database_memory_limit = (
+            query_cache_database_memory_limit)
+        self._query_cache_recompile_after_ddl = (
+            query_cache_recompile_after_ddl)
         self._max_backend_connections = max_backend_connections
         self._compiler_pool = None
         self._compiler_pool_size = compiler_pool_size
+        self._compiler_pool_batch_size = compiler_pool_batch_size
+        self._dump_jobs = dump_jobs
         self._compiler_pool_mode = compiler_pool_mode
         self._compiler_pool_addr = compiler_pool_addr
         self._suggested_client_pool_size = max(
@@ -307,6 +337,29 @@ class Server(ha_base.ClusterProtocol):
     def get_tenant_id(self):
         return self._tenant_id
 
+    def get_query_cache_dir(self) -> Optional[pathlib.Path]:
+        return self._query_cache_dir
+
+    def get_shared_query_cache_secret(self) -> Optional[bytes]:
+        # None if the shared query cache is disabled.
+        return self._shared_query_cache_secret
+
+    def get_dump_jobs(self, dbname: str) -> int:
+        # Leave at least half of the backend connections the database
+        # may use to its other clients.
+        max_conns = self._pg_pool.get_qos_class(dbname).cap(
+            self._pg_pool.max_capacity)
+        return max(1, min(self._dump_jobs, max_conns // 2))
+
+    def get_query_cache_memory_limit(self) -> Optional[int]:
+        return self._query_cache_memory_limit
+
+    def get_query_cache_database_memory_limit(self) -> int:
+        return self._query_cache_database_memory_limit
+
+    def get_query_cache_recompile_after_ddl(self) -> int:
+        return self._query_cache_recompile_after_ddl
+
     def get_instance_name(self):
         return self._instance_name
 
@@ -535,6 +588,8 @@ class Server(ha_base.ClusterProtocol):
         )
         if self._compiler_pool_mode == srvargs.CompilerPoolMode.Remote:
             args['address'] = self._compiler_pool_addr
+        else:
+            args['batch_size'] = self._compiler_pool_batch_size
         self._compiler_pool = await compiler_pool.create_compiler_pool(**args)
 
     async def _destroy_compiler_pool(self):
@@ -580,15 +635,28 @@ class Server(ha_base.ClusterProtocol):
     def get_compilation_system_config(self):
         return self._dbindex.get_compilation_system_config()
 
-    async def acquire_pgcon(self, dbname):
+    async def acquire_pgcon(self, dbname, *, stmt_name=None):
         if self._pg_unavailable_msg is not None:
             raise errors.BackendUnavailableError(
                 'Postgres is not available: ' + self._pg_unavailable_msg
             )
 
+        prefer = None
+        if stmt_name:
+            # Prefer a connection that has the statement prepared already.
+            prefer = lambda conn: conn.has_prepared(stmt_name)
+
+        started_at = time.monotonic()
         for _ in range(self._pg_pool.max_capacity):
-            conn = await self._pg_pool.acquire(dbname)
+            conn = await self._pg_pool.acquire(dbname, prefer=prefer)
             if conn.is_healthy():
+                metrics.backend_connection_acquire_latency.observe(
+                    time.monotonic() - started_at,
+                    self._pg_pool.get_qos_class(dbname).name,
+                )
+                if prefer is not None:
+                    metrics.backend_connection_statement_affinity.inc(
+                        1.0, 'hit' if prefer(conn) else 'miss')
                 return conn
             else:
                 logger.warning('Acquired an unhealthy pgcon; discard now.')
@@ -1664,6 +1732,9 @@ class Server(ha_base.ClusterProtocol):
             # connection is lost during this await.
             await self.__sys_pgcon.listen_for_sysevent()
             self.set_pg_unavailable_msg(None)
+            # The backend is available again; reopen the connections to
+            # the databases that were in use before the failover.
+            self._pg_pool.prewarm()
         finally:
             self._sys_pgcon_ready_evt.set()
 
@@ -2020,6 +2091,9 @@ class Server(ha_base.ClusterProtocol):
         await self._cluster.start_watching(self)
         await self._create_compiler_pool()
 
+        if self._dbindex is not None:
+            self._pg_pool.prewarm(db.name for db in self._dbindex.iter_dbs())
+
         if self._startup_script and self._new_instance:
             await binary.run_script(
                 server=self,
@@ -2098,6 +2172,12 @@ class Server(ha_base.ClusterProtocol):
             await self._stop_servers(self._servers.values())
             self._servers = {}
 
+            if self._dbindex is not None:
+                for db in self._dbindex.iter_dbs():
+                    await db.flush_persistent_cache()
+
+            await self._pg_pool.stop_recording()
+
             for conn in self._binary_conns:
                 conn.stop()
             self._binary_conns.clear()
@@ -2245,6 +2325,7 @@ class Server(ha_base.ClusterProtocol):
             compiler_pool=dict(
                 worker_pids=list(self._compiler_pool._workers.keys()),
                 template_pid=self._compiler_pool.get_template_pid(),
+                worker_syncs=self._compiler_pool.get_sync_stats(),
             ),
         )
 
@@ -2259,6 +2340,7 @@ class Server(ha_base.ClusterProtocol):
                 config=serialize_config(db.db_config),
                 extensions=sorted(db.extensions),
                 query_cache_size=db.get_query_cache_size(),
+                query_cache_stats=db.get_query_cache_stats(),
                 connections=[
                     dict(
                         in_tx=view.in_tx(),
@@ -81,7 +81,8 @@ class EdgeQLTestCase(BaseHttpExtensionTest):
         return 'edgeql'
 
     def edgeql_query(
-            self, query, *, use_http_post=True, variables=None, globals=None):
+            self, query, *, use_http_post=True, variables=None, globals=None,
+            stream=False):
         req_data = {
             'query': query
         }
@@ -91,6 +92,8 @@ class EdgeQLTestCase(BaseHttpExtensionTest):
                 req_data['variables'] = variables
             if globals is not None:
                 req_data['globals'] = globals
+            if stream:
+                req_data['stream'] = True
             req = urllib.request.Request(self.http_addr, method='POST')
             req.add_header('Content-Type', 'application/json')
             response = urllib.request.urlopen(
@@ -102,13 +105,16 @@ class EdgeQLTestCase(BaseHttpExtensionTest):
                 req_data['variables'] = json.dumps(variables)
             if globals is not None:
                 req_data['globals'] = json.dumps(globals)
+            if stream:
+                req_data['stream'] = 'true'
             response = urllib.request.urlopen(
                 f'{self.http_addr}/?{urllib.parse.urlencode(req_data)}',
                 context=self.tls_context,
             )
             resp_data = json.loads(response.read())
 
-        if 'data' in resp_data:
+        # A streamed response may have both partial data and an error.
+        if 'error' not in resp_data:
             return resp_data['data']
 
         err = resp_data['error']
@@ -122,12 +128,14 @@ class EdgeQLTestCase(BaseHttpExtensionTest):
                                    msg=None, sort=None,
                                    use_http_post=True,
                                    variables=None,
-                                   globals=None):
+                                   globals=None,
+                                   stream=False):
         res = self.edgeql_query(
             query,
             use_http_post=use_http_post,
             variables=variables,
-            globals=globals)
+            globals=globals,
+            stream=stream)
 
         if sort is not None:
             # GQL will always have a single object returned. The data is
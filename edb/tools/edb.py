@@ -70,4 +70,6 @@ from . import test  # noqa
 from . import wipe  # noqa
 from . import gen_test_dumps  # noqa
 from . import gen_sql_introspection  # noqa
+from . import parser_bench  # noqa
 from .profiling import cli as prof_cli  # noqa
+from .pool_bench import cli as pool_bench_cli  # noqa
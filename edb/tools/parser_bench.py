@@ -0,0 +1,148 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from __future__ import annotations
+from typing import *
+
+import os
+import pathlib
+import re
+import textwrap
+import time
+
+import click
+import parsing
+
+from edb import errors
+from edb.common import lrparser
+from edb.common.ast import visitor as ast_visitor
+from edb.edgeql.parser import parser as qlparser
+
+from edb.tools.edb import edbcommands
+
+
+CODE_BLOCK = re.compile(
+    r'^(?P<indent>[ \t]*)\.\. code-block:: (?P<lang>edgeql|sdl)[ \t]*\n'
+    r'(?P<body>(?:(?:(?P=indent)[ \t]+.*)?\n)+)',
+    re.MULTILINE,
+)
+
+Corpus = List[Tuple[Type[qlparser.EdgeQLParserBase], str]]
+
+
+def _read_corpus(root: pathlib.Path) -> Corpus:
+    corpus: Corpus = []
+
+    for path in sorted((root / 'tests' / 'schemas').glob('*.esdl')):
+        corpus.append((qlparser.EdgeSDLParser, path.read_text()))
+    for path in sorted((root / 'tests' / 'schemas').glob('*.edgeql')):
+        corpus.append((qlparser.EdgeQLBlockParser, path.read_text()))
+
+    for path in sorted((root / 'docs').glob('**/*.rst')):
+        for m in CODE_BLOCK.finditer(path.read_text()):
+            if m.group('lang') == 'sdl':
+                parser_cls = qlparser.EdgeSDLParser
+            else:
+                parser_cls = qlparser.EdgeQLBlockParser
+            corpus.append((parser_cls, textwrap.dedent(m.group('body'))))
+
+    return corpus
+
+
+def _make_parser(
+    parser_cls: Type[qlparser.EdgeQLParserBase],
+    native: bool,
+) -> qlparser.EdgeQLParserBase:
+    parser = parser_cls()
+    parser.lexer = parser.get_lexer()
+    if native:
+        parser.parser = lrparser.LrParser(parser.get_parser_tables())
+    else:
+        parser.parser = parsing.Lr(parser.get_parser_spec())
+    parser.parser.parser_data = parser.parser_data
+    return parser
+
+
+def _parse_all(
+    corpus: Corpus,
+    native: bool,
+    repeat: int,
+) -> Tuple[float, List[Any]]:
+    parsers = {
+        parser_cls: _make_parser(parser_cls, native)
+        for parser_cls in {parser_cls for parser_cls, _ in corpus}
+    }
+    results = []
+
+    started = time.monotonic()
+    for _ in range(repeat):
+        results.clear()
+        for parser_cls, source in corpus:
+            results.append(parsers[parser_cls].parse(source))
+
+    return time.monotonic() - started, results
+
+
+@edbcommands.command('parser-bench')
+@click.option('--repeat', type=int, default=5, show_default=True,
+              help='number of passes over the corpus')
+def parser_bench(repeat: int) -> None:
+    """Benchmark the EdgeQL parser drivers.
+
+    Parses the schemas and setup scripts in tests/schemas and the
+    EdgeQL and SDL code blocks of the documentation with both
+    parsing.Lr and the compiled LR driver, and checks that both
+    produce the same trees.
+    """
+    root = pathlib.Path(__file__).resolve().parent.parent.parent
+    if not os.path.exists(root / 'tests' / 'schemas'):
+        raise click.ClickException(
+            'parser-bench must be run from a source checkout')
+
+    corpus = []
+    for parser_cls, source in _read_corpus(root):
+        # Documentation snippets are sometimes fragments or use
+        # placeholders; those are not interesting for the benchmark.
+        try:
+            parser_cls().parse(source)
+        except errors.EdgeQLSyntaxError:
+            continue
+        corpus.append((parser_cls, source))
+
+    size = sum(len(source) for _, source in corpus)
+    click.echo(f'{len(corpus)} sources, {size / 1024:.1f} KiB')
+
+    lr_time, lr_results = _parse_all(corpus, native=False, repeat=repeat)
+    native_time, native_results = _parse_all(
+        corpus, native=True, repeat=repeat)
+
+    for i, (lr_res, native_res) in enumerate(zip(lr_results, native_results)):
+        # The block parser returns a list of commands.
+        if not isinstance(lr_res, list):
+            lr_res, native_res = [lr_res], [native_res]
+        if (
+            len(lr_res) != len(native_res)
+            or not all(map(ast_visitor.nodes_equal, lr_res, native_res))
+        ):
+            raise click.ClickException(
+                f'parse trees differ for:\n{corpus[i][1]}')
+
+    click.echo(f'parsing.Lr: {lr_time / repeat * 1000:.1f} ms/pass')
+    click.echo(f'LrParser:   {native_time / repeat * 1000:.1f} ms/pass')
+    click.echo(f'speedup:    {lr_time / native_time:.2f}x')
@@ -0,0 +1,179 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+from __future__ import annotations
+from typing import *
+
+import asyncio
+import json
+import sys
+
+import click
+
+from edb.tools.edb import edbcommands
+
+from . import simulator
+
+
+def _print_result(res: Dict[str, Any]) -> None:
+    ms = lambda v: f'{v * 1000:.1f}'
+
+    click.secho(f'{res["pool"]}', bold=True)
+    click.echo(
+        f'  {res["acquires"]} acquires in {res["duration"]:.2f}s, '
+        f'fairness {res["fairness"]:.3f}, '
+        f'{res["connects"]} connects, {res["disconnects"]} disconnects, '
+        f'{res["starved"]} starved'
+    )
+    if res['failed_connects'] or res['failed_disconnects']:
+        click.secho(
+            f'  {res["failed_connects"]} failed connects, '
+            f'{res["failed_disconnects"]} failed disconnects',
+            fg='red',
+        )
+
+    header = (
+        'database', 'acquires', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms',
+        'starved', 'conn', 'disconn',
+    )
+    rows = [header]
+    for b in res['blocks']:
+        rows.append((
+            b['db'], str(b['acquires']),
+            ms(b['p50']), ms(b['p90']), ms(b['p99']), ms(b['max']),
+            str(b['starved']), str(b['connects']), str(b['disconnects']),
+        ))
+    rows.append((
+        'total', str(res['acquires']),
+        ms(res['p50']), ms(res['p90']), ms(res['p99']), ms(res['max']),
+        str(res['starved']), str(res['connects']), str(res['disconnects']),
+    ))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        click.echo('  ' + '  '.join(
+            c.ljust(w) if i == 0 else c.rjust(w)
+            for i, (c, w) in enumerate(zip(row, widths))
+        ))
+    click.echo()
+
+
+@edbcommands.command('pool-bench')
+@click.option(
+    '--spec', 'spec_path',
+    type=click.Path(exists=True, dir_okay=False),
+    help='JSON spec of a synthetic workload: the pool capacity, the '
+         'connection costs, and the rate and query cost of every '
+         'database')
+@click.option(
+    '--trace', 'trace_path',
+    type=click.Path(exists=True, dir_okay=False),
+    help='trace of acquires and releases to replay: a binary trace '
+         'recorded with "edb server --connpool-trace-file", or one JSON '
+         'object per line')
+@click.option(
+    '--pool', 'pools',
+    type=click.Choice(list(simulator.POOLS)),
+    multiple=True,
+    help='pool implementation to run; may be specified multiple times '
+         '(default: all)')
+@click.option(
+    '--capacity', type=int,
+    help='max number of backend connections (overrides the spec)')
+@click.option(
+    '--conn-cost', type=float,
+    help='seconds it takes to establish a backend connection '
+         '(overrides the spec)')
+@click.option(
+    '--starvation-threshold', type=float, default=0.5, show_default=True,
+    help='acquires waiting longer than this many seconds are counted '
+         'as starved')
+@click.option(
+    '--seed', type=int,
+    help='random seed of the synthetic workload and connection costs')
+@click.option(
+    '--json', 'as_json', is_flag=True,
+    help='print the results as JSON')
+@click.option(
+    '--max-p99', type=float,
+    help='exit with an error if the p99 acquire latency of any pool, in '
+         'seconds, is higher than this')
+def pool_bench(
+    *,
+    spec_path: Optional[str],
+    trace_path: Optional[str],
+    pools: Tuple[str, ...],
+    capacity: Optional[int],
+    conn_cost: Optional[float],
+    starvation_threshold: float,
+    seed: Optional[int],
+    as_json: bool,
+    max_p99: Optional[float],
+) -> None:
+    """Benchmark the backend connection pool.
+
+    Replays a synthetic workload (--spec) or a recorded trace (--trace)
+    against the pool implementations with simulated backend connections,
+    and reports the acquire latency percentiles, starvation and
+    connection churn of every database, and the fairness of the pool
+    across databases.
+    """
+    if (spec_path is None) == (trace_path is None):
+        raise click.UsageError('specify exactly one of --spec or --trace')
+
+    if spec_path is not None:
+        spec = simulator.load_spec(spec_path)
+        acquires = simulator.synthesize(spec, seed=seed)
+    else:
+        if capacity is None:
+            raise click.UsageError('--capacity is required with --trace')
+        spec = simulator.Spec(capacity=capacity)
+        acquires = simulator.load_trace(trace_path)
+
+    if capacity is not None:
+        spec.capacity = capacity
+    if conn_cost is not None:
+        spec.conn_cost_base = conn_cost
+
+    results = []
+    for pool_name in pools or simulator.POOLS:
+        res = asyncio.run(simulator.simulate(
+            acquires,
+            spec,
+            pool_name,
+            starvation_threshold=starvation_threshold,
+            seed=seed,
+        ))
+        results.append(res.asdict())
+
+    if as_json:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        for res in results:
+            _print_result(res)
+
+    if max_p99 is not None:
+        slow = [res['pool'] for res in results if res['p99'] > max_p99]
+        if slow:
+            click.secho(
+                f'p99 acquire latency is above {max_p99}s: '
+                f'{", ".join(slow)}',
+                fg='red', err=True,
+            )
+            sys.exit(1)
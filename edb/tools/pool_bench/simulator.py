@@ -0,0 +1,306 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Replays workloads against the backend connection pool.
+
+A workload is a list of acquires, each with the offset (in seconds)
+from the start of the workload, the database, and for how long the
+connection is held before it is released.  Workloads are either
+synthesized from a spec, or read from a trace file: either a binary
+trace recorded by the server (see edb.server.connpool.trace), or one
+with a JSON object per line:
+
+    {"t": 0.0123, "db": "t0", "hold": 0.004}
+
+The backend connections are simulated, with configurable connect and
+disconnect costs.  The spec may also set the QoS policy of the pool
+(the naive pool ignores it).
+"""
+
+from __future__ import annotations
+from typing import *
+
+import asyncio
+import collections
+import dataclasses
+import json
+import random
+import time
+
+from edb.common import taskgroup
+from edb.server import connpool
+from edb.server.connpool import trace as connpool_trace
+
+
+POOLS: Dict[str, Type[Any]] = {
+    'pool': connpool.Pool,
+    'naive': connpool._NaivePool,
+}
+
+
+class Acquire(NamedTuple):
+
+    t: float
+    db: str
+    hold: float
+
+
+@dataclasses.dataclass
+class DBSpec:
+    db: str
+    start_at: float
+    end_at: float
+    qps: int
+    query_cost_base: float
+    query_cost_var: float = 0.0
+
+
+@dataclasses.dataclass
+class Spec:
+    capacity: int
+    conn_cost_base: float = 0.05
+    conn_cost_var: float = 0.01
+    disconn_cost_base: float = 0.006
+    disconn_cost_var: float = 0.0015
+    dbs: List[DBSpec] = dataclasses.field(default_factory=list)
+    # QoS policy of the pool, in the format of --connpool-qos-file.
+    qos: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Spec:
+        data = dict(data)
+        data['dbs'] = [DBSpec(**db) for db in data.get('dbs', ())]
+        return cls(**data)
+
+
+@dataclasses.dataclass
+class BlockResult:
+    db: str
+    latencies: List[float] = dataclasses.field(default_factory=list)
+    # Acquires that waited longer than the starvation threshold.
+    starved: int = 0
+    connects: int = 0
+    disconnects: int = 0
+
+    def percentile(self, q: float) -> float:
+        return percentile(self.latencies, q)
+
+    def asdict(self) -> Dict[str, Any]:
+        return {
+            'db': self.db,
+            'acquires': len(self.latencies),
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': max(self.latencies, default=0.0),
+            'starved': self.starved,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+        }
+
+
+@dataclasses.dataclass
+class Result:
+    pool_name: str
+    duration: float
+    blocks: Dict[str, BlockResult]
+    failed_connects: int = 0
+    failed_disconnects: int = 0
+
+    def all_latencies(self) -> List[float]:
+        lats: List[float] = []
+        for block in self.blocks.values():
+            lats.extend(block.latencies)
+        return lats
+
+    def fairness(self) -> float:
+        """Jain's fairness index of the mean acquire latencies of blocks.
+
+        1.0 means that all databases wait for connections equally long;
+        the lower bound is 1/n, when one of n databases does all of the
+        waiting.
+        """
+        means = [
+            sum(b.latencies) / len(b.latencies)
+            for b in self.blocks.values()
+            if b.latencies
+        ]
+        total = sum(means)
+        squares = sum(m * m for m in means)
+        if not squares:
+            return 1.0
+        return total * total / (len(means) * squares)
+
+    def asdict(self) -> Dict[str, Any]:
+        lats = self.all_latencies()
+        return {
+            'pool': self.pool_name,
+            'duration': self.duration,
+            'acquires': len(lats),
+            'p50': percentile(lats, 0.5),
+            'p90': percentile(lats, 0.9),
+            'p99': percentile(lats, 0.99),
+            'max': max(lats, default=0.0),
+            'fairness': self.fairness(),
+            'starved': sum(b.starved for b in self.blocks.values()),
+            'connects': sum(b.connects for b in self.blocks.values()),
+            'disconnects': sum(b.disconnects for b in self.blocks.values()),
+            'failed_connects': self.failed_connects,
+            'failed_disconnects': self.failed_disconnects,
+            'blocks': [
+                b.asdict()
+                for b in sorted(self.blocks.values(), key=lambda b: b.db)
+            ],
+        }
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def synthesize(spec: Spec, *, seed: Optional[int] = None) -> List[Acquire]:
+    """Generate the acquires of a synthetic workload.
+
+    Acquires arrive at every database with exponentially distributed
+    intervals (a Poisson process with the given rate).
+    """
+    rnd = random.Random(seed)
+    acquires = []
+    for db in spec.dbs:
+        if db.qps <= 0:
+            continue
+        t = db.start_at
+        while True:
+            t += rnd.expovariate(db.qps)
+            if t >= db.end_at:
+                break
+            hold = max(
+                db.query_cost_base + rnd.triangular(
+                    -db.query_cost_var, db.query_cost_var),
+                0.001,
+            )
+            acquires.append(Acquire(t, db.db, hold))
+    acquires.sort()
+    return acquires
+
+
+def load_spec(path: str) -> Spec:
+    with open(path) as f:
+        return Spec.from_dict(json.load(f))
+
+
+def load_trace(path: str) -> List[Acquire]:
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    acquires = []
+    if data.startswith(connpool_trace.MAGIC):
+        for db, t, _wait, hold in connpool_trace.read_trace(data):
+            acquires.append(Acquire(t, db, hold))
+    else:
+        for line in data.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            acquires.append(Acquire(
+                float(rec['t']), str(rec['db']), float(rec['hold'])))
+    acquires.sort()
+    return acquires
+
+
+class _FakeConnection:
+
+    def __init__(self, db: str) -> None:
+        self.db = db
+
+
+async def simulate(
+    acquires: List[Acquire],
+    spec: Spec,
+    pool_name: str,
+    *,
+    starvation_threshold: float = 0.5,
+    seed: Optional[int] = None,
+) -> Result:
+    rnd = random.Random(seed)
+    blocks: Dict[str, BlockResult] = collections.OrderedDict()
+
+    def get_block(db: str) -> BlockResult:
+        try:
+            return blocks[db]
+        except KeyError:
+            block = blocks[db] = BlockResult(db)
+            return block
+
+    async def connect(db: str) -> _FakeConnection:
+        get_block(db).connects += 1
+        await asyncio.sleep(max(
+            spec.conn_cost_base + rnd.triangular(
+                -spec.conn_cost_var, spec.conn_cost_var),
+            0.001,
+        ))
+        return _FakeConnection(db)
+
+    async def disconnect(conn: _FakeConnection) -> None:
+        get_block(conn.db).disconnects += 1
+        await asyncio.sleep(max(
+            spec.disconn_cost_base + rnd.triangular(
+                -spec.disconn_cost_var, spec.disconn_cost_var),
+            0.001,
+        ))
+
+    pool_kwargs: Dict[str, Any] = {}
+    if spec.qos is not None and pool_name == 'pool':
+        pool_kwargs['qos_policy'] = connpool.QosPolicy.from_dict(spec.qos)
+
+    pool = POOLS[pool_name](
+        connect=connect,
+        disconnect=disconnect,
+        max_capacity=spec.capacity,
+        **pool_kwargs,
+    )
+
+    async def query(acq: Acquire) -> None:
+        block = get_block(acq.db)
+        started_at = time.monotonic()
+        conn = await pool.acquire(acq.db)
+        lat = time.monotonic() - started_at
+        block.latencies.append(lat)
+        if lat > starvation_threshold:
+            block.starved += 1
+        await asyncio.sleep(acq.hold)
+        pool.release(acq.db, conn)
+
+    started_at = time.monotonic()
+    async with taskgroup.TaskGroup() as g:
+        for acq in acquires:
+            delay = acq.t - (time.monotonic() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            g.create_task(query(acq))
+
+    return Result(
+        pool_name=pool_name,
+        duration=time.monotonic() - started_at,
+        blocks=blocks,
+        failed_connects=pool.failed_connects,
+        failed_disconnects=pool.failed_disconnects,
+    )
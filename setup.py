@@ -929,6 +929,22 @@ setuptools.setup(
             include_dirs=EXT_INC_DIRS,
         ),
 
+        setuptools_extension.Extension(
+            "edb.common.lrparser",
+            ["edb/common/lrparser.pyx"],
+            extra_compile_args=EXT_CFLAGS,
+            extra_link_args=EXT_LDFLAGS,
+            include_dirs=EXT_INC_DIRS,
+        ),
+
+        setuptools_extension.Extension(
+            "edb.server.cache.tinylfu",
+            ["edb/server/cache/tinylfu.pyx"],
+            extra_compile_args=EXT_CFLAGS,
+            extra_link_args=EXT_LDFLAGS,
+            include_dirs=EXT_INC_DIRS,
+        ),
+
         setuptools_extension.Extension(
             "edb.server.cache.stmt_cache",
             ["edb/server/cache/stmt_cache.pyx"],
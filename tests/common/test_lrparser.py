@@ -0,0 +1,218 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import sys
+import types
+import unittest
+
+import parsing
+
+from edb.common import lrparser
+
+
+class P_ADD(parsing.Precedence):
+    "%left"
+
+
+class P_MUL(parsing.Precedence):
+    "%left >P_ADD"
+
+
+class P_POW(parsing.Precedence):
+    "%right >P_MUL"
+
+
+class Token(parsing.Token):
+    def __init__(self, val=None):
+        super().__init__()
+        self.val = val
+
+
+class T_PLUS(Token):
+    "%token [P_ADD]"
+
+
+class T_MINUS(Token):
+    "%token [P_ADD]"
+
+
+class T_STAR(Token):
+    "%token [P_MUL]"
+
+
+class T_CARET(Token):
+    "%token [P_POW]"
+
+
+class T_LPAREN(Token):
+    "%token"
+
+
+class T_RPAREN(Token):
+    "%token"
+
+
+class T_COMMA(Token):
+    "%token"
+
+
+class T_NUM(Token):
+    "%token"
+
+
+class Result(parsing.Nonterm):
+    "%start"
+
+    def reduce_Exprs(self, exprs):
+        "%reduce Exprs"
+        self.val = exprs.val
+
+
+class Exprs(parsing.Nonterm):
+    "%nonterm"
+
+    def reduce_Expr(self, expr):
+        "%reduce Expr"
+        self.val = [expr.val]
+
+    def reduce_Exprs_COMMA_Expr(self, exprs, comma, expr):
+        "%reduce Exprs T_COMMA Expr"
+        self.val = exprs.val + [expr.val]
+
+
+class Expr(parsing.Nonterm):
+    "%nonterm"
+
+    def reduce_NUM(self, num):
+        "%reduce T_NUM"
+        self.val = num.val
+
+    def reduce_Expr_PLUS_Expr(self, lhs, op, rhs):
+        "%reduce Expr T_PLUS Expr [P_ADD]"
+        self.val = ('+', lhs.val, rhs.val)
+
+    def reduce_Expr_MINUS_Expr(self, lhs, op, rhs):
+        "%reduce Expr T_MINUS Expr [P_ADD]"
+        self.val = ('-', lhs.val, rhs.val)
+
+    def reduce_Expr_STAR_Expr(self, lhs, op, rhs):
+        "%reduce Expr T_STAR Expr [P_MUL]"
+        self.val = ('*', lhs.val, rhs.val)
+
+    def reduce_Expr_CARET_Expr(self, lhs, op, rhs):
+        "%reduce Expr T_CARET Expr [P_POW]"
+        self.val = ('^', lhs.val, rhs.val)
+
+    def reduce_MINUS_Expr(self, op, expr):
+        "%reduce T_MINUS Expr [P_POW]"
+        self.val = ('neg', expr.val)
+
+    def reduce_LPAREN_Expr_RPAREN(self, lparen, expr, rparen):
+        "%reduce T_LPAREN Expr T_RPAREN"
+        # Return a new nonterminal instead of modifying self.
+        return expr
+
+
+TOKENS = {
+    '+': T_PLUS,
+    '-': T_MINUS,
+    '*': T_STAR,
+    '^': T_CARET,
+    '(': T_LPAREN,
+    ')': T_RPAREN,
+    ',': T_COMMA,
+}
+
+
+class TestLrParser(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        grammar = types.ModuleType('grammar')
+        grammar.__dict__.update(
+            (name, obj) for name, obj in vars(sys.modules[__name__]).items()
+            if isinstance(obj, type) and issubclass(
+                obj, (parsing.Precedence, parsing.Token, parsing.Nonterm))
+        )
+        cls.spec = parsing.Spec(grammar, skinny=True)
+        cls.tables = lrparser.LrTables(cls.spec)
+
+    def _parse(self, parser, source):
+        parser.reset()
+        for tok in source.split():
+            if tok in TOKENS:
+                parser.token(TOKENS[tok]())
+            else:
+                parser.token(T_NUM(int(tok)))
+        parser.eoi()
+        return parser.start[0].val
+
+    def _compare(self, source):
+        lr = parsing.Lr(self.spec)
+        native = lrparser.LrParser(self.tables)
+
+        try:
+            expected = self._parse(lr, source)
+        except parsing.UnexpectedToken as e:
+            with self.assertRaisesRegex(
+                    parsing.UnexpectedToken, str(e).partition(':')[0]):
+                self._parse(native, source)
+
+            self.assertEqual(
+                [(type(sym), state) for sym, state in native._stack],
+                [(type(sym), state) for sym, state in lr._stack],
+            )
+        else:
+            self.assertEqual(self._parse(native, source), expected)
+
+        return native
+
+    def test_lrparser_01(self):
+        self._compare('1')
+        self._compare('1 + 2 * 3')
+        self._compare('1 * 2 + 3')
+        self._compare('1 - 2 - 3')
+        self._compare('2 ^ 3 ^ 4')
+        self._compare('- 2 ^ 3 * - ( 1 + 4 )')
+        self._compare('( ( ( 1 ) ) ) , 2 * 3 , 4')
+
+    def test_lrparser_02(self):
+        # The parser is reusable after reset()
+        parser = lrparser.LrParser(self.tables)
+        self.assertEqual(self._parse(parser, '1 + 2'), [('+', 1, 2)])
+        self.assertEqual(self._parse(parser, '3'), [3])
+
+    def test_lrparser_03(self):
+        # Deep nesting grows the state stack.
+        depth = 200
+        self._compare('( ' * depth + '1' + ' )' * depth)
+        self._compare('- ' * depth + '1')
+        self._compare(' ^ '.join(['1'] * depth))
+
+    def test_lrparser_errors_01(self):
+        self._compare('1 +')
+        self._compare('( 1')
+        self._compare('1 2')
+        self._compare(')')
+        self._compare('1 , , 2')
+
+    def test_lrparser_errors_02(self):
+        # The parser can be reused after an error.
+        parser = self._compare('1 + + ')
+        self.assertEqual(self._parse(parser, '1 , 2'), [1, 2])
@@ -358,3 +358,53 @@ class TestPrometheusClient(unittest.TestCase):
         pmc_r = run_pmc()
         emc_r = run_emc()
         self.assertEqual(pmc_r, emc_r)
+
+    def test_prometheus_08(self):
+
+        def run_pmc():
+            registry = PMC.Registry()
+
+            test_hist = PMC.Histogram(
+                'test_labeled_hist_seconds', 'A test labeled histogram',
+                labelnames=['phase'], registry=registry)
+
+            r0 = PMC.generate(registry)
+
+            test_hist.labels('connect').observe(0.22)
+            test_hist.labels('connect').observe(2.0)
+            test_hist.labels('auth"').observe(0.0001)
+
+            r1 = PMC.generate(registry)
+
+            test_hist.labels('auth"').observe(0.43)
+
+            r2 = PMC.generate(registry)
+
+            return [r0, r1, r2]
+
+        def run_emc():
+            r = EP.Registry()
+
+            test_hist = r.new_labeled_histogram(
+                'test_labeled_hist', 'A test labeled histogram',
+                unit=prom.Unit.SECONDS,
+                labels=('phase',),
+            )
+
+            r0 = r.generate()
+
+            test_hist.observe(0.22, 'connect')
+            test_hist.observe(2.0, 'connect')
+            test_hist.observe(0.0001, 'auth"')
+
+            r1 = r.generate()
+
+            test_hist.observe(0.43, 'auth"')
+
+            r2 = r.generate()
+
+            return [r0, r1, r2]
+
+        pmc_r = run_pmc()
+        emc_r = run_emc()
+        self.assertEqual(pmc_r, emc_r)
@@ -0,0 +1,528 @@
+#
+# This source file is part of the EdgeDB open source project.
+#
+# Copyright 2022-present MagicStack Inc. and the EdgeDB authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+import asyncio
+import io
+import json
+import ssl
+import struct
+import tempfile
+
+import edgedb
+
+from edb import protocol
+from edb.common import binwrapper
+from edb.testbase import server as tb
+
+
+DUMP_HEADER_BASELINE = 106
+DUMP_HEADER_INCREMENTAL_SINCE = 107
+
+
+class RawMessage:
+    """A client message with a pre-encoded payload.
+
+    The restore messages embed the messages of the dump verbatim.
+    """
+
+    def __init__(self, mtype: bytes, payload: bytes) -> None:
+        self.mtype = mtype
+        self.payload = payload
+
+    def dump(self) -> bytes:
+        return (
+            self.mtype +
+            (len(self.payload) + 4).to_bytes(4, 'big') +
+            self.payload
+        )
+
+
+def encode(msg: protocol.ServerMessage) -> bytes:
+    iobuf = io.BytesIO()
+    type(msg).dump(msg, binwrapper.BinWrapper(iobuf))
+    return iobuf.getvalue()
+
+
+def attributes(msg: protocol.ServerMessage) -> dict:
+    return {kv.code: kv.value for kv in msg.attributes}
+
+
+async def dump(con, incremental_since=None):
+    annotations = []
+    if incremental_since is not None:
+        annotations.append(protocol.Annotation(
+            name='incremental_since', value=str(incremental_since)))
+
+    await con.send(
+        protocol.Dump(annotations=annotations),
+        protocol.Sync(),
+    )
+    header = await con.recv_match(protocol.DumpHeader)
+    blocks = []
+    while True:
+        msg = await con.recv()
+        if isinstance(msg, protocol.CommandComplete):
+            break
+        assert isinstance(msg, protocol.DumpBlock), msg
+        blocks.append(msg)
+    await con.recv_match(protocol.ReadyForCommand)
+    return header, blocks
+
+
+async def start_restore(con, header):
+    await con.send(RawMessage(
+        b'<',
+        # no headers, -j1
+        struct.pack('!hh', 0, 1) + encode(header),
+    ))
+    await con.recv_match(protocol.RestoreReady)
+
+
+async def restore(con, header, blocks):
+    await start_restore(con, header)
+    for block in blocks:
+        await con.send(RawMessage(b'=', encode(block)))
+    await con.send(protocol.RestoreEof())
+    await con.recv_match(
+        protocol.CommandComplete,
+        _ignore_msg=protocol.StateDataDescription,
+        status='RESTORE',
+    )
+    await con.sync()
+
+
+class DumpProtocolMixin:
+
+    async def _connect_protocol(self, dbname):
+        con = await protocol.new_connection(
+            **self.get_connect_args(database=dbname))
+        await con.connect()
+        return con
+
+    async def _dump(self, dbname, incremental_since=None):
+        con = await self._connect_protocol(dbname)
+        try:
+            return await dump(con, incremental_since)
+        finally:
+            await con.aclose()
+
+    async def _restore(self, dbname, header, blocks):
+        con = await self._connect_protocol(dbname)
+        try:
+            await restore(con, header, blocks)
+        finally:
+            await con.aclose()
+
+
+class TestDumpIncremental(
+    DumpProtocolMixin,
+    tb.DatabaseTestCase,
+):
+
+    TRANSACTION_ISOLATION = False
+
+    SETUP = '''
+        CREATE TYPE test::Tag {
+            CREATE REQUIRED PROPERTY name -> std::str;
+        };
+
+        CREATE TYPE test::Item {
+            CREATE REQUIRED PROPERTY name -> std::str {
+                CREATE CONSTRAINT std::exclusive;
+            };
+            CREATE PROPERTY val -> std::int64;
+            CREATE MULTI LINK tags -> test::Tag;
+        };
+
+        INSERT test::Tag { name := 't1' };
+        INSERT test::Tag { name := 't2' };
+
+        FOR x IN {'a', 'b', 'c', 'd'} UNION (
+            INSERT test::Item {
+                name := x,
+                val := 0,
+                tags := (SELECT test::Tag FILTER .name = 't1'),
+            }
+        );
+    '''
+
+    TEARDOWN = '''
+        DROP TYPE test::Item;
+        DROP TYPE test::Tag;
+    '''
+
+    ITEMS_QUERY = '''
+        SELECT test::Item {
+            id,
+            name,
+            val,
+            tags: { name } ORDER BY .name,
+        }
+        ORDER BY .name
+    '''
+
+    async def _fetch_items(self, con):
+        return json.loads(await con.query_json(self.ITEMS_QUERY))
+
+    async def test_dump_incremental_01(self):
+        if not self.has_create_database:
+            self.skipTest('create database is not supported by the backend')
+
+        dbname = self.get_database_name()
+        restored_dbname = f'{dbname}_restored'
+
+        header, blocks = await self._dump(dbname)
+        attrs = attributes(header)
+        self.assertNotIn(DUMP_HEADER_INCREMENTAL_SINCE, attrs)
+        baseline = int(attrs[DUMP_HEADER_BASELINE])
+
+        await self.con.execute('''
+            UPDATE test::Item FILTER .name = 'a' SET {
+                val := 1,
+                tags += (SELECT test::Tag FILTER .name = 't2'),
+            };
+            DELETE test::Item FILTER .name = 'b';
+            INSERT test::Item { name := 'e', val := 0 };
+        ''')
+        expected = await self._fetch_items(self.con)
+
+        inc_header, inc_blocks = await self._dump(
+            dbname, incremental_since=baseline)
+        inc_attrs = attributes(inc_header)
+        self.assertEqual(
+            inc_attrs[DUMP_HEADER_INCREMENTAL_SINCE],
+            str(baseline).encode(),
+        )
+        self.assertGreaterEqual(
+            int(inc_attrs[DUMP_HEADER_BASELINE]), baseline)
+
+        await self.con.execute(f'CREATE DATABASE {restored_dbname}')
+        try:
+            await self._restore(restored_dbname, header, blocks)
+            con2 = await self.connect(database=restored_dbname)
+            try:
+                # The objects that were not changed since the baseline
+                # are not in the incremental dump, so a change made in
+                # the restored database only must survive its restore.
+                await con2.execute('''
+                    UPDATE test::Item FILTER .name = 'c' SET { val := 42 };
+                ''')
+                for item in expected:
+                    if item['name'] == 'c':
+                        item['val'] = 42
+
+                await self._restore(restored_dbname, inc_header, inc_blocks)
+
+                # 'a' is replaced by its updated version, 'b' is
+                # deleted and 'e' is inserted with its original id.
+                self.assertEqual(await self._fetch_items(con2), expected)
+                self.assertEqual(
+                    [item['name'] for item in expected],
+                    ['a', 'c', 'd', 'e'],
+                )
+            finally:
+                await con2.aclose()
+        finally:
+            await tb.drop_db(self.con, restored_dbname)
+
+    async def test_dump_incremental_bad_baseline(self):
+        dbname = self.get_database_name()
+        header, _ = await self._dump(dbname)
+        baseline = int(attributes(header)[DUMP_HEADER_BASELINE])
+
+        # A baseline from the future, and one too old to be compared
+        # with the 32-bit row xids.
+        for since in (baseline + 2 ** 30, baseline - 2 ** 31):
+            with self.subTest(since=since):
+                con = await self._connect_protocol(dbname)
+                try:
+                    await con.send(
+                        protocol.Dump(annotations=[protocol.Annotation(
+                            name='incremental_since', value=str(since))]),
+                        protocol.Sync(),
+                    )
+                    await con.recv_match(
+                        protocol.ErrorResponse,
+                        message='cannot make an incremental dump',
+                    )
+                    await con.recv_match(protocol.ReadyForCommand)
+                finally:
+                    await con.aclose()
+
+
+class TestDumpRestoreIndexes(DumpProtocolMixin, tb.SQLQueryTestCase):
+
+    TRANSACTION_ISOLATION = False
+
+    SETUP = '''
+        CREATE TYPE test::Tag {
+            CREATE REQUIRED PROPERTY name -> std::str {
+                CREATE CONSTRAINT std::exclusive;
+            };
+        };
+
+        CREATE TYPE test::Item {
+            CREATE REQUIRED PROPERTY name -> std::str {
+                CREATE CONSTRAINT std::exclusive;
+            };
+            CREATE PROPERTY val -> std::int64;
+            CREATE INDEX ON (.val);
+            CREATE MULTI LINK tags -> test::Tag;
+        };
+
+        INSERT test::Tag { name := 't1' };
+
+        FOR x IN {'a', 'b', 'c'} UNION (
+            INSERT test::Item {
+                name := x,
+                val := 0,
+                tags := test::Tag,
+            }
+        );
+    '''
+
+    TEARDOWN = '''
+        DROP TYPE test::Item;
+        DROP TYPE test::Tag;
+    '''
+
+    INDEXES_QUERY = '''
+        SELECT
+            c.relname, i.indnatts, i.indisunique, i.indisprimary,
+            i.indisexclusion
+        FROM pg_index AS i JOIN pg_class AS c ON c.oid = i.indrelid
+        ORDER BY 1, 2, 3, 4, 5
+    '''
+
+    CONSTRAINTS_QUERY = '''
+        SELECT c.relname, k.contype
+        FROM pg_constraint AS k JOIN pg_class AS c ON c.oid = k.conrelid
+        ORDER BY 1, 2
+    '''
+
+    async def _sql_connect(self, dbname):
+        import asyncpg
+
+        conargs = self.get_connect_args()
+        tls_context = ssl.create_default_context(
+            ssl.Purpose.SERVER_AUTH,
+            cafile=conargs["tls_ca_file"],
+        )
+        tls_context.check_hostname = False
+
+        return await asyncpg.connect(
+            host=conargs['host'],
+            port=conargs['port'],
+            user=conargs['user'],
+            password=conargs['password'],
+            database=dbname,
+            ssl=tls_context,
+        )
+
+    async def _fetch_catalog(self, scon):
+        return (
+            [tuple(r) for r in await scon.fetch(self.INDEXES_QUERY)],
+            [tuple(r) for r in await scon.fetch(self.CONSTRAINTS_QUERY)],
+        )
+
+    async def _check_restored(self, dbname):
+        scon = await self._sql_connect(dbname)
+        try:
+            self.assertEqual(
+                await self._fetch_catalog(scon),
+                await self._fetch_catalog(self.scon),
+            )
+        finally:
+            await scon.close()
+
+        con = await self.connect(database=dbname)
+        try:
+            with self.assertRaises(edgedb.ConstraintViolationError):
+                await con.execute('''
+                    INSERT test::Item { name := 'a' };
+                ''')
+        finally:
+            await con.aclose()
+
+    async def _start_restore(self, dbname, header):
+        con = await self._connect_protocol(dbname)
+        await start_restore(con, header)
+        return con
+
+    async def test_dump_restore_indexes_01(self):
+        if not self.has_create_database:
+            self.skipTest('create database is not supported by the backend')
+
+        dbname = self.get_database_name()
+        restored_dbname = f'{dbname}_restored'
+
+        indexes, _ = await self._fetch_catalog(self.scon)
+        # The unique indexes of the exclusive constraints are dropped
+        # while the data is loaded.
+        self.assertTrue(any(
+            unique and not primary
+            for _, _, unique, primary, _ in indexes
+        ))
+
+        header, blocks = await self._dump(dbname)
+
+        await self.con.execute(f'CREATE DATABASE {restored_dbname}')
+        try:
+            await self._restore(restored_dbname, header, blocks)
+            await self._check_restored(restored_dbname)
+        finally:
+            await tb.drop_db(self.con, restored_dbname)
+
+    async def test_dump_restore_indexes_02(self):
+        if not self.has_create_database:
+            self.skipTest('create database is not supported by the backend')
+
+        dbname = self.get_database_name()
+        restored_dbname = f'{dbname}_restored'
+
+        header, blocks = await self._dump(dbname)
+
+        await self.con.execute(f'CREATE DATABASE {restored_dbname}')
+        try:
+            # An error after the indexes were dropped: loading the data
+            # twice violates the primary keys, which are kept.
+            con = await self._start_restore(restored_dbname, header)
+            try:
+                for block in blocks + blocks:
+                    await con.send(RawMessage(b'=', encode(block)))
+                await con.send(protocol.RestoreEof())
+                await con.recv_match(protocol.ErrorResponse)
+            finally:
+                await con.aclose()
+
+            # The client going away in the middle of the restore.
+            con = await self._start_restore(restored_dbname, header)
+            await con.send(RawMessage(b'=', encode(blocks[0])))
+            await con.aclose()
+
+            # Both restores were rolled back as a whole, so the database
+            # can be restored again and gets all its constraints.
+            await self._restore(restored_dbname, header, blocks)
+            await self._check_restored(restored_dbname)
+        finally:
+            await tb.drop_db(self.con, restored_dbname)
+
+
+class TestDumpParallel(tb.TestCase):
+
+    TYPES = ('A', 'B', 'C', 'D')
+
+    async def _populate(self, con):
+        values = ', '.join(str(n) for n in range(100))
+        for name in self.TYPES:
+            await con.execute(f'''
+                CREATE TYPE default::{name} {{
+                    CREATE PROPERTY n -> std::int64;
+                }};
+                FOR x IN {{{values}}} UNION (
+                    INSERT default::{name} {{ n := x }}
+                );
+            ''')
+
+    async def _fetch_values(self, con):
+        return {
+            name: list(await con.query(
+                f'SELECT default::{name}.n ORDER BY default::{name}.n'))
+            for name in self.TYPES
+        }
+
+    async def _dump_and_restore(self, sd, dbname):
+        con = await sd.connect_test_protocol(database=dbname)
+        try:
+            # Fail instead of hanging if the dump deadlocks.
+            header, blocks = await asyncio.wait_for(dump(con), 30)
+        finally:
+            await con.aclose()
+
+        restored_dbname = f'{dbname}_restored'
+        admin = await sd.connect()
+        try:
+            await admin.execute(f'CREATE DATABASE {restored_dbname}')
+        finally:
+            await admin.aclose()
+
+        con = await sd.connect_test_protocol(database=restored_dbname)
+        try:
+            await restore(con, header, blocks)
+        finally:
+            await con.aclose()
+
+        source = await sd.connect(database=dbname)
+        restored = await sd.connect(database=restored_dbname)
+        try:
+            self.assertEqual(
+                await self._fetch_values(restored),
+                await self._fetch_values(source),
+            )
+        finally:
+            await source.aclose()
+            await restored.aclose()
+
+    async def test_dump_parallel_01(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as qos:
+            json.dump({
+                'classes': {'limited': {'max_conns': 4}},
+                'databases': {'limited': 'limited'},
+            }, qos)
+            qos.flush()
+
+            async with tb.start_edgedb_server(
+                max_allowed_connections=10,
+                env={
+                    'EDGEDB_SERVER_DUMP_JOBS': '4',
+                    'EDGEDB_SERVER_CONNPOOL_QOS_FILE': qos.name,
+                },
+            ) as sd:
+                admin = await sd.connect()
+                try:
+                    for dbname in ('unlimited', 'limited'):
+                        await admin.execute(f'CREATE DATABASE {dbname}')
+                finally:
+                    await admin.aclose()
+
+                for dbname in ('unlimited', 'limited'):
+                    con = await sd.connect(database=dbname)
+                    try:
+                        await self._populate(con)
+                    finally:
+                        await con.aclose()
+
+                # Four blocks dumped through four backend connections.
+                await self._dump_and_restore(sd, 'unlimited')
+
+                # Two jobs at most for a database limited to four
+                # connections; with three of them held by transactions
+                # the dump goes on with the connection it has.
+                holders = [
+                    await sd.connect(database='limited') for _ in range(3)
+                ]
+                try:
+                    for con in holders:
+                        await con.execute('START TRANSACTION')
+                        await con.query('SELECT 1')
+                    await self._dump_and_restore(sd, 'limited')
+                finally:
+                    for con in holders:
+                        await con.execute('ROLLBACK')
+                        await con.aclose()
@@ -327,3 +327,57 @@ class TestHttpEdgeQL(tb.EdgeQLTestCase):
                 globals={'default::test_global_str': 'foo'},
                 use_http_post=use_http_post,
             )
+
+    def test_http_edgeql_query_stream_01(self):
+        for use_http_post in [True, False]:
+            self.assert_edgeql_query_result(
+                r"""
+                    SELECT Setting {
+                        name,
+                        value
+                    }
+                    FILTER .name = <str>$name;
+                """,
+                [
+                    {'name': 'perks', 'value': 'full'},
+                ],
+                variables={'name': 'perks'},
+                use_http_post=use_http_post,
+                stream=True,
+            )
+
+            self.assert_edgeql_query_result(
+                r"""SELECT <int64>{}""",
+                [],
+                use_http_post=use_http_post,
+                stream=True,
+            )
+
+    def test_http_edgeql_query_stream_02(self):
+        # Large enough to be written in multiple chunks.
+        self.assert_edgeql_query_result(
+            r"""SELECT range_unpack(range(0, 50000))""",
+            list(range(50000)),
+            stream=True,
+        )
+
+    def test_http_edgeql_query_stream_03(self):
+        with self.assertRaisesRegex(
+                edgedb.DivisionByZeroError, r'division by zero'):
+            self.edgeql_query(
+                r"""SELECT 1 / (10000 - range_unpack(range(0, 20000)))""",
+                stream=True,
+            )
+
+        with self.assertRaisesRegex(
+                edgedb.UnsupportedFeatureError, r'scripts'):
+            self.edgeql_query(r"""SELECT 1; SELECT 2""", stream=True)
+
+    def test_http_edgeql_query_stream_04(self):
+        with self.http_con() as con:
+            data, headers, status = self.http_con_request(
+                con, {'query': 'SELECT 1', 'stream': 'true'})
+
+            self.assertEqual(status, 200)
+            self.assertEqual(headers['transfer-encoding'], 'chunked')
+            self.assertEqual(data, b'{"data":[1]}')
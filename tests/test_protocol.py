@@ -37,9 +37,13 @@ def pack_i32s(*args):
 
 class TestProtocol(ProtocolTestCase):
 
-    async def _execute(self, command_text, sync=True, data=False, cc=None):
+    async def _execute(self, command_text, sync=True, data=False, cc=None,
+                       annotations=()):
         exec_args = dict(
-            annotations=[],
+            annotations=[
+                protocol.Annotation(name=name, value=value)
+                for name, value in annotations
+            ],
             allowed_capabilities=protocol.Capability.ALL,
             compilation_flags=protocol.CompilationFlag(0),
             implicit_limit=0,
@@ -136,6 +140,69 @@ class TestProtocol(ProtocolTestCase):
             transaction_state=protocol.TransactionState.NOT_IN_TRANSACTION,
         )
 
+    async def test_proto_execute_fetch_size_01(self):
+        await self.con.connect()
+
+        for fetch_size in ['1', '7', '1000', '5000']:
+            await self._execute(
+                'SELECT range_unpack(range(0, 1000))',
+                data=True,
+                annotations=[('fetch_size', fetch_size)],
+            )
+            await self.con.recv_match(protocol.CommandDataDescription)
+            rows = 0
+            while True:
+                msg = await self.con.recv()
+                if isinstance(msg, protocol.Data):
+                    rows += 1
+                else:
+                    break
+            self.assertIsInstance(msg, protocol.CommandComplete)
+            self.assertEqual(rows, 1000)
+            await self.con.recv_match(
+                protocol.ReadyForCommand,
+                transaction_state=protocol.TransactionState.NOT_IN_TRANSACTION,
+            )
+
+    async def test_proto_execute_fetch_size_02(self):
+        await self.con.connect()
+
+        # An error in the middle of a paginated result
+        await self._execute(
+            'SELECT 1 // (500 - range_unpack(range(0, 1000)))',
+            data=True,
+            annotations=[('fetch_size', '10')],
+        )
+        await self.con.recv_match(protocol.CommandDataDescription)
+        while True:
+            msg = await self.con.recv()
+            if not isinstance(msg, protocol.Data):
+                break
+        self.assertIsInstance(msg, protocol.ErrorResponse)
+        self.assertIn('division by zero', msg.message)
+        await self.con.recv_match(
+            protocol.ReadyForCommand,
+            transaction_state=protocol.TransactionState.NOT_IN_TRANSACTION,
+        )
+
+        await self._execute(
+            'SELECT 1',
+            annotations=[('fetch_size', '0')],
+        )
+        await self.con.recv_match(
+            protocol.ErrorResponse,
+            message='fetch_size annotation must be a positive'
+        )
+        await self.con.recv_match(protocol.ReadyForCommand)
+
+        # The connection is still usable
+        await self._execute('SELECT 1')
+        await self.con.recv_match(
+            protocol.CommandComplete,
+            status='SELECT'
+        )
+        await self.con.recv_match(protocol.ReadyForCommand)
+
     async def test_proto_flush_01(self):
 
         await self.con.connect()
@@ -18,7 +18,9 @@
 
 import asyncio
 import contextlib
+import math
 import os
+import pathlib
 import pickle
 import signal
 import subprocess
@@ -26,11 +28,20 @@ import sys
 import tempfile
 import time
 
+import immutables
+
 from edb import edgeql
+from edb import errors
+from edb.common import uuidgen
+from edb.schema import delta as sd
+from edb.schema import schema as s_schema
+from edb.schema import version as s_ver
 from edb.testbase import lang as tb
 from edb.testbase import server as tbs
 from edb.server import args as edbargs
 from edb.server import compiler as edbcompiler
+from edb.server import metrics
+from edb.server.compiler import dbstate
 from edb.server.compiler_pool import amsg
 from edb.server.compiler_pool import pool
 from edb.server.dbview import dbview
@@ -66,6 +77,89 @@ class TestServerCompiler(tb.BaseSchemaLoadTest):
             ''',
         )
 
+    def test_server_compiler_ast_cache(self):
+        compiler = tb.new_compiler()
+        cache = compiler.state.ast_cache
+
+        def compile(compiler, schema, eql):
+            context = edbcompiler.new_compiler_context(
+                compiler_state=compiler.state,
+                user_schema=schema,
+                modaliases={None: 'default'},
+            )
+            return edbcompiler.compile(
+                ctx=context,
+                source=edgeql.NormalizedSource.from_string(eql),
+            )
+
+        compile(compiler, self.schema, 'SELECT Foo { bar } FILTER .bar = "a"')
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # The parse tree survives schema changes, only the compilation
+        # is redone.
+        schema = self.run_ddl(self.schema, '''
+            ALTER TYPE default::Foo {
+                CREATE PROPERTY baz -> int64;
+            };
+        ''')
+        compile(compiler, schema, 'SELECT Foo { bar } FILTER .bar = "a"')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Queries that only differ in their constants have separate
+        # entries, and the errors point into the query that was compiled.
+        for eql in [
+            'SELECT Foo FILTER .baz = "abc"',
+            'SELECT Foo FILTER .baz = "a"',
+            'SELECT Foo FILTER .baz = "abc"',
+            'SELECT Foo FILTER .baz = "a"',
+        ]:
+            with self.assertRaises(errors.InvalidTypeError) as cached:
+                compile(compiler, schema, eql)
+            with self.assertRaises(errors.InvalidTypeError) as expected:
+                compile(tb.new_compiler(), schema, eql)
+            self.assertEqual(
+                cached.exception.position, expected.exception.position)
+        self.assertEqual((cache.hits, cache.misses), (3, 3))
+
+    def test_server_compiler_schema_delta(self):
+        base = pickle.loads(pickle.dumps(self.schema, -1))
+        schema = self.run_ddl(self.schema, '''
+            ALTER TYPE default::Foo {
+                CREATE PROPERTY baz -> int64;
+            };
+            CREATE TYPE default::Bar;
+        ''')
+
+        delta = schema.get_delta(self.schema)
+        self.assertLess(delta.get_size(), delta.base_size)
+
+        new = base.apply_delta(pickle.loads(pickle.dumps(delta, -1)))
+        self.assertEqual(new._generation, schema._generation)
+        for field in ('_id_to_data', '_id_to_type', '_name_to_id',
+                      '_globalname_to_id'):
+            self.assertEqual(getattr(new, field), getattr(schema, field))
+        self.assertIsNotNone(new.get('default::Bar', None))
+        self.assertIsNotNone(
+            new.get('default::Foo').maybe_get_ptr(new, 'baz'))
+
+        with self.assertRaisesRegex(ValueError, 'cannot apply schema delta'):
+            new.apply_delta(delta)
+
+        # Another schema derived from the same base is not a valid base
+        # for the delta, even though it has the same generation and size.
+        other = self.run_ddl(self.schema, '''
+            ALTER TYPE default::Foo {
+                CREATE PROPERTY baz -> str;
+            };
+            CREATE TYPE default::Baz;
+        ''')
+        self.assertEqual(other._generation, schema._generation)
+        with self.assertRaisesRegex(ValueError, 'cannot apply schema delta'):
+            other.apply_delta(schema.get_delta(self.schema))
+        self.assertEqual(
+            base.apply_delta(schema.get_delta(self.schema))._version_id,
+            schema._version_id)
+
 
 class ServerProtocol(amsg.ServerProtocol):
     def __init__(self):
@@ -435,3 +529,492 @@ class TestCompilerPool(tbs.TestCase):
 
     async def test_server_compiler_pool_disconnect_queue_adaptive(self):
         await self._test_pool_disconnect_queue(pool.SimpleAdaptivePool)
+
+    async def test_server_compiler_pool_adaptive_prediction(self):
+        with tempfile.TemporaryDirectory() as td:
+            pool_ = pool.SimpleAdaptivePool(
+                loop=asyncio.get_running_loop(),
+                runstate_dir=td,
+                pool_size=8,
+                dbindex=None,
+                backend_runtime_params=None,
+                std_schema=self._std_schema,
+                refl_schema=self._refl_schema,
+                schema_class_layout=self._schema_class_layout,
+            )
+            self.assertEqual(pool_._predict_num_workers(), 1)
+
+            # 240 compiles per minute holding a worker for 0.5s each
+            # keep 2 workers busy on average.
+            pool_._compile_arrivals += 240
+            for _ in range(10):
+                pool_._compile_duration_avg.add(0.5)
+            self.assertEqual(
+                pool_._predict_num_workers(),
+                math.ceil(2 * pool.ADAPTIVE_PREDICT_HEADROOM)
+                + pool.ADAPTIVE_SPARE_WORKERS,
+            )
+
+            # Never more than the configured pool size.
+            pool_._compile_arrivals += 10000
+            self.assertEqual(pool_._predict_num_workers(), 8)
+
+    async def test_server_compiler_pool_batching(self):
+        with tempfile.TemporaryDirectory() as td:
+            pool_ = await pool.create_compiler_pool(
+                runstate_dir=td,
+                pool_size=1,
+                batch_size=8,
+                dbindex=dbview.DatabaseIndex(
+                    None,
+                    std_schema=self._std_schema,
+                    global_schema=None,
+                    sys_config={},
+                ),
+                backend_runtime_params=None,
+                std_schema=self._std_schema,
+                refl_schema=self._refl_schema,
+                schema_class_layout=self._schema_class_layout,
+                pool_class=pool.FixedPool,
+            )
+
+            batch_sizes = []
+            run_compile_batch = pool_._run_compile_batch
+
+            async def _run_compile_batch(batch_key, batch):
+                await run_compile_batch(batch_key, batch)
+                batch_sizes.append(len(batch.requests))
+
+            pool_._run_compile_batch = _run_compile_batch
+
+            user_schema = s_schema.FlatSchema()
+            global_schema = s_schema.FlatSchema()
+            reflection_cache = immutables.Map()
+            database_config = immutables.Map()
+            system_config = immutables.Map()
+
+            def compile(query):
+                return pool_.compile(
+                    'edgedb',
+                    user_schema,
+                    global_schema,
+                    reflection_cache,
+                    database_config,
+                    system_config,
+                    edgeql.Source.from_string(query),
+                    immutables.Map({None: 'default'}),
+                    immutables.Map(),
+                    edbcompiler.OutputFormat.BINARY,
+                    False, 101, False, False, False, (1, 0), True, False,
+                )
+
+            try:
+                results = await asyncio.gather(
+                    compile('SELECT 1'),
+                    compile('SELECT 2'),
+                    compile('SELECT 1'),
+                    compile('SELECT <int64>$0'),
+                    compile('SELECT nonexistent'),
+                    return_exceptions=True,
+                )
+                self.assertEqual(batch_sizes, [4])
+                self.assertIs(results[0][0], results[2][0])
+                self.assertIsNot(results[0][0], results[1][0])
+                self.assertIsInstance(results[4], Exception)
+                self.assertEqual(pool_._compiles_in_flight, {})
+
+                # Another request after the batch has been sent
+                # starts a new one.
+                await compile('SELECT 1')
+                self.assertEqual(batch_sizes, [4, 1])
+            finally:
+                await pool_.stop()
+
+    async def test_server_compiler_pool_preload_std(self):
+        with tempfile.TemporaryDirectory() as td:
+            pool_ = await pool.create_compiler_pool(
+                runstate_dir=td,
+                pool_size=2,
+                dbindex=dbview.DatabaseIndex(
+                    None,
+                    std_schema=self._std_schema,
+                    global_schema=None,
+                    sys_config={},
+                ),
+                backend_runtime_params=None,
+                std_schema=self._std_schema,
+                refl_schema=self._refl_schema,
+                schema_class_layout=self._schema_class_layout,
+                pool_class=pool.FixedPool,
+            )
+            std_args_path = os.path.join(td, 'compiler-std-args.pickle')
+
+            try:
+                # The template process loads the std schema from the
+                # file, and the workers are initialized without it.
+                self.assertTrue(os.path.exists(std_args_path))
+                _, pickled_init_args = pool_._get_init_args()
+                init_args = pickle.loads(pickled_init_args)
+                self.assertEqual(init_args[2:5], (None, None, None))
+
+                workers = [
+                    await pool_._acquire_worker() for _ in range(2)]
+                for worker in workers:
+                    pool_._release_worker(worker)
+                self.assertEqual(len({w.get_pid() for w in workers}), 2)
+
+                results = await asyncio.gather(*(
+                    pool_.compile(
+                        'edgedb',
+                        s_schema.FlatSchema(),
+                        s_schema.FlatSchema(),
+                        immutables.Map(),
+                        immutables.Map(),
+                        immutables.Map(),
+                        edgeql.Source.from_string(f'SELECT {i}'),
+                        immutables.Map({None: 'default'}),
+                        immutables.Map(),
+                        edbcompiler.OutputFormat.BINARY,
+                        False, 101, False, False, False, (1, 0), True, False,
+                    )
+                    for i in range(4)
+                ))
+                for unit_group, _, _ in results:
+                    self.assertEqual(len(unit_group), 1)
+            finally:
+                await pool_.stop()
+
+            self.assertFalse(os.path.exists(std_args_path))
+
+    async def test_server_compiler_pool_affinity(self):
+        with tempfile.TemporaryDirectory() as td:
+            pool_ = await pool.create_compiler_pool(
+                runstate_dir=td,
+                pool_size=2,
+                dbindex=dbview.DatabaseIndex(
+                    None,
+                    std_schema=self._std_schema,
+                    global_schema=None,
+                    sys_config={},
+                ),
+                backend_runtime_params=None,
+                std_schema=self._std_schema,
+                refl_schema=self._refl_schema,
+                schema_class_layout=self._schema_class_layout,
+                pool_class=pool.FixedPool,
+            )
+
+            global_schema = s_schema.FlatSchema()
+            system_config = immutables.Map()
+            dbs = {
+                dbname: (
+                    s_schema.FlatSchema(),
+                    immutables.Map(),
+                    immutables.Map(),
+                )
+                for dbname in ('db1', 'db2')
+            }
+
+            def compile(dbname):
+                user_schema, reflection_cache, database_config = dbs[dbname]
+                return pool_.compile(
+                    dbname,
+                    user_schema,
+                    global_schema,
+                    reflection_cache,
+                    database_config,
+                    system_config,
+                    edgeql.Source.from_string('SELECT 1'),
+                    immutables.Map({None: 'default'}),
+                    immutables.Map(),
+                    edbcompiler.OutputFormat.BINARY,
+                    False, 101, False, False, False, (1, 0), True, False,
+                )
+
+            try:
+                # Each database gets synced to one of the workers ...
+                await asyncio.gather(compile('db1'), compile('db2'))
+                self.assertEqual(pool_.get_sync_stats()['misses'], 2)
+
+                # ... which are then preferred for its compiles.
+                for _ in range(3):
+                    await compile('db1')
+                    await compile('db2')
+                self.assertEqual(
+                    pool_.get_sync_stats(), dict(hits=6, misses=2))
+            finally:
+                await pool_.stop()
+
+
+class FakeCompilerPool:
+
+    def __init__(self):
+        self.compiles = []
+        # If set, compilations wait for the event and then fail with
+        # the error.
+        self.gate = None
+        self.error = None
+
+    async def compile(self, dbname, user_schema, global_schema,
+                      reflection_cache, database_config, system_config,
+                      source, *args):
+        self.compiles.append(source.text())
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return dbstate.QueryUnitGroup(), None, 0
+
+
+class FakeSharedCacheConnection:
+
+    def __init__(self, server):
+        self.server = server
+
+    async def sql_fetch_val(self, query, *, args, use_prep_stmt):
+        self.server.shared_lookups += 1
+        return None
+
+    async def sql_fetch(self, query, *, args, use_prep_stmt):
+        pass
+
+
+class FakeServer:
+
+    _accept_new_tasks = True
+
+    def __init__(self, *, query_cache_dir=None,
+                 shared_query_cache_secret=None):
+        self.compiler_pool = FakeCompilerPool()
+        self._query_cache_dir = query_cache_dir
+        self._shared_query_cache_secret = shared_query_cache_secret
+        self.shared_lookups = 0
+        self.query_cache_memory_limit = None
+
+    async def acquire_pgcon(self, dbname):
+        return FakeSharedCacheConnection(self)
+
+    def release_pgcon(self, dbname, conn):
+        pass
+
+    def create_task(self, coro, *, interruptable):
+        return asyncio.get_running_loop().create_task(coro)
+
+    def get_compiler_pool(self):
+        return self.compiler_pool
+
+    def get_tenant_id(self):
+        return 'tenant'
+
+    def get_query_cache_dir(self):
+        return self._query_cache_dir
+
+    def get_shared_query_cache_secret(self):
+        return self._shared_query_cache_secret
+
+    def get_query_cache_memory_limit(self):
+        return self.query_cache_memory_limit
+
+    def get_query_cache_database_memory_limit(self):
+        return None
+
+    def get_query_cache_recompile_after_ddl(self):
+        return 0
+
+
+class TestDatabaseQueryCache(tbs.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._std_schema = tb._load_std_schema()
+
+    def _new_dbindex(self, server, user_schema=None):
+        dbindex = dbview.DatabaseIndex(
+            server,
+            std_schema=self._std_schema,
+            global_schema=self._std_schema,
+            sys_config={},
+        )
+        self._register_db(dbindex, user_schema or self._std_schema)
+        return dbindex
+
+    def _register_db(self, dbindex, user_schema, dbname='db'):
+        dbindex.register_db(
+            dbname,
+            user_schema=user_schema,
+            db_config=immutables.Map(),
+            reflection_cache=immutables.Map(),
+            backend_ids={},
+        )
+
+    def _new_schema_version(self, schema):
+        ver = schema.get_global(s_ver.SchemaVersion, '__schema_version__')
+        cmd = ver.init_delta_command(schema, sd.AlterObject)
+        cmd.set_attribute_value('version', uuidgen.uuid1mc())
+        return sd.apply(cmd, schema=schema)
+
+    async def _parse(self, dbindex, eql, dbname='db'):
+        view = dbindex.new_view(
+            dbname, query_cache=True, protocol_version=(1, 0))
+        return await view.parse(dbview.QueryRequestInfo(
+            edgeql.Source.from_string(eql), (1, 0)))
+
+    async def _wait_persistent_cache(self, db):
+        await db.flush_persistent_cache()
+        # Let the callbacks scheduled by the file operations run.
+        await asyncio.sleep(0)
+
+    async def test_server_dbview_persistent_cache(self):
+        with tempfile.TemporaryDirectory() as td:
+            server = FakeServer(query_cache_dir=pathlib.Path(td))
+            dbindex = self._new_dbindex(server)
+            await self._parse(dbindex, 'SELECT 1')
+            await self._wait_persistent_cache(dbindex.get_db('db'))
+
+            # After a restart the persisted queries are loaded in the
+            # background, without blocking the event loop.
+            dbindex = self._new_dbindex(server)
+            db = dbindex.get_db('db')
+            self.assertEqual(db.get_query_cache_size(), 0)
+            await self._wait_persistent_cache(db)
+            self.assertEqual(db.get_query_cache_size(), 1)
+
+            await self._parse(dbindex, 'SELECT 1')
+            self.assertEqual(server.compiler_pool.compiles, ['SELECT 1'])
+
+            # A schema change discards the persisted queries.
+            schema = self._new_schema_version(self._std_schema)
+            self._register_db(dbindex, schema)
+            await self._wait_persistent_cache(db)
+            self.assertEqual(db.get_query_cache_size(), 0)
+
+            for user_schema in (self._std_schema, schema):
+                db = self._new_dbindex(server, user_schema).get_db('db')
+                await self._wait_persistent_cache(db)
+                self.assertEqual(db.get_query_cache_size(), 0)
+
+    async def _start_parses(self, dbindex, eql, n):
+        tasks = [
+            asyncio.create_task(self._parse(dbindex, eql)) for _ in range(n)
+        ]
+        # Let all of them miss the cache and start or join a compilation.
+        await asyncio.sleep(0.01)
+        return tasks
+
+    async def test_server_dbview_compile_single_flight(self):
+        server = FakeServer()
+        pool_ = server.compiler_pool
+        pool_.gate = asyncio.Event()
+        dbindex = self._new_dbindex(server)
+
+        tasks = await self._start_parses(dbindex, 'SELECT 1', 5)
+        self.assertEqual(pool_.compiles, ['SELECT 1'])
+        pool_.gate.set()
+        results = await asyncio.gather(*tasks)
+        self.assertEqual(pool_.compiles, ['SELECT 1'])
+        for result in results:
+            self.assertIs(
+                result.query_unit_group, results[0].query_unit_group)
+
+        await self._parse(dbindex, 'SELECT 1')
+        self.assertEqual(pool_.compiles, ['SELECT 1'])
+
+    async def test_server_dbview_compile_single_flight_shared(self):
+        server = FakeServer(shared_query_cache_secret=b'secret' * 4)
+        pool_ = server.compiler_pool
+        pool_.gate = asyncio.Event()
+        dbindex = self._new_dbindex(server)
+
+        # The shared cache is looked up once, on behalf of all the
+        # requests missing the local cache.
+        tasks = await self._start_parses(dbindex, 'SELECT 1', 5)
+        self.assertEqual(server.shared_lookups, 1)
+        self.assertEqual(pool_.compiles, ['SELECT 1'])
+        pool_.gate.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(server.shared_lookups, 1)
+
+    async def test_server_dbview_compile_single_flight_error(self):
+        server = FakeServer()
+        pool_ = server.compiler_pool
+        pool_.gate = asyncio.Event()
+        pool_.error = errors.InvalidReferenceError('no such thing')
+        dbindex = self._new_dbindex(server)
+
+        tasks = await self._start_parses(dbindex, 'SELECT nothing', 3)
+        pool_.gate.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual(pool_.compiles, ['SELECT nothing'])
+        for result in results:
+            self.assertIsInstance(result, errors.InvalidReferenceError)
+
+        # The error is not cached.
+        pool_.error = None
+        await self._parse(dbindex, 'SELECT nothing')
+        self.assertEqual(pool_.compiles, ['SELECT nothing'] * 2)
+
+    async def test_server_dbview_compile_single_flight_cancel(self):
+        server = FakeServer()
+        pool_ = server.compiler_pool
+        pool_.gate = asyncio.Event()
+        dbindex = self._new_dbindex(server)
+
+        leader, *followers = await self._start_parses(dbindex, 'SELECT 1', 3)
+        self.assertEqual(pool_.compiles, ['SELECT 1'])
+
+        # One of the waiting requests compiles the query for the others
+        # when the request that was compiling it goes away.
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        self.assertEqual(pool_.compiles, ['SELECT 1'] * 2)
+        pool_.gate.set()
+        results = await asyncio.gather(*followers)
+        self.assertEqual(pool_.compiles, ['SELECT 1'] * 2)
+        self.assertIs(
+            results[0].query_unit_group, results[1].query_unit_group)
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+
+    async def test_server_dbview_query_cache_budget(self):
+        server = FakeServer()
+        dbindex = self._new_dbindex(server)
+        for dbname in ('db2', 'db3'):
+            self._register_db(dbindex, self._std_schema, dbname)
+
+        def cache_sizes():
+            return {
+                db.name: db.get_query_cache_size()
+                for db in dbindex.iter_dbs()
+            }
+
+        def cache_weight():
+            return sum(
+                stats['weight']
+                for db in dbindex.iter_dbs()
+                for stats in db.get_query_cache_stats().values()
+            )
+
+        def global_evictions():
+            return metrics.query_cache_evictions._metric_values.get(
+                ('global_budget',), 0)
+
+        await self._parse(dbindex, 'SELECT 1')
+        server.query_cache_memory_limit = cache_weight() * 5
+        evictions = global_evictions()
+
+        # The sixth query evicts one from the least recently used
+        # database.
+        await self._parse(dbindex, 'SELECT 2')
+        for dbname in ('db2', 'db3'):
+            for eql in ('SELECT 1', 'SELECT 2'):
+                await self._parse(dbindex, eql, dbname)
+        self.assertEqual(cache_sizes(), {'db': 1, 'db2': 2, 'db3': 2})
+        self.assertLessEqual(cache_weight(), server.query_cache_memory_limit)
+        self.assertEqual(global_evictions() - evictions, 1)
+
+        # Once used again, the first database is trimmed last.
+        for eql in ('SELECT 1', 'SELECT 2'):
+            await self._parse(dbindex, eql)
+        self.assertEqual(cache_sizes(), {'db': 2, 'db2': 1, 'db3': 2})
+        self.assertLessEqual(cache_weight(), server.query_cache_memory_limit)
+        self.assertEqual(global_evictions() - evictions, 2)
@@ -27,6 +27,7 @@ import json
 import os.path
 import pathlib
 import random
+import re
 import subprocess
 import ssl
 import sys
@@ -544,6 +545,112 @@ class TestServerOps(tb.BaseHTTPTestCase):
             finally:
                 await cluster.stop()
 
+    async def test_server_ops_backend_connection_setup(self):
+        with tempfile.TemporaryDirectory() as td:
+            cluster = await pgcluster.get_local_pg_cluster(td, log_level='s')
+            cluster.set_connection_params(
+                pgconnparams.ConnectionParameters(
+                    user='postgres',
+                    database='template1',
+                ),
+            )
+            self.assertTrue(await cluster.ensure_initialized())
+            cluster.add_hba_entry(
+                type="local",
+                database="all",
+                user="proxy",
+                auth_method="trust",
+            )
+            await cluster.start()
+            try:
+                conn = await cluster.connect()
+                try:
+                    await conn.sql_execute(
+                        b'CREATE ROLE proxy WITH LOGIN CREATEDB CREATEROLE')
+                finally:
+                    await conn.close()
+
+                async with tb.start_edgedb_server(
+                    backend_dsn=f'postgres:///?user=proxy&host={td}',
+                    runstate_dir=None if devmode.is_in_dev_mode() else td,
+                    reset_auth=True,
+                    http_endpoint_security=(
+                        args.ServerEndpointSecurityMode.Optional),
+                ) as sd:
+                    con = await sd.connect()
+                    try:
+                        await con.execute('CREATE DATABASE setup_a')
+                        await con.execute('CREATE DATABASE setup_b')
+                    finally:
+                        await con.aclose()
+
+                    # Open several backend connections at once, so that
+                    # most of them go through the pipelined session setup.
+                    cons = []
+                    try:
+                        for dbname in ('setup_a', 'setup_b'):
+                            for _ in range(3):
+                                cons.append(
+                                    await sd.connect(database=dbname))
+                        await asyncio.gather(*(
+                            c.query('SELECT sys::get_version_as_str()')
+                            for c in cons
+                        ))
+
+                        await self._check_backend_session_setup(
+                            cluster, 'proxy')
+                    finally:
+                        for c in cons:
+                            await c.aclose()
+
+                    metrics = sd.fetch_metrics()
+                    for phase in ('transport', 'authentication', 'setup'):
+                        m = re.search(
+                            r'\nedgedb_server_backend_connection_'
+                            r'establishment_phase_latency_seconds_count'
+                            rf'\{{phase="{phase}"\}} (\d+)\.0\n',
+                            metrics,
+                        )
+                        self.assertIsNotNone(m, phase)
+                        self.assertGreaterEqual(int(m.group(1)), 2, phase)
+            finally:
+                await cluster.stop()
+
+    async def _check_backend_session_setup(self, cluster, role):
+        conn = await cluster.connect()
+        try:
+            dbnames = await conn.sql_fetch(
+                b'''
+                    SELECT DISTINCT datname FROM pg_stat_activity
+                    WHERE usename = $1::text AND datname IS NOT NULL
+                ''',
+                args=[role.encode()],
+            )
+        finally:
+            await conn.close()
+        self.assertGreaterEqual(len(dbnames), 2)
+
+        for (dbname,) in dbnames:
+            conn = await cluster.connect(database=dbname.decode())
+            try:
+                # Every backend connection runs the session setup script,
+                # which creates the `_edgecon_state` temporary table as
+                # the session role.
+                owners = await conn.sql_fetch(
+                    b'''
+                        SELECT r.rolname
+                        FROM pg_class c
+                        JOIN pg_roles r ON r.oid = c.relowner
+                        WHERE c.relname = '_edgecon_state'
+                        AND c.relpersistence = 't'
+                    ''',
+                )
+            finally:
+                await conn.close()
+            self.assertGreaterEqual(len(owners), 1, dbname)
+            self.assertEqual(
+                {owner for (owner,) in owners}, {role.encode()}, dbname)
+
     async def _test_connection(self, con):
         await con.send(
             protocol.Execute(
@@ -777,3 +884,32 @@ class TestServerOps(tb.BaseHTTPTestCase):
             if os.path.exists(rf_name):
                 rf.close()
                 os.unlink(rf_name)
+
+    async def test_server_ops_query_cache_recompile_after_ddl(self):
+        async with tb.start_edgedb_server(
+            http_endpoint_security=args.ServerEndpointSecurityMode.Optional,
+            env={'EDGEDB_SERVER_QUERY_CACHE_RECOMPILE_AFTER_DDL': '10'},
+        ) as sd:
+            con = await sd.connect()
+            try:
+                await con.query('select 1 + 1')
+                await con.query('select "a" ++ "b"')
+                await con.query('select {1, 2, 3}')
+
+                await con.execute('create type Foo')
+
+                async for tr in self.try_until_succeeds(
+                    ignore=AssertionError,
+                ):
+                    async with tr:
+                        m = re.search(
+                            r'\nedgedb_server_query_cache_recompilations_'
+                            r'total\{result="cached"\} (\d+)\.0\n',
+                            sd.fetch_metrics(),
+                        )
+                        self.assertIsNotNone(m)
+                        self.assertGreaterEqual(int(m.group(1)), 3)
+
+                self.assertEqual(await con.query('select 1 + 1'), [2])
+            finally:
+                await con.aclose()
@@ -46,6 +46,7 @@ import random
 import statistics
 import string
 import sys
+import tempfile
 import textwrap
 import time
 import typing
@@ -55,6 +56,7 @@ import unittest.mock
 from edb.common import taskgroup
 from edb.server import connpool
 from edb.server.connpool import pool as pool_impl
+from edb.tools.pool_bench import simulator as pool_bench
 
 # TIME_SCALE is used to run the simulation for longer time, the default is 1x.
 TIME_SCALE = int(os.environ.get("TIME_SCALE", '1'))
@@ -1515,6 +1517,194 @@ class TestServerConnectionPool(unittest.TestCase):
 
         self._test_connpool_connect_error(ConnectError, 3)
 
+    def test_connpool_prewarm_min_idle(self):
+        async def test():
+            pool = connpool.Pool(
+                connect=self.make_fake_connect(),
+                disconnect=self.make_fake_disconnect(),
+                max_capacity=5,
+                min_idle_time_before_gc=0.1,
+                min_idle=2,
+            )
+
+            pool.prewarm(['a', 'b', 'c'])
+            # Prewarming stops when the pool is full.
+            self.assertEqual(pool.current_capacity, 5)
+            self.assertEqual(pool._blocks['a'].count_conns(), 2)
+            self.assertEqual(pool._blocks['b'].count_conns(), 2)
+            self.assertEqual(pool._blocks['c'].count_conns(), 1)
+            await asyncio.sleep(0.05)
+            self.assertEqual(pool.get_pending_conns(), 0)
+
+            # The prewarmed connections are used without connecting.
+            conns = [await pool.acquire('a'), await pool.acquire('a')]
+            self.assertEqual(pool.current_capacity, 5)
+            for conn in conns:
+                pool.release('a', conn)
+
+            # GC keeps the minimum number of connections in hot blocks,
+            # and reaps the prewarmed ones that were never used.
+            conn = await pool.acquire('c')
+            pool.release('c', conn)
+            await asyncio.sleep(0.3)
+            self.assertEqual(pool._blocks['a'].count_conns(), 2)
+            self.assertEqual(pool._blocks['b'].count_conns(), 0)
+            self.assertEqual(pool._blocks['c'].count_conns(), 1)
+
+            # After the connections are pruned on a failover, the
+            # recently used blocks are prewarmed again.
+            await pool.prune_all_connections()
+            self.assertEqual(pool.current_capacity, 0)
+            pool.prewarm()
+            self.assertEqual(pool.current_capacity, 4)
+            self.assertEqual(pool._blocks['a'].count_conns(), 2)
+            self.assertEqual(pool._blocks['b'].count_conns(), 0)
+            self.assertEqual(pool._blocks['c'].count_conns(), 2)
+            await asyncio.sleep(0.1)
+
+        asyncio.run(asyncio.wait_for(test(), timeout=5))
+
+    def test_connpool_acquire_prefer(self):
+        async def test():
+            pool = connpool.Pool(
+                connect=self.make_fake_connect(),
+                disconnect=self.make_fake_disconnect(),
+                max_capacity=20,
+            )
+
+            conns = [await pool.acquire('a') for _ in range(12)]
+            for conn in conns:
+                pool.release('a', conn)
+            # The top of the stack is the most recently used connection.
+            stack = list(pool._blocks['a'].conn_stack)
+            nconns = len(stack)
+            self.assertGreaterEqual(nconns, 12)
+
+            # Only the most recently used connections are considered...
+            conn = await pool.acquire('a', prefer=lambda c: c is stack[0])
+            self.assertIs(conn, stack[-1])
+            pool.release('a', conn)
+
+            # ...and the preferred one is taken out of the stack.
+            conn = await pool.acquire('a', prefer=lambda c: c is stack[-4])
+            self.assertIs(conn, stack[-4])
+            conn2 = await pool.acquire('a')
+            self.assertIs(conn2, stack[-1])
+            conn3 = await pool.acquire('a', prefer=lambda c: False)
+            self.assertIs(conn3, stack[-2])
+            for c in (conn, conn2, conn3):
+                pool.release('a', c)
+
+            self.assertEqual(
+                pool._blocks['a'].count_queued_conns(), nconns)
+
+        asyncio.run(asyncio.wait_for(test(), timeout=5))
+
+    def test_connpool_acquire_timeout(self):
+        async def test():
+            pool = connpool.Pool(
+                connect=self.make_fake_connect(),
+                disconnect=self.make_fake_disconnect(),
+                max_capacity=1,
+            )
+            conn = await pool.acquire('a')
+
+            # A waiter that times out leaves the queue...
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.acquire('a'), 0.05)
+            self.assertFalse(pool._blocks['a'].conn_waiters)
+
+            # ...and one cancelled after it was woken up passes the
+            # released connection on to the next waiter.
+            waiter1 = asyncio.create_task(pool.acquire('a'))
+            waiter2 = asyncio.create_task(pool.acquire('a'))
+            await asyncio.sleep(0.01)
+            pool.release('a', conn)
+            waiter1.cancel()
+            self.assertIs(await asyncio.wait_for(waiter2, 1), conn)
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter1
+            pool.release('a', conn)
+
+        asyncio.run(asyncio.wait_for(test(), timeout=5))
+
+    def test_connpool_qos_classes(self):
+        policy = connpool.QosPolicy.from_dict({
+            'classes': {
+                'premium': {'weight': 4, 'min_conns': 3},
+                'batch': {'max_conns': 2},
+            },
+            'databases': {'premium': 'premium', 'batch': 'batch'},
+        })
+        max_conns: typing.Dict[str, int] = collections.defaultdict(int)
+
+        async def q(pool, db, hold):
+            conn = await pool.acquire(db)
+            max_conns[db] = max(
+                max_conns[db], pool._blocks[db].count_conns())
+            await asyncio.sleep(hold)
+            pool.release(db, conn)
+
+        async def test():
+            pool = connpool.Pool(
+                connect=self.make_fake_connect(),
+                disconnect=self.make_fake_disconnect(),
+                max_capacity=6,
+                qos_policy=policy,
+            )
+
+            # The batch database is capped even when the pool has room.
+            async with taskgroup.TaskGroup() as g:
+                for _ in range(10):
+                    g.create_task(q(pool, 'batch', 0.02))
+            self.assertEqual(max_conns['batch'], 2)
+
+            # At max capacity the premium database gets its guaranteed
+            # share, and the most of the rest.
+            async with taskgroup.TaskGroup() as g:
+                for _ in range(30):
+                    g.create_task(q(pool, 'batch', 0.02))
+                    g.create_task(q(pool, 'default', 0.02))
+                    g.create_task(q(pool, 'premium', 0.02))
+                    await asyncio.sleep(0.01)
+
+            self.assertEqual(max_conns['batch'], 2)
+            self.assertGreaterEqual(max_conns['premium'], 3)
+            self.assertLessEqual(pool.current_capacity, 6)
+
+        asyncio.run(asyncio.wait_for(test(), timeout=10))
+
+    def test_connpool_qos_policy(self):
+        policy = connpool.QosPolicy.from_dict({
+            'classes': {'batch': {'weight': 0.5, 'max_conns': 10}},
+            'databases': {'etl': 'batch'},
+        })
+        self.assertEqual(policy.get_class('etl').max_conns, 10)
+        self.assertEqual(policy.get_class('main').name, 'default')
+        self.assertEqual(policy.get_class('main').weight, 1.0)
+
+        for data, error in [
+            ({'databases': {'etl': 'batch'}}, 'undefined QoS class'),
+            ({'classes': {'batch': {'weight': 0}}}, 'weight'),
+            ({'classes': {'batch': {'max_conns': 0}}}, 'max_conns'),
+            (
+                {'classes': {'batch': {'min_conns': 3, 'max_conns': 2}}},
+                'min_conns',
+            ),
+            ({'classes': {'batch': {'share': 2}}}, 'expected an object'),
+            ({'classes': {'batch': [1]}}, 'expected an object'),
+            ({'classes': {'batch': {'max_conns': 2.5}}}, 'integer'),
+            ({'classes': {'batch': {'min_conns': True}}}, 'integer'),
+            ({'classes': {'batch': {'weight': '2'}}}, 'number'),
+            ({'classes': ['batch']}, '"classes" must be a JSON object'),
+            ({'databases': ['etl']}, '"databases" must be a JSON object'),
+            ({'databases': {'etl': 1}}, 'QoS class name'),
+            ({'dbs': {}}, 'unexpected QoS policy keys'),
+        ]:
+            with self.subTest(data=data):
+                with self.assertRaisesRegex(ValueError, error):
+                    connpool.QosPolicy.from_dict(data)
+
     @unittest.mock.patch('edb.server.connpool.pool.CONNECT_FAILURE_RETRIES', 0)
     def test_connpool_connect_error_zero_retry(self):
         class ConnectError(Exception):
@@ -1572,6 +1762,113 @@ class TestServerConnectionPool(unittest.TestCase):
         asyncio.run(main())
 
 
+class TestPoolBench(unittest.TestCase):
+
+    make_fake_connect = TestServerConnectionPool.make_fake_connect
+    make_fake_disconnect = TestServerConnectionPool.make_fake_disconnect
+
+    def test_pool_bench_simulate(self):
+        spec = pool_bench.Spec.from_dict({
+            'capacity': 2,
+            'conn_cost_base': 0.01,
+            'conn_cost_var': 0,
+            'dbs': [
+                {'db': 'a', 'start_at': 0, 'end_at': 0.2, 'qps': 50,
+                 'query_cost_base': 0.005},
+                {'db': 'b', 'start_at': 0.1, 'end_at': 0.2, 'qps': 50,
+                 'query_cost_base': 0.005},
+            ],
+        })
+        acquires = pool_bench.synthesize(spec, seed=0)
+        self.assertEqual(acquires, pool_bench.synthesize(spec, seed=0))
+        self.assertEqual(acquires, sorted(acquires))
+        self.assertTrue(all(0.1 <= acq.t < 0.2
+                            for acq in acquires if acq.db == 'b'))
+
+        for pool_name in pool_bench.POOLS:
+            with self.subTest(pool=pool_name):
+                res = asyncio.run(asyncio.wait_for(
+                    pool_bench.simulate(acquires, spec, pool_name), 5))
+                data = res.asdict()
+                self.assertEqual(data['acquires'], len(acquires))
+                self.assertEqual(data['failed_connects'], 0)
+                self.assertGreater(data['connects'], 0)
+                self.assertLessEqual(data['fairness'], 1.0)
+                self.assertEqual(
+                    {b['db'] for b in data['blocks']}, {'a', 'b'})
+
+    def test_pool_bench_load_trace(self):
+        with tempfile.NamedTemporaryFile('wt', suffix='.jsonl') as f:
+            f.write('{"t": 0.2, "db": "b", "hold": 0.01}\n')
+            f.write('\n')
+            f.write('{"t": 0.1, "db": "a", "hold": 0.02}\n')
+            f.flush()
+            self.assertEqual(
+                pool_bench.load_trace(f.name),
+                [
+                    pool_bench.Acquire(0.1, 'a', 0.02),
+                    pool_bench.Acquire(0.2, 'b', 0.01),
+                ],
+            )
+
+    def test_pool_bench_replay_recorded_trace(self):
+        async def test(path):
+            pool = connpool.Pool(
+                connect=self.make_fake_connect(),
+                disconnect=self.make_fake_disconnect(),
+                max_capacity=2,
+            )
+            pool.start_recording(connpool.TraceRecorder(
+                path, max_size=1024, max_duration=60))
+
+            async def query(db):
+                conn = await pool.acquire(db)
+                await asyncio.sleep(0.01)
+                pool.release(db, conn)
+
+            await asyncio.gather(*(query(db) for db in 'aabba'))
+            await pool.stop_recording()
+
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, 'connpool.trace')
+            asyncio.run(test(path))
+            acquires = pool_bench.load_trace(path)
+
+        self.assertEqual(sorted(acq.db for acq in acquires), list('aaabb'))
+        for acq in acquires:
+            self.assertGreaterEqual(acq.hold, 0.01)
+            self.assertLess(acq.t, 1)
+
+    def test_pool_bench_trace_limits(self):
+        async def test(path):
+            recorder = connpool.TraceRecorder(
+                path, max_size=100, max_duration=60)
+            now = time.monotonic()
+            for i in range(100):
+                recorder.record('db', now, now, now)
+            self.assertFalse(recorder.active)
+            await recorder.wait()
+
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, 'connpool.trace')
+            asyncio.run(test(path))
+            self.assertLessEqual(os.path.getsize(path), 100)
+            self.assertTrue(pool_bench.load_trace(path))
+
+    def test_pool_bench_fairness(self):
+        res = pool_bench.Result(
+            pool_name='pool',
+            duration=1.0,
+            blocks={
+                'a': pool_bench.BlockResult('a', latencies=[0.1, 0.3]),
+                'b': pool_bench.BlockResult('b', latencies=[0.2]),
+            },
+        )
+        self.assertAlmostEqual(res.fairness(), 1.0)
+        res.blocks['b'].latencies = [0.0]
+        self.assertAlmostEqual(res.fairness(), 0.5)
+
+
 HTML_TPL = R'''<!DOCTYPE html>
 <html>
     <head>
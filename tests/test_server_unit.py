@@ -17,9 +17,18 @@
 #
 
 
+import asyncio
+import pathlib
+import tempfile
 import unittest
+import unittest.mock
 
+from edb.server import defines
 from edb.server import server
+from edb.server import cache
+from edb.server.cache import persistent
+from edb.server.cache import shared
+from edb.server.protocol import dump_compression
 
 
 class TestServerUnittests(unittest.TestCase):
@@ -108,3 +117,365 @@ class TestServerUnittests(unittest.TestCase):
                 (set(expected[0]), set(expected[1]))
             )
             self.assertEqual(tuple(has_wildcards), expected_wildcard)
+
+
+class TestPersistentQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.cache_dir = pathlib.Path(self._tmpdir.name)
+
+    def tearDown(self):
+        self._tmpdir.cleanup()
+
+    def _new_cache(self, entries=(), maxsize=10):
+        self.loaded = []
+        return persistent.PersistentQueryCache.for_database(
+            self.cache_dir, 'tenant', 'db/name',
+            maxsize=maxsize, snapshot=lambda: entries,
+            on_load=lambda version, entries: self.loaded.extend(entries),
+        )
+
+    async def _set_version(self, cache, version):
+        cache.set_version(version)
+        await self._wait(cache)
+        return self.loaded
+
+    async def _wait(self, cache):
+        await cache.wait()
+        # Let the callbacks scheduled by the file operations run.
+        await asyncio.sleep(0)
+
+    def test_server_persistent_cache_roundtrip(self):
+        async def test():
+            cache = self._new_cache()
+            self.assertEqual(await self._set_version(cache, b'v1'), [])
+            cache.add('q1', 'compiled1')
+            cache.add('q2', 'compiled2')
+            cache.flush()
+            await self._wait(cache)
+
+            # A fresh instance (i.e. after a restart) preloads the entries
+            # persisted for the same version...
+            cache = self._new_cache()
+            self.assertEqual(
+                await self._set_version(cache, b'v1'),
+                [('q1', 'compiled1'), ('q2', 'compiled2')],
+            )
+            cache.add('q1', 'compiled1.1')
+            cache.flush()
+            await self._wait(cache)
+
+            cache = self._new_cache()
+            self.assertEqual(
+                await self._set_version(cache, b'v1'),
+                [('q2', 'compiled2'), ('q1', 'compiled1.1')],
+            )
+
+            # ...and drops them for any other version.
+            self.loaded.clear()
+            self.assertEqual(await self._set_version(cache, b'v2'), [])
+            self.assertEqual(
+                await self._set_version(self._new_cache(), b'v1'), [])
+
+        asyncio.run(test())
+
+    def test_server_persistent_cache_background(self):
+        async def test():
+            cache = self._new_cache()
+            await self._set_version(cache, b'v1')
+            cache.add('q1', 'compiled1')
+            cache.flush()
+            await self._wait(cache)
+
+            # The file is read in the background, and switching to
+            # another version while it is being read discards it.
+            cache = self._new_cache()
+            cache.set_version(b'v1')
+            self.assertEqual(self.loaded, [])
+            cache.set_version(b'v2')
+            await self._wait(cache)
+            self.assertEqual(self.loaded, [])
+
+        asyncio.run(test())
+
+    def test_server_persistent_cache_compaction(self):
+        async def test():
+            cache = self._new_cache(entries=[('q9', 'c9')], maxsize=2)
+            await self._set_version(cache, b'v1')
+            for i in range(5):
+                cache.add(f'q{i}', f'c{i}')
+            cache.flush()
+            await self._wait(cache)
+
+            self.assertEqual(
+                await self._set_version(self._new_cache(), b'v1'),
+                [('q9', 'c9')],
+            )
+
+        asyncio.run(test())
+
+    def test_server_persistent_cache_clear(self):
+        async def test():
+            cache = self._new_cache()
+            cache.set_version(b'v1')
+            cache.add('q1', 'c1')
+            cache.clear()
+            cache.flush()
+            await self._wait(cache)
+
+            self.assertEqual(list(self.cache_dir.iterdir()), [])
+
+        asyncio.run(test())
+
+
+class FakeQueryCacheConnection:
+
+    def __init__(self, server):
+        self.server = server
+
+    async def sql_fetch_val(self, query, *, args, use_prep_stmt):
+        assert query == shared.LOOKUP_QUERY
+        return self.server.rows.get(args)
+
+    async def sql_fetch(self, query, *, args, use_prep_stmt):
+        rows = self.server.rows
+        stored_at = self.server.stored_at
+        if query == shared.STORE_QUERY:
+            key, version, data = args
+            if (key, version) not in rows:
+                rows[key, version] = data
+                stored_at[key, version] = self.server.clock
+        elif query == shared.EVICT_QUERY:
+            for key, version in list(rows):
+                if version == args[0]:
+                    del rows[key, version]
+        elif query == shared.EXPIRE_QUERY:
+            secs, unit = args[0].split()
+            assert unit == b'seconds'
+            for key in list(rows):
+                if stored_at[key] < self.server.clock - int(secs):
+                    del rows[key]
+        else:
+            raise AssertionError(f'unexpected query: {query!r}')
+
+
+class FakeQueryCacheServer:
+
+    _accept_new_tasks = True
+
+    def __init__(self):
+        self.rows = {}
+        self.stored_at = {}
+        self.clock = 0
+        self.tasks = []
+
+    async def acquire_pgcon(self, dbname):
+        return FakeQueryCacheConnection(self)
+
+    def release_pgcon(self, dbname, conn):
+        pass
+
+    def create_task(self, coro, *, interruptable):
+        self.tasks.append(asyncio.get_running_loop().create_task(coro))
+
+    async def drain(self):
+        await asyncio.gather(*self.tasks)
+        self.tasks.clear()
+
+
+class TestSharedQueryCache(unittest.TestCase):
+
+    def test_server_shared_cache_signature(self):
+        async def test():
+            server = FakeQueryCacheServer()
+            cache = shared.SharedQueryCache(server, 'db', b'secret' * 4)
+            cache.store(b'q1', b'v1', b'compiled1')
+            cache.store(b'q2', b'v1', b'compiled2')
+            await server.drain()
+            self.assertEqual(await cache.lookup(b'q1', b'v1'), b'compiled1')
+            self.assertIsNone(await cache.lookup(b'q1', b'v2'))
+
+            # Entries written by anyone not knowing the secret, or moved
+            # to another key or version, are ignored.
+            other = shared.SharedQueryCache(server, 'db', b'other' * 4)
+            other.store(b'q3', b'v1', b'compiled3')
+            await server.drain()
+            self.assertIsNone(await cache.lookup(b'q3', b'v1'))
+
+            server.rows[b'q4', b'v1'] = server.rows[b'q1', b'v1']
+            self.assertIsNone(await cache.lookup(b'q4', b'v1'))
+
+            mac, data = server.rows[b'q2', b'v1'][:32], b'tampered'
+            server.rows[b'q2', b'v1'] = mac + data
+            self.assertIsNone(await cache.lookup(b'q2', b'v1'))
+
+        asyncio.run(test())
+
+    def test_server_shared_cache_evict(self):
+        async def test():
+            server = FakeQueryCacheServer()
+            cache = shared.SharedQueryCache(server, 'db', b'secret' * 4)
+            cache.store(b'q1', b'v1', b'compiled1')
+            cache.store(b'q1', b'v2', b'compiled2')
+            await server.drain()
+
+            # Evicting a version leaves the entries of other versions,
+            # which other servers may still be using, alone.
+            cache.evict(b'v1')
+            await server.drain()
+            self.assertIsNone(await cache.lookup(b'q1', b'v1'))
+            self.assertEqual(await cache.lookup(b'q1', b'v2'), b'compiled2')
+
+        asyncio.run(test())
+
+    @unittest.mock.patch(
+        'edb.server.defines.SHARED_QUERY_CACHE_EXPIRE_INTERVAL', 0)
+    def test_server_shared_cache_expire(self):
+        async def test():
+            server = FakeQueryCacheServer()
+            cache = shared.SharedQueryCache(server, 'db', b'secret' * 4)
+            cache.store(b'q1', b'v1', b'compiled1')
+            await server.drain()
+
+            # Entries that no server evicts, e.g. those of a crashed
+            # one, are deleted once they are too old, whatever their
+            # version is.
+            server.clock += defines.SHARED_QUERY_CACHE_MAX_AGE + 1
+            cache.store(b'q2', b'v2', b'compiled2')
+            await server.drain()
+            self.assertIsNone(await cache.lookup(b'q1', b'v1'))
+            self.assertEqual(await cache.lookup(b'q2', b'v2'), b'compiled2')
+
+        asyncio.run(test())
+
+
+class TestTinyLFUCache(unittest.TestCase):
+
+    def test_tinylfu_scan_resistance(self):
+        lfu = cache.TinyLFUCache(maxsize=100)
+        hot = [f'hot{i}' for i in range(50)]
+        for _ in range(3):
+            for key in hot:
+                if lfu.get(key) is None:
+                    lfu[key] = key
+
+        # A burst of one-off keys must not flush the working set.
+        for i in range(10000):
+            key = f'scan{i}'
+            if lfu.get(key) is None:
+                lfu[key] = key
+
+        self.assertEqual(len(lfu), 100)
+        self.assertGreaterEqual(sum(key in lfu for key in hot), 45)
+        self.assertEqual(lfu.hits, 100)
+        self.assertEqual(lfu.misses, 10050)
+        self.assertEqual(lfu.evictions, 9950)
+        self.assertEqual(lfu.weight_evictions, 0)
+
+    def test_tinylfu_weight(self):
+        lfu = cache.TinyLFUCache(
+            maxsize=100, maxweight=1000, weigher=lambda k, v: len(v))
+
+        for i in range(50):
+            lfu[i] = 'x' * 100
+        self.assertEqual(len(lfu), 10)
+        self.assertEqual(lfu.weight, 1000)
+        self.assertEqual(lfu.evictions, 40)
+        self.assertEqual(lfu.weight_evictions, 40)
+
+        # Entries heavier than the whole cache are not stored.
+        lfu['big'] = 'x' * 2000
+        self.assertNotIn('big', lfu)
+
+        del lfu[next(iter(lfu))]
+        self.assertEqual(lfu.weight, 900)
+        lfu.clear()
+        self.assertEqual(len(lfu), 0)
+        self.assertEqual(lfu.weight, 0)
+
+    def test_tinylfu_trim(self):
+        lfu = cache.TinyLFUCache(
+            maxsize=100, weigher=lambda k, v: len(v))
+
+        for i in range(10):
+            lfu[i] = 'x' * 100
+        lfu.trim(450)
+        self.assertEqual(len(lfu), 4)
+        self.assertEqual(lfu.weight, 400)
+        self.assertEqual(lfu.evictions, 6)
+        self.assertEqual(lfu.weight_evictions, 6)
+
+        lfu.trim(0)
+        self.assertEqual(len(lfu), 0)
+        self.assertEqual(lfu.weight, 0)
+
+    def test_tinylfu_peek(self):
+        lfu = cache.TinyLFUCache(maxsize=10)
+        lfu['a'] = 1
+        self.assertEqual(lfu.peek('a'), 1)
+        self.assertIsNone(lfu.peek('b'))
+        self.assertEqual((lfu.hits, lfu.misses), (0, 0))
+        self.assertEqual(dict(lfu.items()), {'a': 1})
+
+    def test_tinylfu_recent_keys(self):
+        lfu = cache.TinyLFUCache(maxsize=100)
+        for key in 'abc':
+            lfu[key] = key
+        lfu.get('a')
+
+        # The window ('c') comes first, then the entries that were
+        # accessed again ('a'), then those on probation ('b').
+        self.assertEqual(lfu.recent_keys(10), ['c', 'a', 'b'])
+        self.assertEqual(lfu.recent_keys(2), ['c', 'a'])
+        self.assertEqual(lfu.recent_keys(0), [])
+        self.assertEqual((lfu.hits, lfu.misses), (1, 0))
+
+    def test_statements_cache_cleanup(self):
+        stmts = cache.StatementsCache(maxsize=3)
+        for i in range(6):
+            stmts[f's{i}'] = i
+
+        self.assertEqual(len(stmts), 3)
+        evicted = []
+        while stmts.needs_cleanup():
+            evicted.append(stmts.cleanup_one())
+        self.assertEqual(len(evicted), 3)
+        self.assertEqual(
+            set(evicted) | set(stmts), {f's{i}' for i in range(6)})
+
+        # A statement that comes back before it was cleaned up is
+        # still prepared and must not be cleaned up.
+        stmts = cache.StatementsCache(maxsize=1)
+        stmts['a'] = 1
+        stmts['b'] = 1
+        evicted = 'a' if 'b' in stmts else 'b'
+        stmts[evicted] = 1
+        self.assertIn(evicted, stmts)
+        self.assertNotEqual(stmts.cleanup_one(), evicted)
+        self.assertFalse(stmts.needs_cleanup())
+
+
+class TestDumpCompression(unittest.TestCase):
+
+    def test_dump_compression_negotiate(self):
+        self.assertIsNone(dump_compression.negotiate('brotli'))
+        self.assertEqual(
+            dump_compression.negotiate('brotli, zlib').name, 'zlib')
+        if 'zstd' in dump_compression.CODECS:
+            self.assertEqual(
+                dump_compression.negotiate('zstd,zlib').name, 'zstd')
+
+    def test_dump_compression_roundtrip(self):
+        data = b'\x00\x01edgedb' * 10000
+        for name, codec in dump_compression.CODECS.items():
+            with self.subTest(codec=name):
+                compressed = codec.compress(memoryview(data))
+                self.assertLess(len(compressed), len(data))
+                self.assertEqual(
+                    dump_compression.get_codec(name).decompress(compressed),
+                    data,
+                )
+
+        with self.assertRaises(LookupError):
+            dump_compression.get_codec('brotli')